@@ -0,0 +1,727 @@
+"""
+도전과제 엔진
+
+- attendance / music_play / users를 벌크 쿼리 몇 번으로 한 번에 읽어 인메모리 인덱스 구성
+- 각 규칙은 (facts, already, state) -> {user_id: 달성일} 형태의 함수
+  already: 이미 해당 도전과제를 가진 user_id 집합 (DB + 캐시)
+  state:   워터마크 이전 기간에서 이어받는 롤링 상태(JSON 직렬화 가능한 dict, 규칙이 갱신)
+           None이면 facts 전체를 처음부터 평가
+"""
+import copy
+from collections import defaultdict
+from itertools import accumulate
+from datetime import date, timedelta
+
+
+class AchievementFacts:
+    """
+    attendance_rows: [(user_id, day, seconds)]       # (유저, 날짜)당 한 행, day = DATE(enter_time)
+    music_rows:      [(user_id, day, played_at, title)]  # played_at 오름차순
+    users:           [(user_id, nickname)]
+    """
+    def __init__(self, attendance_rows, music_rows, users):
+        self.nick_by_id = {uid: nick for uid, nick in users}
+
+        # ----- 출석 인덱스 -----
+        self.att_users_by_day = defaultdict(set)   # day -> {uid}
+        self.att_days_by_user = defaultdict(list)  # uid -> [day] (오름차순)
+        self.att_sec = {}                          # (uid, day) -> seconds
+        for uid, day, sec in sorted(attendance_rows, key=lambda r: (r[0], r[1])):
+            self.att_users_by_day[day].add(uid)
+            self.att_days_by_user[uid].append(day)
+            self.att_sec[(uid, day)] = int(sec or 0)
+        self.att_days = sorted(self.att_users_by_day)
+
+        # ----- 음악 인덱스 -----
+        self.music_by_user_day = defaultdict(dict)  # uid -> {day: [title, ...]} (재생 순)
+        self.music_by_day_user = defaultdict(dict)  # day -> {uid: [title, ...]} (재생 순)
+        self.first_played = defaultdict(dict)       # uid -> {title: 최초 played_at}
+        self.title_days = defaultdict(dict)         # uid -> {title: [day, ...]} (중복 제거, 오름차순)
+        for uid, day, played_at, title in music_rows:
+            self.music_by_user_day[uid].setdefault(day, []).append(title)
+            self.music_by_day_user[day].setdefault(uid, []).append(title)
+            if title not in self.first_played[uid]:
+                self.first_played[uid][title] = played_at
+            days = self.title_days[uid].setdefault(title, [])
+            if not days or days[-1] != day:
+                days.append(day)
+        self.music_days = sorted(self.music_by_day_user)
+        self._sequences = None
+
+    @property
+    def sequences(self) -> "SequenceIndex":
+        """곡 순서 규칙 공용 인덱스 (처음 쓸 때 생성, 같은 facts를 쓰는 규칙끼리 공유)"""
+        if self._sequences is None:
+            self._sequences = SequenceIndex(self.music_by_user_day)
+        return self._sequences
+
+
+class SequenceIndex:
+    """
+    곡 제목을 정수 id로 바꾸고, (유저, 날짜)별 k곡 연속 구간의 롤링 해시를 한 번만 계산.
+    해시가 같으면 실제 id 구간을 비교해 확정하므로 충돌이 있어도 결과는 정확함.
+    해시/id는 실행마다 달라지므로 state에는 저장하지 않음 (state는 곡 제목 그대로)
+    """
+    MOD = (1 << 61) - 1
+    BASE = 1_000_003
+
+    def __init__(self, music_by_user_day):
+        self.ids = {}       # title -> id (1부터)
+        self.titles = [None]
+        self._music = music_by_user_day
+        self._encoded = {}  # (uid, day) -> [id, ...]
+        self._hashes = {}   # (uid, day, k) -> {hash: [시작 위치, ...]}
+
+    def encode(self, titles):
+        out = []
+        for title in titles:
+            tid = self.ids.get(title)
+            if tid is None:
+                tid = self.ids[title] = len(self.titles)
+                self.titles.append(title)
+            out.append(tid)
+        return out
+
+    def window_hashes(self, seq, k):
+        """seq의 k 구간 롤링 해시 → [시작 위치, ...]"""
+        out = {}
+        if len(seq) < k:
+            return out
+        mod, base = self.MOD, self.BASE
+        top = pow(base, k - 1, mod)
+        h = 0
+        for tid in seq[:k]:
+            h = (h * base + tid) % mod
+        out[h] = [0]
+        for i in range(k, len(seq)):
+            h = ((h - seq[i - k] * top) * base + seq[i]) % mod
+            out.setdefault(h, []).append(i - k + 1)
+        return out
+
+    def day(self, uid, day, k):
+        """(유저, 날짜)의 (id 시퀀스, k 구간 해시)"""
+        key = (uid, day)
+        seq = self._encoded.get(key)
+        if seq is None:
+            seq = self._encoded[key] = self.encode(self._music[uid][day])
+        hkey = (uid, day, k)
+        hashes = self._hashes.get(hkey)
+        if hashes is None:
+            hashes = self._hashes[hkey] = self.window_hashes(seq, k)
+        return seq, hashes
+
+    @staticmethod
+    def same_window(a, a_start, b, b_start, k):
+        return a[a_start:a_start + k] == b[b_start:b_start + k]
+
+
+INPUT_ATTENDANCE = "attendance"
+INPUT_MUSIC = "music"
+INPUT_USERS = "users"
+INPUTS = (INPUT_ATTENDANCE, INPUT_MUSIC, INPUT_USERS)
+
+
+def load_input(conn, name: str, since: date | None = None):
+    """
+    입력 하나를 벌크 쿼리 1번으로 적재.
+    since가 있으면 그 날짜(포함) 이후만 읽음 (증분 평가, users는 항상 전체)
+    """
+    with conn.cursor() as cursor:
+        if name == INPUT_ATTENDANCE:
+            where = "WHERE enter_time >= %s" if since is not None else ""
+            cursor.execute(f"""
+                SELECT user_id, DATE(enter_time) AS day, SUM(duration_sec)
+                FROM attendance
+                {where}
+                GROUP BY user_id, DATE(enter_time)
+            """, (since,) if since is not None else ())
+        elif name == INPUT_MUSIC:
+            where = "WHERE played_at >= %s" if since is not None else ""
+            cursor.execute(f"""
+                SELECT user_id, DATE(played_at) AS day, played_at, title
+                FROM music_play
+                {where}
+                ORDER BY played_at, user_id
+            """, (since,) if since is not None else ())
+        elif name == INPUT_USERS:
+            cursor.execute("SELECT user_id, nickname FROM users")
+        else:
+            raise ValueError(f"알 수 없는 입력: {name}")
+        return cursor.fetchall()
+
+
+def load_rows(conn, since: date | None = None, inputs=INPUTS):
+    """
+    규칙 평가에 필요한 원본 행을 입력별 벌크 쿼리로 적재.
+    inputs에 없는 입력은 빈 목록
+    반환: (attendance_rows, music_rows, users)
+    """
+    return tuple(load_input(conn, name, since) if name in inputs else [] for name in INPUTS)
+
+
+def facts_between(rows, after: date | None = None, through: date | None = None) -> AchievementFacts:
+    """load_rows 결과에서 after < day <= through 구간만으로 facts 구성"""
+    attendance_rows, music_rows, users = rows
+
+    def keep(day):
+        return (after is None or day > after) and (through is None or day <= through)
+
+    return AchievementFacts(
+        [r for r in attendance_rows if keep(r[1])],
+        [r for r in music_rows if keep(r[1])],
+        users,
+    )
+
+
+def load_facts(conn) -> AchievementFacts:
+    """전체 기간 facts"""
+    return facts_between(load_rows(conn))
+
+
+def evaluate_incremental(rule, rows, already, closed_through: date, entry=None,
+                         facts_cache: dict | None = None, **rule_kwargs):
+    """
+    규칙 하나를 워터마크 이후 구간만 평가.
+    - entry: 이전 실행이 남긴 {"watermark": "YYYY-MM-DD", "state": {...}} (None이면 처음부터)
+    - closed_through: 이 날짜까지는 더 바뀌지 않는 것으로 보고 state/워터마크를 전진
+      (그 이후 날짜, 즉 오늘 분은 state 사본으로 평가만 하고 다음 실행에서 다시 평가)
+    - facts_cache: 같은 구간 facts를 규칙끼리 재사용하기 위한 dict
+    반환: (awards, new_entry)
+    """
+    facts_cache = facts_cache if facts_cache is not None else {}
+
+    def facts_for(after, through):
+        key = (after, through)
+        if key not in facts_cache:
+            facts_cache[key] = facts_between(rows, after, through)
+        return facts_cache[key]
+
+    watermark = date.fromisoformat(entry["watermark"]) if entry and entry.get("watermark") else None
+    state = copy.deepcopy(entry.get("state") or {}) if watermark else {}
+    if watermark and closed_through < watermark:
+        closed_through = watermark
+
+    awards = rule(facts_for(watermark, closed_through), already, state=state, **rule_kwargs)
+
+    open_awards = rule(facts_for(closed_through, None), set(already) | set(awards),
+                       state=copy.deepcopy(state), **rule_kwargs)
+    for uid, day in open_awards.items():
+        awards.setdefault(uid, day)
+
+    return awards, {"watermark": closed_through.isoformat(), "state": state}
+
+
+def _state(state):
+    return state if state is not None else {}
+
+
+def _days_from(facts_days, start_day: date):
+    return [d for d in facts_days if d >= start_day]
+
+
+# ---------------------------------------------------------------------------
+# 규칙 (순수 함수)
+# ---------------------------------------------------------------------------
+
+#인싸:        10명이서 저댄
+def rule_inssa(facts, already, start_day: date, state=None):
+    """하루에 10명 이상이 참여한 날, 그날 참석한 모든 유저"""
+    awards = {}
+    for day in _days_from(facts.att_days, start_day):
+        users = facts.att_users_by_day[day]
+        if len(users) < 10:
+            continue
+        for uid in sorted(users):
+            if uid not in already and uid not in awards:
+                awards[uid] = day
+    return awards
+
+
+def consecutive_day_streaks(days_by_user, length: int, runs=None):
+    """
+    유저별 출석일에서 length일 연속을 처음 채운 날을 한 번에 계산 (N일 연속 도전과제 공용).
+    (유저, 날짜 서수) 배열을 이어 붙여 날짜 차이가 1이 아닌 곳/유저가 바뀌는 곳을 연속 구간 시작으로 보고,
+    구간 내 위치로 연속 일수를 구함.
+    - days_by_user: {uid: [day, ...]} (유저별 오름차순, 같은 날이 여러 번 있으면 하루로 셈)
+    - runs: {str(uid): [마지막 출석일, 그 날로 끝나는 연속 일수]} 이전 구간에서 이어받는 연속 (제자리 갱신)
+    반환: {uid: 연속 일수가 처음 length 이상이 된 날}
+    """
+    import numpy as np  # 배치에서 규칙 평가 시에만 로드
+
+    runs = runs if runs is not None else {}
+    uid_list = [uid for uid, days in days_by_user.items() if days]
+    if not uid_list:
+        return {}
+
+    sizes = np.fromiter((len(days_by_user[uid]) for uid in uid_list), dtype=np.int64, count=len(uid_list))
+    ords = np.fromiter((d.toordinal() for uid in uid_list for d in days_by_user[uid]),
+                       dtype=np.int64, count=int(sizes.sum()))
+    owner = np.repeat(np.arange(len(uid_list)), sizes)
+    # 📌 같은 유저의 중복 날짜는 하나만 남김 (차이 0을 끊김으로 보지 않도록)
+    dup = np.zeros(len(ords), dtype=bool)
+    dup[1:] = (owner[1:] == owner[:-1]) & (ords[1:] == ords[:-1])
+    if dup.any():
+        ords, owner = ords[~dup], owner[~dup]
+        sizes = np.bincount(owner, minlength=len(uid_list))
+    idx = np.arange(len(ords))
+    firsts = np.concatenate(([0], np.cumsum(sizes)[:-1]))
+    lasts = firsts + sizes - 1
+
+    # 📌 연속 구간 시작: 유저의 첫 출석일이거나 전날과 1일 초과로 떨어진 날
+    run_start = np.ones(len(ords), dtype=bool)
+    run_start[1:] = (owner[1:] != owner[:-1]) | (np.diff(ords) != 1)
+    start_idx = np.maximum.accumulate(np.where(run_start, idx, 0))
+
+    # 📌 이전 구간에서 이어지는 연속 일수 (첫 출석일이 마지막 출석일 다음날일 때만)
+    carry = np.zeros(len(ords), dtype=np.int64)
+    for i, uid in enumerate(uid_list):
+        prev = runs.get(str(uid))
+        if prev and date.fromisoformat(prev[0]).toordinal() + 1 == ords[firsts[i]]:
+            carry[firsts[i]] = prev[1]
+    streak = idx - start_idx + 1 + carry[start_idx]
+
+    for i, uid in enumerate(uid_list):
+        runs[str(uid)] = [date.fromordinal(int(ords[lasts[i]])).isoformat(), int(streak[lasts[i]])]
+
+    hit = np.flatnonzero(streak >= length)
+    hit_owner, first_hit = np.unique(owner[hit], return_index=True)
+    return {uid_list[o]: date.fromordinal(int(ords[hit[j]])) for o, j in zip(hit_owner, first_hit)}
+
+
+#칠가이:        7일 연속 저댄
+CHILL_GUY_STREAK = 7
+
+
+def rule_chill_guy(facts, already, state=None):
+    """
+    7일 연속 출석, 7번째 날이 달성일
+    state["runs"]: {uid: [마지막 출석일, 그 날로 끝나는 연속 일수]}
+    """
+    runs = _state(state).setdefault("runs", {})
+    completed = consecutive_day_streaks(facts.att_days_by_user, CHILL_GUY_STREAK, runs)
+    return {uid: day for uid, day in completed.items() if uid not in already}
+
+
+#과몰입:        단 둘이서
+def rule_over_immersed(facts, already, start_day: date, state=None):
+    """딱 두 명만 출석한 날의 두 명"""
+    awards = {}
+    for day in _days_from(facts.att_days, start_day):
+        users = facts.att_users_by_day[day]
+        if len(users) != 2:
+            continue
+        for uid in sorted(users):
+            if uid not in already and uid not in awards:
+                awards[uid] = day
+    return awards
+
+
+#완장:         나없을때 저댄
+CAPTAIN_NICKNAME = "Nine_Bones"
+
+
+def rule_captain(facts, already, start_day: date, state=None):
+    """Nine_Bones가 참여하지 않은 날의 출석자"""
+    awards = {}
+    for day in _days_from(facts.att_days, start_day):
+        users = facts.att_users_by_day[day]
+        if any(facts.nick_by_id.get(uid) == CAPTAIN_NICKNAME for uid in users):
+            continue
+        for uid in sorted(users):
+            if uid not in already and uid not in awards:
+                awards[uid] = day
+    return awards
+
+
+#최애숭배:      한 곡 30번
+def rule_favorite_song(facts, already, state=None):
+    """
+    같은 곡을 30일 이상(1일 1회) 튼 유저, 가장 먼저 채운 곡의 30번째 날짜
+    state["title_days"]: {uid: {title: 지금까지 재생한 날 수}}
+    """
+    title_counts = _state(state).setdefault("title_days", {})
+    awards = {}
+    for uid, titles in facts.title_days.items():
+        counts = title_counts.setdefault(str(uid), {})
+        reached = []
+        for title, days in titles.items():
+            before = counts.get(title, 0)
+            if before < 30 <= before + len(days):
+                reached.append(days[29 - before])
+            counts[title] = before + len(days)
+        if reached and uid not in already:
+            awards[uid] = min(reached)
+    return awards
+
+
+#39:           39가지의 곡
+def rule_39(facts, already, state=None):
+    """
+    서로 다른 곡 39개, 39번째 곡의 최초 재생일
+    state["titles"]: {uid: [지금까지 재생한 곡 제목]}
+    """
+    known_titles = _state(state).setdefault("titles", {})
+    awards = {}
+    for uid, firsts in facts.first_played.items():
+        known = known_titles.setdefault(str(uid), [])
+        known_set = set(known)
+        new_firsts = sorted((played_at, title) for title, played_at in firsts.items() if title not in known_set)
+        before = len(known)
+        if before < 39 <= before + len(new_firsts) and uid not in already:
+            awards[uid] = new_firsts[38 - before][0].date()
+        known.extend(title for _, title in new_firsts)
+    return awards
+
+
+#파인튜닝:    30일동안 평균 55분
+FINETUNING_WINDOW = 30
+FINETUNING_AVG_MINUTES = 55
+
+
+def rule_finetuning(facts, already, state=None, verbose: bool = False):
+    """
+    각 출석일 기준, 해당 날짜 포함 이전 출석일 최대 30개의 평균 플레이 시간이 55분 이상이면 달성.
+    verbose=True면 모든 평가 구간을 날짜별 참여 시간과 함께 출력.
+    state["windows"]: {uid: [[출석일, 초], ...]}  # 최근 출석일 최대 30개 (진행도 표시에도 사용)
+    """
+    windows = _state(state).setdefault("windows", {})
+    awards = {}
+    for uid, days in facts.att_days_by_user.items():
+        carried = [(date.fromisoformat(d), sec) for d, sec in windows.get(str(uid), [])]
+        seq = carried + [(d, facts.att_sec[(uid, d)]) for d in days]
+        windows[str(uid)] = [[d.isoformat(), sec] for d, sec in seq[-FINETUNING_WINDOW:]]
+        if uid in already:
+            continue
+
+        # 📌 누적합: 구간 [lo, idx] 합 = prefix[idx + 1] - prefix[lo]
+        prefix = [0, *accumulate(sec for _, sec in seq)]
+        for idx in range(len(carried), len(seq)):
+            current_day = seq[idx][0]
+            lo = max(0, idx - (FINETUNING_WINDOW - 1))
+            size = idx + 1 - lo
+            if size < FINETUNING_WINDOW and not verbose:
+                continue
+            total_seconds = prefix[idx + 1] - prefix[lo]
+            avg_minutes = (total_seconds / 60) / size
+            ok = size == FINETUNING_WINDOW and avg_minutes >= FINETUNING_AVG_MINUTES
+
+            if verbose:
+                day_str_list = [f"{d.strftime('%m-%d')} ({sec / 60:.1f}분)" for d, sec in seq[lo:idx + 1]]
+                status = "✅" if ok else "❌"
+                print(f"[유저 {uid}] ▶ 기준일: {current_day.strftime('%m-%d')} | 출석일 수: {size} | 평균: {avg_minutes:.2f}분 {status}")
+                print(f"       ↳ 날짜들: [{', '.join(day_str_list)}]")
+
+            if ok:
+                awards[uid] = current_day
+                if verbose:
+                    print(f"[유저 {uid}] ▶ 도전과제 '파인튜닝' 달성 후 평가 종료\n")
+                break
+        if verbose:
+            print()
+    return awards
+
+
+#엣지오브투머로우: 3일 연속 동일한 5곡
+EDGE_OF_TOMORROW_K = 5
+
+
+def rule_edge_of_tomorrow(facts, already, state=None):
+    """
+    3일 연속, 동일한 5곡을 동일한 순서로(각 날짜 내 어디든 연속) 플레이
+    state["tail"]: {uid: [[재생일, [곡 제목, ...]], ...]}  # 마지막 재생일 2개
+    """
+    k = EDGE_OF_TOMORROW_K
+    index = facts.sequences
+    tails = _state(state).setdefault("tail", {})
+    awards = {}
+    for uid, new_daily in facts.music_by_user_day.items():
+        carried = {date.fromisoformat(d): titles for d, titles in tails.get(str(uid), [])}
+        first_new = min(new_daily)
+        days = sorted(set(carried) | set(new_daily))
+        tails[str(uid)] = [[d.isoformat(), new_daily.get(d, carried.get(d))] for d in days[-2:]]
+        if uid in already or len(days) < 3:
+            continue
+
+        windows = {}
+
+        def day_windows(d):
+            if d not in windows:
+                if d in new_daily:
+                    windows[d] = index.day(uid, d, k)
+                else:
+                    seq = index.encode(carried[d])
+                    windows[d] = (seq, index.window_hashes(seq, k))
+            return windows[d]
+
+        for d1, d2, d3 in zip(days, days[1:], days[2:]):
+            if d3 < first_new:
+                continue
+            if d2 != d1 + timedelta(days=1) or d3 != d2 + timedelta(days=1):
+                continue
+            (s1, h1), (s2, h2), (s3, h3) = day_windows(d1), day_windows(d2), day_windows(d3)
+            if any(
+                any(SequenceIndex.same_window(s1, a, s2, b, k) for b in h2[h])
+                and any(SequenceIndex.same_window(s1, a, s3, c, k) for c in h3[h])
+                for h in h1.keys() & h2.keys() & h3.keys()
+                for a in h1[h]
+            ):
+                awards[uid] = d3
+                break
+    return awards
+
+
+#도원결의: 전달 플레이 3개 동일하게
+DOWON_PLEDGE_K = 3
+
+
+def rule_dowon_pledge(facts, already, state=None):
+    """
+    직전 재생일에 누군가 연속 재생한 3곡을 다음 재생일에 동일 순서로 연속 재생
+    state["prev_sequences"]: 마지막 재생일의 3곡 시퀀스 목록
+    """
+    k = DOWON_PLEDGE_K
+    index = facts.sequences
+    st = _state(state)
+
+    def day_union(items):
+        """[(seq, hashes)] → {hash: [(seq, 시작 위치), ...]}"""
+        union = {}
+        for seq, hashes in items:
+            for h, starts in hashes.items():
+                union.setdefault(h, []).extend((seq, start) for start in starts)
+        return union
+
+    carried = [index.encode(seq) for seq in st.get("prev_sequences", [])]
+    prev = day_union((seq, index.window_hashes(seq, k)) for seq in carried)
+    awards = {}
+    for curr_day in facts.music_days:
+        players = facts.music_by_day_user[curr_day]
+        curr_items = {uid: index.day(uid, curr_day, k) for uid in players}
+        matchable, prev = prev, day_union(curr_items.values())
+        if not matchable:
+            continue
+        for uid in sorted(players):
+            if uid in already or uid in awards:
+                continue
+            seq, hashes = curr_items[uid]
+            if any(
+                SequenceIndex.same_window(seq, start, other, other_start, k)
+                for h, starts in hashes.items() if h in matchable
+                for start in starts
+                for other, other_start in matchable[h]
+            ):
+                awards[uid] = curr_day
+    if facts.music_days:
+        last = {tuple(index.titles[tid] for tid in seq[start:start + k])
+                for entries in prev.values() for seq, start in entries}
+        st["prev_sequences"] = [list(seq) for seq in sorted(last)]
+    return awards
+
+
+#마이웨이: 3-9명 6번
+def rule_myway(facts, already, state=None):
+    """
+    참석한 날 중 참여 인원(3~9명)이 서로 다른 6가지 이상, 6번째 새 인원 수가 나온 날
+    state["seen"]: {uid: [[본 인원 수, ...], 마지막으로 새 인원 수가 나온 날(6번째까지)]}
+    """
+    seen = _state(state).setdefault("seen", {})
+    awards = {}
+    for uid, days in facts.att_days_by_user.items():
+        counts, latest = seen.get(str(uid), ([], None))
+        seen_counts = set(counts)
+        before = len(seen_counts)
+        for day in days:
+            count = len(facts.att_users_by_day[day])
+            if 3 <= count <= 9 and count not in seen_counts:
+                seen_counts.add(count)
+                if len(seen_counts) <= 6:
+                    latest = day.isoformat()
+        seen[str(uid)] = [sorted(seen_counts), latest]
+        if before < 6 <= len(seen_counts) and uid not in already:
+            awards[uid] = date.fromisoformat(latest)
+    return awards
+
+
+# 조별과제: 6명 이상 출석 && 6명 이상 2곡 이상 플레이
+def rule_team_project(facts, already, start_day: date, state=None):
+    awards = {}
+    for day in _days_from(facts.att_days, start_day):
+        users = facts.att_users_by_day[day]
+        if len(users) < 6:
+            continue
+        players = facts.music_by_day_user.get(day, {})
+        if sum(1 for titles in players.values() if len(titles) >= 2) < 6:
+            continue
+        for uid in sorted(users):
+            if uid not in already and uid not in awards:
+                awards[uid] = day
+    return awards
+
+
+# 2025추석
+CHUSEOK_2025 = (date(2025, 10, 3), date(2025, 10, 12))
+
+
+def rule_chuseok_2025(facts, already, state=None):
+    """
+    추석 연휴 기간 중 6일 이상 출석, 6번째 날
+    state["days"]: {uid: 기간 내 출석일 수}
+    """
+    start, end = CHUSEOK_2025
+    day_counts = _state(state).setdefault("days", {})
+    awards = {}
+    for uid, days in facts.att_days_by_user.items():
+        in_range = [d for d in days if start <= d <= end]
+        if not in_range:
+            continue
+        before = day_counts.get(str(uid), 0)
+        day_counts[str(uid)] = before + len(in_range)
+        if before < 6 <= before + len(in_range) and uid not in already:
+            awards[uid] = in_range[5 - before]
+    return awards
+
+
+# 감자서버: 특정 날짜 출석
+POTATO_SERVER_DATES = [date(2025, 10, 20)]
+
+
+def rule_potato_server(facts, already, state=None):
+    awards = {}
+    for day in sorted(POTATO_SERVER_DATES):
+        for uid in sorted(facts.att_users_by_day.get(day, ())):
+            if uid not in already and uid not in awards:
+                awards[uid] = day
+    return awards
+
+
+# ---------------------------------------------------------------------------
+# 진행도 (웹 표시용): 규칙을 오늘까지 돌린 뒤의 state에서 계산
+# (state가 전체 기간을 요약하므로 전체 이력을 다시 읽지 않아도 됨, 기록 없는 유저는 0)
+# ---------------------------------------------------------------------------
+
+def progress_chill_guy(state, today: date, user_ids):
+    """현재 연속 출석 일수 (마지막 출석일이 어제/오늘이 아니면 끊긴 것으로 보고 0)"""
+    out = {uid: {"current": 0, "goal": CHILL_GUY_STREAK} for uid in user_ids}
+    for uid_str, (last, run) in state.get("runs", {}).items():
+        alive = date.fromisoformat(last) >= today - timedelta(days=1)
+        out[int(uid_str)] = {"current": run if alive else 0, "goal": CHILL_GUY_STREAK}
+    return out
+
+
+def progress_favorite_song(state, today: date, user_ids):
+    """가장 많은 날 재생한 곡과 그 날 수"""
+    out = {uid: {"current": 0, "goal": 30, "title": None} for uid in user_ids}
+    for uid_str, counts in state.get("title_days", {}).items():
+        if counts:
+            title, days = max(counts.items(), key=lambda kv: kv[1])
+            out[int(uid_str)] = {"current": days, "goal": 30, "title": title}
+    return out
+
+
+def progress_39(state, today: date, user_ids):
+    """지금까지 재생한 서로 다른 곡 수"""
+    out = {uid: {"current": 0, "goal": 39} for uid in user_ids}
+    for uid_str, titles in state.get("titles", {}).items():
+        out[int(uid_str)] = {"current": len(titles), "goal": 39}
+    return out
+
+
+def progress_finetuning(state, today: date, user_ids):
+    """최근 출석일 최대 30개의 평균 플레이 시간(분)과 채운 출석일 수"""
+    out = {
+        uid: {"current": 0.0, "goal": FINETUNING_AVG_MINUTES, "days": 0, "days_goal": FINETUNING_WINDOW}
+        for uid in user_ids
+    }
+    for uid_str, window in state.get("windows", {}).items():
+        if not window:
+            continue
+        avg_minutes = sum(sec for _, sec in window) / 60 / len(window)
+        out[int(uid_str)] = {
+            "current": round(avg_minutes, 1),
+            "goal": FINETUNING_AVG_MINUTES,
+            "days": len(window),
+            "days_goal": FINETUNING_WINDOW,
+        }
+    return out
+
+
+# ---------------------------------------------------------------------------
+# 규칙 레지스트리
+# ---------------------------------------------------------------------------
+
+START_DAY = date(2025, 5, 12)
+
+
+class Rule:
+    """
+    name:      achievements.name
+    inputs:    필요한 입력 (INPUTS 중 일부) — 이 입력만 적재되면 평가 가능
+    fn:        규칙 함수 (facts, already, state=None, **kwargs) -> {user_id: date}
+    kwargs:    규칙 함수에 넘길 고정 인자
+    progress:  진행도 함수 (state, today, user_ids) -> {user_id: {"current", "goal", ...}} (없으면 None)
+               state는 규칙 함수가 갱신한 state (compute_progress 참고)
+    """
+    def __init__(self, name, inputs, fn, kwargs=None, progress=None):
+        self.name = name
+        self.inputs = tuple(inputs)
+        self.fn = fn
+        self.kwargs = kwargs or {}
+        self.progress = progress
+
+    def __repr__(self):
+        return f"Rule({self.name!r}, inputs={self.inputs})"
+
+
+RULES = [
+    Rule("인싸",             [INPUT_ATTENDANCE],              rule_inssa,            {"start_day": START_DAY}),
+    Rule("ChillGuy",         [INPUT_ATTENDANCE],              rule_chill_guy,        progress=progress_chill_guy),
+    Rule("과몰입",           [INPUT_ATTENDANCE],              rule_over_immersed,    {"start_day": START_DAY}),
+    Rule("완장",             [INPUT_ATTENDANCE, INPUT_USERS], rule_captain,          {"start_day": START_DAY}),
+    Rule("최애숭배",         [INPUT_MUSIC],                   rule_favorite_song,    progress=progress_favorite_song),
+    Rule("39",               [INPUT_MUSIC],                   rule_39,               progress=progress_39),
+    Rule("파인튜닝",         [INPUT_ATTENDANCE],              rule_finetuning,       progress=progress_finetuning),
+    Rule("엣지오브투머로우", [INPUT_MUSIC],                   rule_edge_of_tomorrow),
+    Rule("도원결의",         [INPUT_MUSIC],                   rule_dowon_pledge),
+    Rule("마이웨이",         [INPUT_ATTENDANCE],              rule_myway),
+    Rule("조별과제",         [INPUT_ATTENDANCE, INPUT_MUSIC], rule_team_project,     {"start_day": START_DAY}),
+    Rule("2025추석",         [INPUT_ATTENDANCE],              rule_chuseok_2025),
+    Rule("감자서버",         [INPUT_ATTENDANCE],              rule_potato_server),
+]
+RULES_BY_NAME = {rule.name: rule for rule in RULES}
+
+
+def select_rules(names=None):
+    """이름 목록으로 규칙 선택 (None/빈 목록이면 전체, 등록 순서 유지)"""
+    if not names:
+        return list(RULES)
+    unknown = [n for n in names if n not in RULES_BY_NAME]
+    if unknown:
+        raise ValueError(f"알 수 없는 도전과제: {', '.join(unknown)}")
+    wanted = set(names)
+    return [rule for rule in RULES if rule.name in wanted]
+
+
+def compute_progress(rows, today: date, entries=None, rules=None):
+    """
+    진행도 함수가 있는 규칙을 저장된 state에서 이어 계산.
+    - rows: load_rows 결과 (entries가 있으면 워터마크 다음날부터만 읽은 것이면 충분)
+    - entries: achievement_state의 {도전과제 이름: {"watermark", "state"}} (없는 규칙은 rows 전체로 처음부터)
+    규칙을 워터마크 이후 rows로 state 사본 위에서 오늘까지 돌린 뒤(지급 결과는 버림) state로 진행도 계산
+    반환: {user_id: {도전과제 이름: {"current", "goal", ...}}}
+    """
+    entries = entries or {}
+    user_ids = [uid for uid, _ in rows[2]]
+    facts_cache = {}
+    out = defaultdict(dict)
+    for rule in rules or RULES:
+        if rule.progress is None:
+            continue
+        entry = entries.get(rule.name) or {}
+        watermark = date.fromisoformat(entry["watermark"]) if entry.get("watermark") else None
+        state = copy.deepcopy(entry.get("state") or {}) if watermark else {}
+        if watermark not in facts_cache:
+            facts_cache[watermark] = facts_between(rows, watermark)
+        rule.fn(facts_cache[watermark], set(), state=state, **rule.kwargs)
+        for uid, p in rule.progress(state, today, user_ids).items():
+            out[uid][rule.name] = p
+    return dict(out)
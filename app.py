@@ -1,4 +1,4 @@
-from flask import Flask, render_template, jsonify, request
+from flask import Flask, render_template, jsonify, request, send_file, abort
 import pymysql
 import os
 import json
@@ -6,12 +6,16 @@ from datetime import date, datetime, timedelta, timezone
 import random
 from threading import Lock
 from collections import defaultdict
-import numpy as np
-import pandas as pd
 from urllib.parse import quote
 from concurrent.futures import ThreadPoolExecutor
 import uuid
-from og import create_user_card_blueprint, build_all_user_cards
+from og import create_user_card_blueprint, build_all_user_cards, OG_CARD_FORMATS
+import user_stats
+import achievement_engine
+import db_achiv
+from ttl_cache import TTLLRUCache
+from thumbnails import ThumbnailStore, THUMB_MAX_AGE
+from profile_index import get_profile_index
 from collections import defaultdict, Counter
 
 app = Flask(__name__)
@@ -23,6 +27,11 @@ DB_CONFIG = WEB_CONFIG["db"]
 PROFILE_IMG_DIR = WEB_CONFIG["profile_img_dir"]
 PROFILE_FONT_DIR = WEB_CONFIG["profile_font_dir"]
 OG_CACHE_DIR = WEB_CONFIG["og_cache_dir"]
+THUMB_DIR = WEB_CONFIG.get("thumb_dir", "./thumb_cache")
+# OG 카드 캐시 포맷 (첫 번째가 기본 응답). 256색 png8은 여기서 켤 때만 사용
+OG_CARD_FORMATS = tuple(WEB_CONFIG.get("og_card_formats", OG_CARD_FORMATS))
+# OG 카드 전체 생성 워커 프로세스 수 (없거나 0이면 CPU 수, 사용 가능한 CPU 수보다 크게는 안 띄움)
+OG_BUILD_WORKERS = WEB_CONFIG.get("og_build_workers") or None
 
 PROFILE_DEFAULT_FILENAME = "default.png"
 
@@ -47,7 +56,10 @@ cache_store = {
         "links": []
     },
     "attendance_correlation": [],
-    "user_details_by_nickname": {}
+    "user_details_by_nickname": {},
+    "user_details_version": 0,
+    "user_topn_counts": {},   # user_id -> {"monthly", "weekly"} (전체 유저 임계값 기준, 갱신 작업에서 계산)
+    "achievement_progress_by_nickname": {}
 }
 cache_lock = Lock()
 
@@ -58,8 +70,9 @@ _jobs_lock = Lock()
 
 def _compute_and_update_all():
     updated = {}
+    profile_index.refresh(force=True)   # 새로 올라온 프로필을 이번 갱신에 바로 반영
 
-    # 0) 유저 디테일: 락 밖에서 새 스냅샷 계산 (Top-N 포함)
+    # 0) 유저 디테일: 락 밖에서 새 스냅샷 계산 (가벼운 core만, 무거운 부분은 요청 시 지연 계산)
     try:
         new_user_details = compute_all_user_details()   # dict 반환, 캐시에 직접 쓰지 않음
         new_user_details_error = None
@@ -67,6 +80,22 @@ def _compute_and_update_all():
         new_user_details = None
         new_user_details_error = str(e)
 
+    # 0-1) 유저 디테일 Top-N 횟수: 전체 유저 임계값이 필요하므로 데이터 버전당 한 번 (락 밖)
+    try:
+        new_topn_counts = compute_topn_threshold_counts(n=TOP_N_RANK)
+        new_topn_counts_error = None
+    except Exception as e:
+        new_topn_counts = None
+        new_topn_counts_error = str(e)
+
+    # 0-2) 도전과제 진행도: db_achiv가 저장한 규칙 state + 워터마크 이후 행으로 전체 유저 계산 (락 밖)
+    try:
+        new_progress = compute_achievement_progress()
+        new_progress_error = None
+    except Exception as e:
+        new_progress = None
+        new_progress_error = str(e)
+
     # 1) 가벼운 캐시들은 락 안에서 기존대로 갱신
     with cache_lock:
         for mode in ["total", "weekly", "monthly"]:
@@ -105,11 +134,26 @@ def _compute_and_update_all():
         # 2) 유저 디테일 핫스왑(성공 시 교체, 실패 시 유지)
         if new_user_details is not None:
             cache_store["user_details_by_nickname"] = new_user_details
+            cache_store["user_details_version"] += 1   # 지연 계산 LRU 무효화
             updated["user_details_by_nickname"] = len(new_user_details)
         else:
             updated["user_details_by_nickname"] = len(cache_store["user_details_by_nickname"])
             updated["user_details_error"] = new_user_details_error
 
+        if new_topn_counts is not None:
+            cache_store["user_topn_counts"] = new_topn_counts
+            updated["user_topn_counts"] = len(new_topn_counts)
+        else:
+            updated["user_topn_counts"] = len(cache_store["user_topn_counts"])
+            updated["user_topn_counts_error"] = new_topn_counts_error
+
+        if new_progress is not None:
+            cache_store["achievement_progress_by_nickname"] = new_progress
+            updated["achievement_progress"] = len(new_progress)
+        else:
+            updated["achievement_progress"] = len(cache_store["achievement_progress_by_nickname"])
+            updated["achievement_progress_error"] = new_progress_error
+
     # 3) OG 카드는 락 밖에서 (기존 그대로)
     try:
         with app.app_context():
@@ -123,6 +167,9 @@ def _compute_and_update_all():
                 route_prefix="",
                 template_user_page="og.html",
                 cache_dir=OG_CACHE_DIR,
+                thumb_dir=THUMB_DIR,
+                card_formats=OG_CARD_FORMATS,
+                workers=OG_BUILD_WORKERS,
             )
         updated["og_cards"] = og_res
     except Exception as e:
@@ -195,6 +242,41 @@ def safe_filename(nickname):
     return nickname.replace("/", "_SLASH_").replace("⁄", "_SLASH_")
 
 
+# 📌 프로필 축소 변형 (목록 화면은 원본 대신 /thumbs/<변형>/<파일명>)
+profile_thumbs = ThumbnailStore(PROFILE_IMG_DIR, THUMB_DIR)
+# 📌 프로필 파일 존재 여부/mtime은 디렉터리 인덱스 dict로 (유저마다 stat 하지 않음, og.py와 공유)
+profile_index = get_profile_index(PROFILE_IMG_DIR)
+
+
+def profile_img_url(nickname, variant=None):
+    """
+    닉네임의 프로필 이미지 URL (없으면 기본 이미지).
+    variant가 있으면 축소 변형 URL (thumbnails.THUMB_VARIANTS).
+    ?v=<mtime>을 붙여 프로필이 바뀌면 URL도 바뀜 (브라우저 캐시 무효화)
+    """
+    img_filename, mtime_ns = profile_index.resolve(safe_filename(nickname) + ".png", PROFILE_DEFAULT_FILENAME)
+    if variant is None:
+        url = f"/static/profiles/{quote(img_filename)}"
+    else:
+        url = f"/thumbs/{variant}/{quote(img_filename)}"
+    return f"{url}?v={mtime_ns // 1_000_000_000}" if mtime_ns else url
+
+
+@app.route("/thumbs/<variant>/<filename>")
+def profile_thumbnail(variant, filename):
+    mtime_ns = profile_index.mtime_ns(filename)
+    if mtime_ns is None:
+        abort(404)
+    try:
+        path = profile_thumbs.path(filename, variant, source_mtime_ns=mtime_ns)
+    except Exception as e:
+        print(f"[ERROR] 프로필 축소 실패 ({filename}, {variant}): {e}")
+        path = None
+    if path is None:
+        abort(404)
+    return send_file(path, conditional=True, max_age=THUMB_MAX_AGE)
+
+
 #---------------------------------------------------------------------------------------
 '''
 def compute_ranking(mode: str):
@@ -494,17 +576,12 @@ def participants_by_date():
         leave_time = r[4]
         duration_min = int((leave_time - enter_time).total_seconds() // 60)
 
-        img_filename = safe_filename(nickname) + ".png"
-        img_path = os.path.join(PROFILE_IMG_DIR, img_filename)
-        if not os.path.exists(img_path):
-            img_filename = PROFILE_DEFAULT_FILENAME
-
         users.append({
             "nickname": nickname,
             "comment": comment,
             "total_count": total_count,
             "duration": duration_min,
-            "img": f"/static/profiles/{img_filename}"
+            "img": profile_img_url(nickname, "256")
         })
 
     return jsonify(users)
@@ -704,6 +781,8 @@ EXCLUDED_NICKNAMES      = {"아짱나", "미쿠"}
 # -------------------------------------------------------------------------
 
 def compute_love_graph():
+    import numpy as np  # 분석용 무거운 의존성은 refresh 워커에서 처음 쓸 때 로드
+
     SLOTS_PER_DAY = (60 * 24) // SLOT_MINUTES
     MULT = 2 if USE_OFFSET_SLOT else 1
     TOTAL_SLOTS = SLOTS_PER_DAY * DAYRANGE * MULT
@@ -911,14 +990,10 @@ def compute_love_graph():
         # 노드 생성
         nodes = []
         for nick in sorted(connected_nicks):
-            img_filename = safe_filename(nick) + ".png"
-            img_path = os.path.join(PROFILE_IMG_DIR, img_filename)
-            if not os.path.exists(img_path):
-                img_filename = PROFILE_DEFAULT_FILENAME
             nodes.append({
                 "id": nick,
                 "nickname": nick,
-                "img": f"/static/profiles/{quote(img_filename)}"
+                "img": profile_img_url(nick, "128")
             })
 
         return {"nodes": nodes, "links": links}
@@ -952,6 +1027,8 @@ def compute_attendance_correlation(top_n: int | None = None,
       - excluded_nicks: 제외할 닉네임 집합 (None이면 글로벌 EXCLUDED_NICKNAMES_CORR 사용)
     반환: 리스트[dict] (Top-N + 각 항목에 img URL 포함)
     """
+    import numpy as np  # 분석용 무거운 의존성은 refresh 워커에서 처음 쓸 때 로드
+
     top_n = top_n or CORR_TOP_N
 
     # 글로벌 set 기본값 사용 (EXCLUDED_NICKNAMES_CORR)
@@ -969,8 +1046,8 @@ def compute_attendance_correlation(top_n: int | None = None,
     start_date = today_kst - timedelta(days=DAYRANGE)
 
     # 날짜 인덱스 (start ~ end-1)
-    date_index = pd.date_range(start=start_date, end=end_date - timedelta(days=1), freq="D")
-    if len(date_index) == 0:
+    days_total = (end_date - start_date).days
+    if days_total <= 0:
         return []
 
     # 이 함수에서만 DictCursor 지정
@@ -1008,65 +1085,64 @@ def compute_attendance_correlation(top_n: int | None = None,
     if not att_rows:
         return []
 
-    att_df = pd.DataFrame(att_rows)
-
-    # 닉네임 제외 반영 (user_id 기준)
-    if not att_df.empty and effective_excluded:
-        # 먼저 user_id -> nickname 매핑을 써서 제외할 id 집합 생성
-        to_exclude_ids = {uid for uid, nick in user_map.items() if nick in effective_excluded}
-        # 위에서 user_map에서 pop 했기 때문에, att_df 기준으로 다시 계산
-        if not to_exclude_ids:
-            # 혹시 user_map pop 이전의 excluded_user_ids를 재활용 (안전망)
-            to_exclude_ids = excluded_user_ids if 'excluded_user_ids' in locals() else set()
-        if to_exclude_ids:
-            att_df = att_df[~att_df["user_id"].isin(to_exclude_ids)]
-
-    if att_df.empty:
+    # 출석 행렬(days × users, uint8)을 인덱스 배열로 바로 구성
+    att_rows = [r for r in att_rows if r["user_id"] not in excluded_user_ids]
+    if not att_rows:
         return []
 
-    att_df["day"] = pd.to_datetime(att_df["day"]).dt.date
-    att_df["present"] = (att_df["total_sec"] >= PRESENT_THRESHOLD_SEC).astype(int)
+    user_ids = sorted({r["user_id"] for r in att_rows})
+    col_of = {uid: j for j, uid in enumerate(user_ids)}
+    day_idx = np.fromiter(((r["day"] - start_date).days for r in att_rows), dtype=np.int64, count=len(att_rows))
+    col_idx = np.fromiter((col_of[r["user_id"]] for r in att_rows), dtype=np.int64, count=len(att_rows))
+    present = np.fromiter((int(r["total_sec"] or 0) >= PRESENT_THRESHOLD_SEC for r in att_rows),
+                          dtype=np.uint8, count=len(att_rows))
 
-    pivot = att_df.pivot_table(index="day", columns="user_id", values="present",
-                               aggfunc="max", fill_value=0)
-    pivot = pivot.reindex(date_index.date, fill_value=0)
-    pivot.index.name = "day"
+    in_range = (day_idx >= 0) & (day_idx < days_total)
+    matrix = np.zeros((days_total, len(user_ids)), dtype=np.uint8)
+    matrix[day_idx[in_range], col_idx[in_range]] = present[in_range]
 
     # 윈도우 동안 한 번이라도 출석한 유저만
-    active_users = [uid for uid in pivot.columns if pivot[uid].sum() > 0]
-    if len(active_users) <= 1:
+    col_sums = matrix.sum(axis=0, dtype=np.int64)
+    active = col_sums > 0
+    if int(active.sum()) <= 1:
         return []
 
-    pivot_active = pivot[active_users]
-    total_present_per_day = pivot_active.sum(axis=1)  # 일자별 출석자 수
-    N = len(active_users)
-
-    rows = []
-    for uid in active_users:
-        user_vec = pivot_active[uid].astype(float).values
-        others_present = (total_present_per_day - pivot_active[uid]).values
-        denom = N - 1
-
-        if denom <= 0:
-            corr = np.nan
-            group_mean_excl = np.nan
-        else:
-            group_rate_excl = others_present / denom
-            if np.std(user_vec) == 0 or np.std(group_rate_excl) == 0:
-                corr = np.nan
-            else:
-                corr = float(np.corrcoef(user_vec, group_rate_excl)[0, 1])
-            group_mean_excl = float(np.mean(group_rate_excl))
-
-        rows.append({
+    X = matrix[:, active].astype(np.int64)
+    active_ids = [uid for uid, a in zip(user_ids, active) if a]
+    N = len(active_ids)
+    D = days_total
+
+    # leave-one-out Pearson r(x, (T - x)/(N-1)) = r(x, T - x) 를 합계로 닫힌형 계산.
+    # 모두 D배 한 정수로 두어 분산 0 판정이 정확하도록 함 (x는 0/1 이라 Σx² = Σx)
+    T = X.sum(axis=1)                      # 일자별 출석자 수
+    S_x = X.sum(axis=0)
+    S_xT = T @ X
+    S_T = int(T.sum())
+    S_TT = int(T @ T)
+
+    cov_xT = D * S_xT - S_x * S_T
+    var_x = D * S_x - S_x * S_x
+    var_T = D * S_TT - S_T * S_T
+    cov_xy = cov_xT - var_x                # y = T - x
+    var_y = var_T - 2 * cov_xT + var_x
+
+    valid = (var_x > 0) & (var_y > 0)
+    corr = np.full(N, np.nan)
+    corr[valid] = cov_xy[valid] / np.sqrt(var_x[valid].astype(float) * var_y[valid].astype(float))
+    group_mean_excl = (S_T - S_x) / (D * (N - 1))
+
+    rows = [
+        {
             "user_id": int(uid),
             "nickname": user_map.get(uid, str(uid)),
-            "corr_with_group_excl_self": None if np.isnan(corr) else round(corr, 4),
-            "days_present": int(np.sum(user_vec)),
-            "days_total": int(len(pivot_active.index)),
-            "user_daily_mean": round(float(np.mean(user_vec)), 4),
-            "group_daily_mean_excl_self": None if np.isnan(group_mean_excl) else round(group_mean_excl, 4),
-        })
+            "corr_with_group_excl_self": None if np.isnan(corr[j]) else round(float(corr[j]), 4),
+            "days_present": int(S_x[j]),
+            "days_total": int(D),
+            "user_daily_mean": round(float(S_x[j] / D), 4),
+            "group_daily_mean_excl_self": round(float(group_mean_excl[j]), 4),
+        }
+        for j, uid in enumerate(active_ids)
+    ]
 
     # 상관계수 내림차순 (None은 뒤로)
     rows.sort(key=lambda r: (-r["corr_with_group_excl_self"]
@@ -1077,12 +1153,7 @@ def compute_attendance_correlation(top_n: int | None = None,
 
     # 이미지 URL 부여: safe_filename(nickname).png가 있으면 사용, 없으면 기본 이미지
     for r in top_rows:
-        nick = r["nickname"]
-        img_filename = f"{safe_filename(nick)}.png"
-        img_path = os.path.join(PROFILE_IMG_DIR, img_filename)
-        if not os.path.exists(img_path):
-            img_filename = PROFILE_DEFAULT_FILENAME
-        r["img"] = f"/static/profiles/{quote(img_filename)}"
+        r["img"] = profile_img_url(r["nickname"], "64")
 
     return top_rows
 
@@ -1104,13 +1175,10 @@ def get_user_info_by_nickname(cursor, nickname):
             u.nickname,
             u.comment,
             COALESCE(uas.total_count, 0) AS total_count,
-            (
-                SELECT MAX(a.enter_time)
-                FROM attendance a
-                WHERE a.user_id = u.user_id
-            ) AS last_enter_time
+            us.last_enter_time
         FROM users u
         LEFT JOIN user_attendance_summary uas ON u.user_id = uas.user_id
+        LEFT JOIN user_stats us ON u.user_id = us.user_id
         WHERE u.nickname = %s
         LIMIT 1
     """, (nickname,))
@@ -1133,19 +1201,13 @@ def get_user_info_by_nickname(cursor, nickname):
         for r in cursor.fetchall()
     ]
 
-    # 프로필 이미지
-    img_filename = safe_filename(nickname) + ".png"
-    img_path = os.path.join(PROFILE_IMG_DIR, img_filename)
-    if not os.path.exists(img_path):
-        img_filename = PROFILE_DEFAULT_FILENAME
-
     return {
         "user_id": user_id,
         "nickname": nickname,
         "comment": comment,
         "total_count": total_count,
         "last_attended": last_enter_time.strftime("%Y-%m-%d %H:%M") if last_enter_time else None,
-        "img": f"/static/profiles/{img_filename}",
+        "img": profile_img_url(nickname, "256"),
         "achievements": achievements,
     }
 
@@ -1153,39 +1215,144 @@ def get_user_info_by_nickname(cursor, nickname):
 TOP_N_RANK = 5
 
 
+TOPN_PERIOD_CACHE_PATH = WEB_CONFIG.get("topn_period_cache_path", "topn_period_cache.json")
+_topn_period_lock = Lock()
+
+
+def _month_key(d):
+    return f"{d.year:04d}-{d.month:02d}"
+
+
+def _week_key(d):
+    y, w, _ = d.isocalendar()
+    return f"{y:04d}-W{w:02d}"
+
+
+def _open_periods_start(today):
+    """이전/현재 달·주 중 가장 이른 시작일 (이 날짜 이후 기간은 아직 확정되지 않은 것으로 보고 재계산)"""
+    first_of_month = today.replace(day=1)
+    prev_month_start = (first_of_month - timedelta(days=1)).replace(day=1)
+    prev_week_start = today - timedelta(days=today.weekday(), weeks=1)
+    return min(prev_month_start, prev_week_start)
+
+
+def _load_topn_period_cache():
+    if os.path.exists(TOPN_PERIOD_CACHE_PATH):
+        try:
+            with open(TOPN_PERIOD_CACHE_PATH, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except Exception as e:
+            print(f"[WARN] Top-N 기간 캐시 읽기 실패: {e}")
+    return {}
+
+
+def _save_topn_period_cache(data):
+    tmp_path = TOPN_PERIOD_CACHE_PATH + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(data, f, ensure_ascii=False)
+    os.replace(tmp_path, TOPN_PERIOD_CACHE_PATH)
+
+
+def load_topn_period_counts(today=None):
+    """
+    기간(월/ISO주)별 {user_id: 출석일수} 집계를 반환.
+    - 완전히 끝난 기간은 TOPN_PERIOD_CACHE_PATH에 확정본으로 저장해 두고 재사용
+    - 이전/현재 기간(+ 지난번에 미확정이던 기간)만 DB에서 다시 읽어 갱신
+    반환: (by_month, by_week)  # {"YYYY-MM": Counter}, {"YYYY-Www": Counter}
+    """
+    today = today or date.today()
+
+    with _topn_period_lock:
+        cached = _load_topn_period_cache()
+        open_from = _open_periods_start(today)
+        if cached.get("open_from"):
+            # 지난 실행 때 열려 있던 기간부터 다시 계산(서버가 오래 꺼져 있었던 경우 포함)
+            open_from = min(open_from, date.fromisoformat(cached["open_from"]))
+        full_scan = not cached.get("open_from")
+
+        q = "SELECT DISTINCT user_id, enter_day FROM attendance"
+        params = ()
+        if not full_scan:
+            q += " WHERE enter_day >= %s"
+            params = (open_from,)
+
+        conn = pymysql.connect(**DB_CONFIG)
+        try:
+            with conn.cursor() as cursor:
+                cursor.execute(q, params)
+                rows = cursor.fetchall()  # [(user_id:int, enter_day:date), ...]
+        finally:
+            conn.close()
+
+        # 확정본은 open_from 이전에 시작한 기간만 사용 (그 이후는 아래에서 새로 채움)
+        by_month = defaultdict(Counter)
+        by_week = defaultdict(Counter)
+        if not full_scan:
+            for mk, cnt in cached.get("monthly", {}).items():
+                if date.fromisoformat(mk + "-01") < open_from:
+                    by_month[mk] = Counter({int(uid): days for uid, days in cnt.items()})
+            for wk, cnt in cached.get("weekly", {}).items():
+                y, w = wk.split("-W")
+                if date.fromisocalendar(int(y), int(w), 1) < open_from:
+                    by_week[wk] = Counter({int(uid): days for uid, days in cnt.items()})
+
+        # 재계산 대상 기간: 시작일이 open_from 이후라 조회 결과에 통째로 들어있는 기간만
+        fresh_month = defaultdict(Counter)
+        fresh_week = defaultdict(Counter)
+        for uid, d in rows:
+            if full_scan or d.replace(day=1) >= open_from:
+                fresh_month[_month_key(d)][uid] += 1
+            if full_scan or d - timedelta(days=d.weekday()) >= open_from:
+                fresh_week[_week_key(d)][uid] += 1
+        by_month.update(fresh_month)
+        by_week.update(fresh_week)
+
+        # 현재 기간은 계속 바뀌므로 저장하지 않음
+        cur_month_key, cur_week_key = _month_key(today), _week_key(today)
+        try:
+            _save_topn_period_cache({
+                "open_from": _open_periods_start(today).isoformat(),
+                "monthly": {k: dict(v) for k, v in by_month.items() if k != cur_month_key},
+                "weekly":  {k: dict(v) for k, v in by_week.items() if k != cur_week_key},
+            })
+        except Exception as e:
+            print(f"[WARN] Top-N 기간 캐시 저장 실패: {e}")
+
+    return by_month, by_week
+
+
 def compute_topn_threshold_counts(n=TOP_N_RANK, limit_months: int | None = None):
     """
-    DB에서 (user_id, enter_day)만 일괄로 읽고 파이썬에서 월/주 Top-N 횟수 계산.
+    기간별 (user_id, 출석일수) 집계에서 월/주 Top-N 횟수 계산.
     - 이번 달/이번 주 제외
     - 참가자 수 < n 이면 임계값 = 그 기간의 '최소값'
+    - limit_months가 없으면 확정된 기간 집계를 재사용(load_topn_period_counts)
     반환: { user_id: {"monthly": X, "weekly": Y} }
     """
-    q = "SELECT DISTINCT user_id, enter_day FROM attendance"
-    params = ()
-    if limit_months and limit_months > 0:
-        q += " WHERE enter_day >= CURDATE() - INTERVAL %s MONTH"
-        params = (limit_months,)
-
-    conn = pymysql.connect(**DB_CONFIG)
-    try:
-        with conn.cursor() as cursor:
-            cursor.execute(q, params)
-            rows = cursor.fetchall()  # [(user_id:int, enter_day:date), ...]
-    finally:
-        conn.close()
-
     today = date.today()
-    cur_month_key = (today.year, today.month)
-    iy, iw, _ = today.isocalendar()
-    cur_week_key = (iy, iw)
+    cur_month_key = _month_key(today)
+    cur_week_key = _week_key(today)
 
-    by_month = defaultdict(Counter)  # {(y,m): Counter({uid: days})}
-    by_week  = defaultdict(Counter)  # {(ISOy,ISOw): Counter({uid: days})}
-
-    for uid, d in rows:
-        by_month[(d.year, d.month)][uid] += 1
-        y, w, _ = d.isocalendar()
-        by_week[(y, w)][uid] += 1
+    if limit_months and limit_months > 0:
+        conn = pymysql.connect(**DB_CONFIG)
+        try:
+            with conn.cursor() as cursor:
+                cursor.execute(
+                    "SELECT DISTINCT user_id, enter_day FROM attendance"
+                    " WHERE enter_day >= CURDATE() - INTERVAL %s MONTH",
+                    (limit_months,),
+                )
+                rows = cursor.fetchall()
+        finally:
+            conn.close()
+
+        by_month = defaultdict(Counter)  # {"YYYY-MM": Counter({uid: days})}
+        by_week  = defaultdict(Counter)  # {"YYYY-Www": Counter({uid: days})}
+        for uid, d in rows:
+            by_month[_month_key(d)][uid] += 1
+            by_week[_week_key(d)][uid] += 1
+    else:
+        by_month, by_week = load_topn_period_counts(today)
 
     def nth_threshold(counter: Counter, n_: int):
         if not counter:
@@ -1225,26 +1392,26 @@ def compute_topn_threshold_counts(n=TOP_N_RANK, limit_months: int | None = None)
 
 
 def compute_all_user_details():
-    topn_counts = compute_topn_threshold_counts(n=TOP_N_RANK)
-
-    today = date.today()
+    """
+    유저 디테일의 core(기본 정보/누적 통계/도전과제)만 전체 유저에 대해 계산.
+    최근 30일/Top-N 횟수는 get_user_detail_extras()가 요청 시 계산.
+    """
     conn = pymysql.connect(**DB_CONFIG)
     try:
         with conn.cursor() as cursor:
-            # ✅ 기본 정보: 마지막 '입장' 시각을 서브쿼리로 가져오기
+            # ✅ 기본 정보 + 누적 통계: user_stats(업로더가 증분 갱신)에서 한 번에
             cursor.execute("""
                 SELECT
                     u.user_id,
                     u.nickname,
                     u.comment,
                     COALESCE(uas.total_count, 0) AS total_count,
-                    (
-                        SELECT MAX(a.enter_time)
-                        FROM attendance a
-                        WHERE a.user_id = u.user_id
-                    ) AS last_enter_time
+                    us.last_enter_time,
+                    COALESCE(us.total_duration_sec, 0) AS total_sec,
+                    COALESCE(us.song_count, 0) AS song_cnt
                 FROM users u
                 LEFT JOIN user_attendance_summary uas ON u.user_id = uas.user_id
+                LEFT JOIN user_stats us ON u.user_id = us.user_id
             """)
             base_rows = cursor.fetchall()
 
@@ -1262,55 +1429,11 @@ def compute_all_user_details():
                     "description": desc,
                     "achieved_at": d.strftime("%Y-%m-%d")
                 })
-
-            # 총 재생시간
-            cursor.execute("""
-                SELECT user_id, COALESCE(SUM(duration_sec), 0) AS total_sec
-                FROM attendance
-                GROUP BY user_id
-            """)
-            total_sec_map = {uid: sec for uid, sec in cursor.fetchall()}
-
-            # 곡 수
-            cursor.execute("""
-                SELECT user_id, COUNT(*) AS cnt
-                FROM music_play
-                GROUP BY user_id
-            """)
-            song_cnt_map = {uid: cnt for uid, cnt in cursor.fetchall()}
-
-            # 최근 30일
-            cursor.execute("""
-                SELECT user_id, enter_day AS day, SUM(duration_sec) AS sec
-                FROM attendance
-                WHERE enter_day >= CURDATE() - INTERVAL 29 DAY
-                GROUP BY user_id, day
-                ORDER BY day ASC
-            """)
-            recent_map = {}
-            for uid, d, sec in cursor.fetchall():
-                recent_map.setdefault(uid, {})[d] = sec
     finally:
         conn.close()
 
     details_by_nick = {}
-    for user_id, nickname, comment, total_count, last_enter_time in base_rows:
-        img_filename = safe_filename(nickname) + ".png"
-        img_path = os.path.join(PROFILE_IMG_DIR, img_filename)
-        if not os.path.exists(img_path):
-            img_filename = PROFILE_DEFAULT_FILENAME
-
-        per = recent_map.get(user_id, {})
-        recent_30days = []
-        for i in range(30):
-            d = today - timedelta(days=29 - i)
-            recent_30days.append({
-                "date": d.strftime("%Y-%m-%d"),
-                "duration_sec": per.get(d, 0)
-            })
-
-        cnts = topn_counts.get(user_id, {"monthly": 0, "weekly": 0})
-
+    for user_id, nickname, comment, total_count, last_enter_time, total_sec, song_cnt in base_rows:
         details_by_nick[nickname] = {
             "user_id": user_id,
             "nickname": nickname,
@@ -1318,18 +1441,89 @@ def compute_all_user_details():
             "total_count": total_count,
             # ✅ 마지막 '입장' 시각으로 노출
             "last_attended": last_enter_time.strftime("%Y-%m-%d %H:%M") if last_enter_time else None,
-            "img": f"/static/profiles/{img_filename}",
+            "img": profile_img_url(nickname),
             "achievements": ach_map.get(user_id, []),
 
-            "play_duration_sec": total_sec_map.get(user_id, 0),
-            "song_play_count":   song_cnt_map.get(user_id, 0),
-            "recent_30days":     recent_30days,
+            "play_duration_sec": total_sec,
+            "song_play_count":   song_cnt,
+        }
+
+    return details_by_nick
 
+
+# --- 유저 디테일 지연 계산부 (최근 30일 / Top-N) ----------------------------------
+USER_DETAIL_LRU_SIZE = 256
+USER_DETAIL_LRU_TTL_SEC = 600
+
+
+user_detail_lru = TTLLRUCache(USER_DETAIL_LRU_SIZE, USER_DETAIL_LRU_TTL_SEC)
+
+# 📌 유저별 계산 락: 같은 유저의 LRU 미스가 동시에 들어와도 DB 조회는 한 번만 (og.py _build_lock과 같은 방식)
+#    유저 수만큼만 생기므로 정리하지 않음
+_user_detail_locks = {}
+_user_detail_locks_guard = Lock()
+
+
+def _user_detail_lock(user_id: int) -> Lock:
+    with _user_detail_locks_guard:
+        lock = _user_detail_locks.get(user_id)
+        if lock is None:
+            lock = _user_detail_locks[user_id] = Lock()
+        return lock
+
+
+def compute_recent_30days(user_id: int, today: date = None):
+    today = today or date.today()
+    conn = pymysql.connect(**DB_CONFIG)
+    try:
+        with conn.cursor() as cursor:
+            cursor.execute("""
+                SELECT enter_day AS day, SUM(duration_sec) AS sec
+                FROM attendance
+                WHERE user_id = %s
+                  AND enter_day >= %s
+                GROUP BY day
+            """, (user_id, today - timedelta(days=29)))
+            per = {d: sec for d, sec in cursor.fetchall()}
+    finally:
+        conn.close()
+
+    recent_30days = []
+    for i in range(30):
+        d = today - timedelta(days=29 - i)
+        recent_30days.append({
+            "date": d.strftime("%Y-%m-%d"),
+            "duration_sec": per.get(d, 0)
+        })
+    return recent_30days
+
+
+def get_user_detail_extras(user_id: int, version: int, topn_counts: dict):
+    """
+    최근 30일은 처음 요청될 때 계산해 LRU에 보관.
+    Top-N 횟수는 갱신 작업이 버전당 한 번 계산해 둔 cache_store["user_topn_counts"]에서 조회.
+    키에 오늘 날짜를 넣어 자정이 지나면 30일 구간이 새 날짜 기준으로 다시 계산됨
+    """
+    today = date.today()
+    key = (version, today, user_id)
+    extras = user_detail_lru.get(key)
+    if extras is not None:
+        return extras
+
+    with _user_detail_lock(user_id):
+        # 기다리는 동안 다른 요청이 계산했으면 그대로 사용
+        extras = user_detail_lru.get(key)
+        if extras is not None:
+            return extras
+
+        cnts = topn_counts.get(user_id, {"monthly": 0, "weekly": 0})
+        extras = {
+            "recent_30days": compute_recent_30days(user_id, today),
             "topn_monthly_count_excl_current": cnts.get("monthly", 0),
             "topn_weekly_count_excl_current":  cnts.get("weekly", 0),
         }
-
-    return details_by_nick
+        user_detail_lru.put(key, extras)
+    return extras
 
 @app.route("/api/user-details")
 def user_details():
@@ -1337,14 +1531,71 @@ def user_details():
     if not nickname:
         return jsonify({"error": "닉네임 없음"}), 400
 
-    # 캐시에서 바로 조회 (락으로 보호)
+    # core는 캐시에서 바로 조회 (락으로 보호)
     with cache_lock:
         info = cache_store["user_details_by_nickname"].get(nickname)
+        version = cache_store["user_details_version"]
+        topn_counts = cache_store["user_topn_counts"]
 
     if not info:
         return jsonify({"error": "사용자 없음 또는 캐시 미구축"}), 404
 
-    return jsonify(info)
+    # 무거운 부분은 요청 시 계산 + LRU
+    return jsonify({**info, **get_user_detail_extras(info["user_id"], version, topn_counts)})
+
+
+def compute_achievement_progress():
+    """
+    진행도 함수가 있는 도전과제(ChillGuy, 최애숭배, 39, 파인튜닝)의 유저별 진행도.
+    db_achiv가 achievement_state에 남긴 규칙 state(워터마크까지의 요약)를 이어받아
+    워터마크 다음날 이후 행만 읽어 계산 (state가 없는 규칙이 있으면 전체 기간)
+    반환: {nickname: {도전과제 이름: {"current", "goal", "achieved", ...}}}
+    """
+    rules = [rule for rule in achievement_engine.RULES if rule.progress]
+    inputs = {name for rule in rules for name in rule.inputs} | {achievement_engine.INPUT_USERS}
+
+    conn = pymysql.connect(**DB_CONFIG)
+    try:
+        entries = db_achiv.load_achievement_state(conn, create=False)
+        watermarks = [entries.get(rule.name, {}).get("watermark") for rule in rules]
+        since = (min(date.fromisoformat(w) for w in watermarks) + timedelta(days=1)) if all(watermarks) else None
+        rows = achievement_engine.load_rows(conn, since, inputs=inputs)
+        with conn.cursor() as cursor:
+            cursor.execute("""
+                SELECT ua.user_id, a.name
+                FROM user_achievements ua
+                JOIN achievements a ON ua.achievement_id = a.achievement_id
+            """)
+            achieved = {(uid, name) for uid, name in cursor.fetchall()}
+    finally:
+        conn.close()
+
+    progress = achievement_engine.compute_progress(rows, datetime.now(KST).date(), entries, rules)
+    result = {}
+    for uid, nickname in rows[2]:
+        per_rule = progress.get(uid, {})
+        result[nickname] = {
+            rule.name: {
+                **per_rule.get(rule.name, {}),
+                "achieved": (uid, rule.name) in achieved,
+            }
+            for rule in rules
+        }
+    return result
+
+
+@app.route("/api/achievement-progress")
+def achievement_progress():
+    nickname = request.args.get("nickname")
+    if not nickname:
+        return jsonify({"error": "닉네임 없음"}), 400
+
+    with cache_lock:
+        progress = cache_store["achievement_progress_by_nickname"].get(nickname)
+
+    if progress is None:
+        return jsonify({"error": "사용자 없음 또는 캐시 미구축"}), 404
+    return jsonify(progress)
 
 
 @app.route("/api/random-users")
@@ -1475,8 +1726,31 @@ app.register_blueprint(create_user_card_blueprint(
     route_prefix="",  # 필요 시 "/community"
     template_user_page="og.html",
     cache_dir=OG_CACHE_DIR,   # e.g. "./og_cache"
+    thumb_dir=THUMB_DIR,
+    card_formats=OG_CARD_FORMATS,
 ))
 
+def prepare_user_stats():
+    """
+    📌 user_stats 테이블 준비(없으면 생성 + 백필). 랭킹/전체 유저/랜덤 유저 라우트가 요청 경로에서
+    user_stats를 JOIN하므로, 갱신 작업을 기다리지 않고 기동 시(라우트 서빙 전) 한 번 확인
+    """
+    try:
+        conn = pymysql.connect(**DB_CONFIG)
+    except Exception as e:
+        print(f"[ERROR] user_stats 준비 실패 (DB 연결): {e}")
+        return
+    try:
+        if user_stats.ensure_user_stats(conn):
+            print("[INFO] user_stats 테이블 백필 완료")
+    except Exception as e:
+        print(f"[ERROR] user_stats 준비 실패: {e}")
+    finally:
+        conn.close()
+
+
+prepare_user_stats()
+
 if __name__ == "__main__":
     app.run(host='0.0.0.0', debug=True)
     #app.run(debug=True, port=5001)
\ No newline at end of file
@@ -1,1115 +1,463 @@
 import pymysql
 import json
 import os
+import argparse
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
-from collections import defaultdict
+import user_stats
+import achievement_engine as engine
 
-START_DAY = '2025-05-12'
-DEFAULT_CACHE_PATH = "achievement_cache.json"
 CONFIG_PATH = "config.json"
 
-def load_achievement_cache(cache_path=DEFAULT_CACHE_PATH):
-    """
-    캐시 파일을 불러옵니다. 없으면 빈 딕셔너리 반환.
-    """
-    if os.path.exists(cache_path):
-        with open(cache_path, "r", encoding="utf-8") as f:
-            return json.load(f)
-    return {}
+# 예전 JSON 사이드 캐시 (처음 실행 시 user_achievements로 옮긴 뒤 *.migrated로 이름 변경)
+LEGACY_CACHE_PATH = "achievement_cache.json"
+LEGACY_CACHE_KEYS = {"finet파인튜닝uning": "파인튜닝"}  # 캐시 키가 도전과제 이름과 달랐던 항목
 
-def save_achievement_cache(cache_data, cache_path=DEFAULT_CACHE_PATH):
-    """
-    캐시 데이터를 파일에 저장합니다.
-    """
-    with open(cache_path, "w", encoding="utf-8") as f:
-        json.dump(cache_data, f, ensure_ascii=False, indent=2)
+ACHIEVEMENT_STATE_DDL = """
+    CREATE TABLE IF NOT EXISTS achievement_state (
+        name       VARCHAR(64) PRIMARY KEY,
+        watermark  DATE         NULL,
+        state      LONGTEXT     NOT NULL,
+        updated_at DATETIME     NOT NULL
+    )
+"""
 
-def ensure_achievement_key(cache_data, achievement_name):
-    """
-    주어진 캐시에 해당 도전과제 키가 없으면 빈 딕셔너리로 초기화합니다.
-    """
-    if achievement_name not in cache_data:
-        cache_data[achievement_name] = {}
-    return cache_data[achievement_name]
 
-def sync_cache_to_db(cache_data, achievement_name, conn):
+def load_achievement_state(conn, create=True):
     """
-    캐시에 저장된 user_id → 날짜 정보를 DB에 반영합니다.
-    이미 DB에 있는 경우는 무시됩니다.
+    규칙별 증분 평가 상태를 한 번에 읽습니다. (app.py 진행도 계산도 읽기 전용으로 사용)
+    create=False(dry-run)면 테이블을 만들지 않고, 없으면 빈 상태로 봅니다.
+    반환: { 도전과제 이름: {"watermark": "YYYY-MM-DD", "state": {...}} }
     """
     with conn.cursor() as cursor:
-        # 도전과제 ID 조회
-        cursor.execute("""
-            SELECT achievement_id FROM achievements WHERE name = %s
-        """, (achievement_name,))
-        result = cursor.fetchone()
-        if not result:
-            raise ValueError(f"[ERROR] 도전과제 '{achievement_name}'이 존재하지 않습니다.")
-        achievement_id = result[0]
-
-        # 이미 존재하는 (user_id, date) 쌍 조회
-        cursor.execute("""
-            SELECT user_id, DATE(achieved_at) FROM user_achievements
-            WHERE achievement_id = %s
-        """, (achievement_id,))
-        already_in_db = {(uid, date.strftime("%Y-%m-%d")) for uid, date in cursor.fetchall()}
-
-        inserted = 0
-        for uid_str, date in cache_data.get(achievement_name, {}).items():
-            uid = int(uid_str)  # 👈 명시적으로 int 변환
-            if (uid, date) not in already_in_db:
-                cursor.execute("""
-                    INSERT IGNORE INTO user_achievements (user_id, achievement_id, achieved_at)
-                    VALUES (%s, %s, %s)
-                """, (uid, achievement_id, date))  # 👈 uid는 이제 int형
-                inserted += 1
-
-        if inserted:
-            conn.commit()
-            print(f"[SYNC] 캐시에서 DB로 {inserted}건 삽입 완료.")
-
-
-#인싸:        10명이서 저댄
-def award_inssa_achievement_from_date(start_date_str: str, conn):
+        if create:
+            cursor.execute(ACHIEVEMENT_STATE_DDL)
+        else:
+            cursor.execute("SHOW TABLES LIKE 'achievement_state'")
+            if not cursor.fetchall():
+                return {}
+        cursor.execute("SELECT name, watermark, state FROM achievement_state")
+        return {
+            name: {"watermark": watermark.isoformat() if watermark else None, "state": json.loads(state)}
+            for name, watermark, state in cursor.fetchall()
+        }
+
+
+def migrate_legacy_cache(sink):
     """
-    '인싸' 도전과제: 하루에 10명 이상이 참여한 날, 그날 참석한 모든 유저에게 도전과제 부여
-    - 캐시: 기록용
-    - 중복 방지: DB 기준으로 판단
-    - conn: 외부에서 주입된 pymysql 커넥션
+    예전 achievement_cache.json이 남아 있으면 한 번만 DB로 옮깁니다.
+    DB에 없는 지급 기록을 user_achievements에 반영 (캐시 키 → 도전과제 이름 보정)
     """
-    # 📌 캐시 로딩 및 키 보장
-    cache = load_achievement_cache()
-    inssa_cache = ensure_achievement_key(cache, "인싸")
-
-    # 📌 캐시 → DB 동기화
-    sync_cache_to_db(cache, "인싸", conn)
-
-    try:
-        with conn.cursor() as cursor:
-            # 1️⃣ 도전과제 ID 조회
-            cursor.execute("SELECT achievement_id FROM achievements WHERE name = '인싸'")
-            result = cursor.fetchone()
-            if not result:
-                print("[ERROR] '인싸' 도전과제가 존재하지 않습니다.")
-                return
-            achievement_id = result[0]
-
-            # 2️⃣ 날짜 루프
-            start_date = datetime.strptime(start_date_str, "%Y-%m-%d").date()
-            today = datetime.today().date()
-            current_date = start_date
-            new_awards = {}
-
-            while current_date <= today:
-                date_str = current_date.strftime("%Y-%m-%d")
-
-                # 3️⃣ 해당 날짜 참여 유저 조회
-                cursor.execute("""
-                    SELECT DISTINCT user_id
-                    FROM attendance
-                    WHERE DATE(enter_time) = %s
-                """, (date_str,))
-                user_ids = [row[0] for row in cursor.fetchall()]
-
-                if len(user_ids) >= 10:
-                    # 4️⃣ DB 기준 중복 제거
-                    cursor.execute("""
-                        SELECT user_id FROM user_achievements
-                        WHERE achievement_id = %s
-                    """, (achievement_id,))
-                    already_awarded = {row[0] for row in cursor.fetchall()}
-
-                    to_award = [uid for uid in user_ids if uid not in already_awarded]
-
-                    # 5️⃣ INSERT & 캐시에 기록
-                    for uid in to_award:
-                        cursor.execute("""
-                            INSERT INTO user_achievements (user_id, achievement_id, achieved_at)
-                            VALUES (%s, %s, %s)
-                        """, (uid, achievement_id, date_str))
-                        new_awards[str(uid)] = date_str
-
-                    if to_award:
-                        conn.commit()
-                        print(f"[INFO] {date_str}: {len(to_award)}명에게 '인싸' 도전과제 지급 완료!")
-                    else:
-                        print(f"[INFO] {date_str}: 이미 모두 달성함.")
-                else:
-                    print(f"[INFO] {date_str}: 참여자 {len(user_ids)}명으로 조건 불충족.")
-
-                current_date += timedelta(days=1)
-
-        # 6️⃣ 캐시 갱신 및 저장
-        inssa_cache.update(new_awards)
-        save_achievement_cache(cache)
-
-    except Exception as e:
-        print(f"[FATAL] 실행 중 예외 발생: {e}")
-
-#칠가이:        7일 연속 저댄
-def award_chill_guy_achievement(conn):
-    cache = load_achievement_cache()
-    chill_cache = ensure_achievement_key(cache, "ChillGuy")
-
-    try:
-        sync_cache_to_db(cache, "ChillGuy", conn)
-
-        with conn.cursor() as cursor:
-            # 1️⃣ 도전과제 ID 조회
-            cursor.execute("SELECT achievement_id FROM achievements WHERE name = 'ChillGuy'")
-            result = cursor.fetchone()
-            if not result:
-                print("[ERROR] 'ChillGuy' 도전과제가 존재하지 않습니다.")
-                return
-            achievement_id = result[0]
-
-            # 2️⃣ 전체 유저 조회
-            cursor.execute("SELECT DISTINCT user_id FROM attendance")
-            all_users = [row[0] for row in cursor.fetchall()]
-
-            # 2-1️⃣ DB에 이미 달성한 유저 확인
-            cursor.execute("""
-                SELECT user_id FROM user_achievements
-                WHERE achievement_id = %s
-            """, (achievement_id,))
-            already_awarded = {row[0] for row in cursor.fetchall()}
-
-            # 2-2️⃣ 캐시 + DB 모두에 없는 유저만 대상
-            target_users = [
-                uid for uid in all_users
-                if str(uid) not in chill_cache and uid not in already_awarded
-            ]
-
-            new_awards = {}
-
-            # 3️⃣ 7일 연속 출석 검사
-            for uid in target_users:
-                cursor.execute("""
-                    SELECT DISTINCT DATE(enter_time) as day
-                    FROM attendance
-                    WHERE user_id = %s
-                    ORDER BY day
-                """, (uid,))
-                dates = [row[0] for row in cursor.fetchall()]
-                if len(dates) < 7:
-                    continue
-
-                dates_set = set(dates)
-                for i in range(len(dates)):
-                    start_date = dates[i]
-                    if all((start_date + timedelta(days=j)) in dates_set for j in range(7)):
-                        achieved_at = (start_date + timedelta(days=6)).strftime("%Y-%m-%d")
-                        cursor.execute("""
-                            INSERT INTO user_achievements (user_id, achievement_id, achieved_at)
-                            VALUES (%s, %s, %s)
-                        """, (uid, achievement_id, achieved_at))
-                        conn.commit()
-                        new_awards[str(uid)] = achieved_at
-                        print(f"[INFO] 유저 {uid} - 7일 연속 출석으로 'ChillGuy' 달성!")
-                        break
-
-            # 5️⃣ 캐시 갱신
-            chill_cache.update(new_awards)
-            save_achievement_cache(cache)
-
-    except Exception as e:
-        print(f"[ERROR] 처리 중 오류 발생: {e}")
-
-#과몰입:        단 둘이서
-def award_over_immersed_achievement_from_date(start_date_str, conn):
+    if not os.path.exists(LEGACY_CACHE_PATH):
+        return
+    with open(LEGACY_CACHE_PATH, "r", encoding="utf-8") as f:
+        cache = json.load(f)
+    for key, entries in cache.items():
+        name = LEGACY_CACHE_KEYS.get(key, key)
+        if name not in sink.ids:
+            print(f"[WARN] 캐시 키 '{key}'에 해당하는 도전과제가 없어 건너뜁니다.")
+            continue
+        for uid_str, day in entries.items():
+            sink.add(name, int(uid_str), day)
+    print(f"[MIGRATE] {LEGACY_CACHE_PATH} → user_achievements {len(sink.pending)}건")
+
+    if sink.pending:
+        sink.flush()
+    os.replace(LEGACY_CACHE_PATH, LEGACY_CACHE_PATH + ".migrated")
+
+
+class AwardSink:
     """
-    도전과제 '과몰입' 부여:
-    특정 날짜 이후, 딱 두 명만 출석한 날에 한하여,
-    그 두 명 중 아직 해당 도전과제를 획득하지 않은 사람에게 부여.
+    도전과제 지급 버퍼.
+    - achievements / user_achievements를 실행 시작 시 한 번만 읽어 도전과제별 보유 user_id 집합으로 보관
+    - add()/set_state()로 쌓고 flush()에서 지급(executemany INSERT IGNORE)과 규칙 상태를 한 트랜잭션으로 기록
     """
-
-    cache = load_achievement_cache()
-    over_cache = ensure_achievement_key(cache, "과몰입")
-
-    try:
-        sync_cache_to_db(cache, "과몰입", conn)
-
+    def __init__(self, conn):
+        self.conn = conn
+        self.discard()
         with conn.cursor() as cursor:
-            # 1️⃣ '과몰입' 도전과제 ID 조회
-            cursor.execute("SELECT achievement_id FROM achievements WHERE name = '과몰입'")
-            result = cursor.fetchone()
-            if not result:
-                print("[ERROR] '과몰입' 도전과제가 존재하지 않습니다.")
-                return
-            achievement_id = result[0]
-
-            # 2️⃣ 시작일부터 오늘까지 순회
-            start_date = datetime.strptime(start_date_str, "%Y-%m-%d").date()
-            today = datetime.today().date()
-            current_date = start_date
-
-            new_awards = {}
-
-            while current_date <= today:
-                date_str = current_date.strftime("%Y-%m-%d")
-
-                cursor.execute("""
-                    SELECT DISTINCT user_id
-                    FROM attendance
-                    WHERE DATE(enter_time) = %s
-                """, (date_str,))
-                users = [row[0] for row in cursor.fetchall()]
-
-                if len(users) == 2:
-                    new_achievers = [uid for uid in users if str(uid) not in over_cache]
-
-                    for uid in new_achievers:
-                        cursor.execute("""
-                            INSERT INTO user_achievements (user_id, achievement_id, achieved_at)
-                            VALUES (%s, %s, %s)
-                        """, (uid, achievement_id, date_str))
-                        new_awards[str(uid)] = date_str
-
-                    if new_achievers:
-                        conn.commit()
-                        print(f"[INFO] {date_str}: {len(new_achievers)}명에게 '과몰입' 도전과제 지급 완료!")
-                    else:
-                        print(f"[INFO] {date_str}: 캐시에 의해 모두 달성된 상태입니다.")
-                else:
-                    print(f"[INFO] {date_str}: 참여자 수 {len(users)}명 → 조건 불충족.")
-
-                current_date += timedelta(days=1)
-
-            over_cache.update(new_awards)
-            save_achievement_cache(cache)
-
-    except Exception as e:
-        print(f"[ERROR] 처리 중 예외 발생: {e}")
-
-#완장:         나없을때 저댄
-def award_captain_achievement_from_date(start_date_str, conn):
+            cursor.execute("SELECT achievement_id, name FROM achievements")
+            self.ids = {name: aid for aid, name in cursor.fetchall()}
+            cursor.execute("SELECT user_id, achievement_id, DATE(achieved_at) FROM user_achievements")
+            self.held = {}   # achievement_id -> {user_id: 달성일 "YYYY-MM-DD"}
+            for uid, aid, day in cursor.fetchall():
+                self.held.setdefault(aid, {})[uid] = day.strftime("%Y-%m-%d") if day else None
+
+    def achievement_id(self, achievement_name):
+        if achievement_name not in self.ids:
+            raise ValueError(f"도전과제 '{achievement_name}'이 존재하지 않습니다.")
+        return self.ids[achievement_name]
+
+    def holders(self, achievement_name):
+        return set(self.held.get(self.achievement_id(achievement_name), ()))
+
+    def held_dates(self, achievement_name):
+        """{user_id: 달성일} (dry-run 비교용)"""
+        return dict(self.held.get(self.achievement_id(achievement_name), {}))
+
+    def add(self, achievement_name, user_id, achieved_at):
+        """이미 가진 (유저, 도전과제)는 건너뜀. 반환: 버퍼에 추가 여부"""
+        uid, aid = int(user_id), self.achievement_id(achievement_name)
+        if uid in self.held.get(aid, ()) or (uid, aid) in self._pending_keys:
+            return False
+        self._pending_keys.add((uid, aid))
+        self.pending.append((uid, aid, achieved_at))
+        return True
+
+    def set_state(self, achievement_name, entry):
+        """규칙 상태 {"watermark", "state"}를 다음 flush에 함께 기록"""
+        self.pending_states[achievement_name] = entry
+
+    def flush(self):
+        """버퍼를 한 트랜잭션으로 기록. 실패 시 롤백 후 예외 전달. 반환: 기록 지급 행 수"""
+        rows, states = self.pending, self.pending_states
+        self.discard()
+        if not rows and not states:
+            return 0
+        try:
+            with self.conn.cursor() as cursor:
+                if rows:
+                    cursor.executemany("""
+                        INSERT IGNORE INTO user_achievements (user_id, achievement_id, achieved_at)
+                        VALUES (%s, %s, %s)
+                    """, rows)
+                if states:
+                    cursor.executemany("""
+                        REPLACE INTO achievement_state (name, watermark, state, updated_at)
+                        VALUES (%s, %s, %s, NOW())
+                    """, [(name, entry.get("watermark"), json.dumps(entry.get("state") or {}, ensure_ascii=False))
+                          for name, entry in states.items()])
+            self.conn.commit()
+        except Exception:
+            self.conn.rollback()
+            raise
+        for uid, aid, day in rows:
+            self.held.setdefault(aid, {})[uid] = day
+        return len(rows)
+
+    def discard(self):
+        self.pending = []
+        self.pending_states = {}
+        self._pending_keys = set()
+
+
+def award_from_rule(sink, achievement_name, evaluate):
     """
-    '완장' 도전과제 부여 함수.
-    Nine_Bones가 참여하지 않은 날의 출석자 중 아직 도전과제를 획득하지 않은 사람에게 부여.
+    규칙 하나를 평가해 신규 달성자와 규칙 상태를 한 트랜잭션으로 기록합니다.
+    - evaluate: already(set) -> (awards {user_id: date}, 상태 {"watermark", "state"})
+    반환: 신규 달성 {user_id: date}, 실패 시 None (상태도 기록되지 않아 워터마크 유지)
     """
-
-    cache = load_achievement_cache()
-    captain_cache = ensure_achievement_key(cache, "완장")
-
     try:
-        sync_cache_to_db(cache, "완장", conn)
-
-        with conn.cursor() as cursor:
-            # 1️⃣ '완장' 도전과제 ID 조회
-            cursor.execute("SELECT achievement_id FROM achievements WHERE name = '완장'")
-            result = cursor.fetchone()
-            if not result:
-                print("[ERROR] '완장' 도전과제가 존재하지 않습니다.")
-                return
-            achievement_id = result[0]
-
-            # 2️⃣ 날짜 순회
-            start_date = datetime.strptime(start_date_str, "%Y-%m-%d").date()
-            today = datetime.today().date()
-            current_date = start_date
-
-            new_awards = {}
-
-            while current_date <= today:
-                date_str = current_date.strftime("%Y-%m-%d")
-                cursor.execute("""
-                    SELECT DISTINCT a.user_id, u.nickname
-                    FROM attendance a
-                    JOIN users u ON a.user_id = u.user_id
-                    WHERE DATE(a.enter_time) = %s
-                """, (date_str,))
-                rows = cursor.fetchall()
-
-                nicknames = [row[1] for row in rows]
-                if "Nine_Bones" in nicknames:
-                    print(f"[INFO] {date_str}: Nine_Bones가 참여 → 조건 불충족.")
-                elif rows:
-                    # 캐시에 없는 사람만 추출
-                    new_achievers = [row[0] for row in rows if str(row[0]) not in captain_cache]
-
-                    for uid in new_achievers:
-                        cursor.execute("""
-                            INSERT INTO user_achievements (user_id, achievement_id, achieved_at)
-                            VALUES (%s, %s, %s)
-                        """, (uid, achievement_id, date_str))
-                        new_awards[str(uid)] = date_str
-
-                    if new_achievers:
-                        conn.commit()
-                        print(f"[INFO] {date_str}: {len(new_achievers)}명에게 '완장' 도전과제 지급 완료!")
-                    else:
-                        print(f"[INFO] {date_str}: 캐시에 의해 모두 달성함.")
-                else:
-                    print(f"[INFO] {date_str}: 참여자가 없습니다.")
-
-                current_date += timedelta(days=1)
+        awards, entry = evaluate(sink.holders(achievement_name))
 
-            # 캐시 저장
-            captain_cache.update(new_awards)
-            save_achievement_cache(cache)
+        for uid, day in sorted(awards.items(), key=lambda kv: (kv[1], kv[0])):
+            sink.add(achievement_name, uid, day.strftime("%Y-%m-%d"))
+            print(f"[INFO] 유저 {uid} - '{achievement_name}' 달성! ({day})")
+        sink.set_state(achievement_name, entry)
+        sink.flush()
 
     except Exception as e:
-        print(f"[ERROR] 처리 중 오류 발생: {e}")
-
-#최애숭배:      한 곡 30번
-def award_favorite_song_achievement(conn):
-    """
-    '최애숭배' 도전과제 부여:
-    같은 곡을 30일 이상 튼 유저에게, 30번째 날짜를 달성일로 기록.
-    하루에 여러 번 재생해도 1일 1회로 계산.
-    """
-
-    cache = load_achievement_cache()
-    favorite_cache = ensure_achievement_key(cache, "최애숭배")
+        sink.discard()
+        print(f"[ERROR] '{achievement_name}' 처리 중 예외 발생: {e}")
+        return None
 
-    try:
-        sync_cache_to_db(cache, "최애숭배", conn)
+    return awards
 
-        with conn.cursor() as cursor:
-            # 1️⃣ 도전과제 ID 조회
-            cursor.execute("SELECT achievement_id FROM achievements WHERE name = '최애숭배'")
-            result = cursor.fetchone()
-            if not result:
-                print("[ERROR] '최애숭배' 도전과제가 존재하지 않습니다.")
-                return
-            achievement_id = result[0]
-
-            # 2️⃣ music_play 기록이 있는 유저 중 캐시에 없는 유저만 추림
-            cursor.execute("SELECT DISTINCT user_id FROM music_play")
-            all_users = [row[0] for row in cursor.fetchall()]
-            target_users = [uid for uid in all_users if str(uid) not in favorite_cache]
-
-            new_awards = {}
-
-            for uid in target_users:
-                # 곡별로 재생 날짜 수집 (중복 날짜 제거용 GROUP BY)
-                cursor.execute("""
-                    SELECT title, DATE(played_at) as play_day
-                    FROM music_play
-                    WHERE user_id = %s
-                    GROUP BY title, play_day
-                    ORDER BY title, play_day
-                """, (uid,))
-                rows = cursor.fetchall()
-
-                song_days = defaultdict(list)
-                for title, play_day in rows:
-                    song_days[title].append(play_day)
-
-                for title, days in song_days.items():
-                    if len(days) >= 30:
-                        achieved_at = days[29]  # 0-indexed 30번째 날짜
-                        cursor.execute("""
-                            INSERT INTO user_achievements (user_id, achievement_id, achieved_at)
-                            VALUES (%s, %s, %s)
-                        """, (uid, achievement_id, achieved_at.strftime('%Y-%m-%d')))
-                        conn.commit()
-                        new_awards[str(uid)] = achieved_at.strftime('%Y-%m-%d')
-                        print(f"[INFO] 유저 {uid} - '{title}'을 {len(days)}일간 재생 → '최애숭배' 달성일: {achieved_at}")
-                        break  # 한 곡으로 만족하면 다음 유저로
-
-            favorite_cache.update(new_awards)
-            save_achievement_cache(cache)
 
-    except Exception as e:
-        print(f"[ERROR] 처리 중 예외 발생: {e}")
-
-#39:           39가지의 곡
-def award_39_achievement(conn):
+def diff_rule(sink, achievement_name, evaluate, full):
     """
-    '39' 도전과제 부여:
-    서로 다른 곡 39개 이상 플레이한 유저에게,
-    39번째 곡의 최초 재생일을 기준으로 달성 처리.
+    dry-run: 기록 없이 규칙 결과를 현재 user_achievements와 비교합니다.
+    - added:   지급될 유저 {user_id: 달성일}
+    - removed: DB에는 있지만 규칙상 달성하지 않는 유저 (전체 재평가일 때만)
+    - changed: 달성일이 다른 유저 {user_id: (DB 날짜, 규칙 날짜)} (전체 재평가일 때만)
+    증분 평가에서는 워터마크 이전 달성자를 알 수 없으므로 added만 채웁니다.
+    반환: diff dict, 실패 시 None
     """
     try:
-        cache = load_achievement_cache()
-        a39_cache = ensure_achievement_key(cache, "39")
-
-        sync_cache_to_db(cache, "39", conn)
-
-        with conn.cursor() as cursor:
-            # 1️⃣ 도전과제 ID 조회
-            cursor.execute("SELECT achievement_id FROM achievements WHERE name = '39'")
-            result = cursor.fetchone()
-            if not result:
-                print("[ERROR] '39' 도전과제가 존재하지 않습니다.")
-                return
-            achievement_id = result[0]
-
-            # 2️⃣ music_play 기록 있는 유저 중 캐시에 없는 유저만 추림
-            cursor.execute("SELECT DISTINCT user_id FROM music_play")
-            all_users = [row[0] for row in cursor.fetchall()]
-            target_users = [uid for uid in all_users if str(uid) not in a39_cache]
-
-            new_awards = {}
-
-            # 3️⃣ 각 유저별 서로 다른 곡의 최초 재생일 정렬
-            for uid in target_users:
-                cursor.execute("""
-                    SELECT MIN(played_at) as first_played
-                    FROM music_play
-                    WHERE user_id = %s
-                    GROUP BY title
-                    ORDER BY first_played ASC
-                    LIMIT 39
-                """, (uid,))
-                rows = cursor.fetchall()
-
-                if len(rows) < 39:
-                    print(f"[INFO] 유저 {uid}: 조건 미충족 (서로 다른 곡 {len(rows)}개).")
-                    continue
-
-                achieved_at = rows[-1][0].date()
-                cursor.execute("""
-                    INSERT INTO user_achievements (user_id, achievement_id, achieved_at)
-                    VALUES (%s, %s, %s)
-                """, (uid, achievement_id, achieved_at.strftime('%Y-%m-%d')))
-                conn.commit()
-
-                new_awards[str(uid)] = achieved_at.strftime('%Y-%m-%d')
-                print(f"[INFO] 유저 {uid} - 최초 39곡 달성일: {achieved_at} → '39' 달성!")
-
-            a39_cache.update(new_awards)
-            save_achievement_cache(cache)
-
+        current = sink.held_dates(achievement_name)
+        qualified, _ = evaluate(set())
     except Exception as e:
-        print(f"[ERROR] 처리 중 예외 발생: {e}")
+        print(f"[ERROR] '{achievement_name}' 처리 중 예외 발생: {e}")
+        return None
+
+    qualified = {uid: day.strftime("%Y-%m-%d") for uid, day in qualified.items()}
+    diff = {
+        "added": {uid: day for uid, day in qualified.items() if uid not in current},
+        "removed": {},
+        "changed": {},
+    }
+    if full:
+        diff["removed"] = {uid: day for uid, day in current.items() if uid not in qualified}
+        diff["changed"] = {uid: (current[uid], day) for uid, day in qualified.items()
+                           if uid in current and current[uid] != day}
+    return diff
 
-#파인튜닝:    30일동안 평균 55분
-def award_finetuning_achievement(conn, verbose: bool = False):
-    """
-    유저의 각 출석일 기준, 해당 날짜 포함 이전 출석일 최대 30개에 대해
-    평균 플레이 시간이 55분 이상이면 도전과제 '파인튜닝'을 달성합니다.
 
-    ✅ 도전과제 등록 시 해당 유저는 더 이상 평가하지 않음
-    ✅ 모든 평가 구간은 verbose=True일 때만 로그 출력
-    ✅ 각 날짜의 참여 시간도 함께 로그에 출력
-    """
+class QueryProfile:
+    """구간(입력 적재/규칙)별 쿼리 수, 가져온 행 수, 쿼리 시간 누적"""
+    def __init__(self):
+        self.stats = {}
+        self._lock = threading.Lock()
 
-    cache = load_achievement_cache()
-    fine_cache = ensure_achievement_key(cache, "finet파인튜닝uning")
+    def record(self, section, queries=0, rows=0, seconds=0.0):
+        with self._lock:
+            st = self.stats.setdefault(section, {"queries": 0, "rows": 0, "seconds": 0.0})
+            st["queries"] += queries
+            st["rows"] += rows
+            st["seconds"] += seconds
 
-    try:
-        sync_cache_to_db(cache, "파인튜닝", conn)
+    def wrap(self, conn, section):
+        return _ProfiledConnection(conn, self, section)
 
-        with conn.cursor() as cursor:
-            # 1️⃣ 도전과제 ID 조회
-            cursor.execute("""
-                SELECT achievement_id FROM achievements WHERE name = '파인튜닝'
-            """)
-            result = cursor.fetchone()
-            if not result:
-                print("[ERROR] '파인튜닝' 도전과제가 존재하지 않습니다.")
-                return
-            achievement_id = result[0]
-
-            # 2️⃣ 출석 기록 있는 유저 중 캐시에 없는 유저만 대상
-            cursor.execute("SELECT DISTINCT user_id FROM attendance")
-            all_users = [row[0] for row in cursor.fetchall()]
-            target_users = [uid for uid in all_users if str(uid) not in fine_cache]
-
-            new_awards = {}
-
-            for uid in target_users:
-                # 출석일 목록 (오름차순)
-                cursor.execute("""
-                    SELECT DISTINCT DATE(enter_time) as day
-                    FROM attendance
-                    WHERE user_id = %s
-                    ORDER BY day
-                """, (uid,))
-                attendance_days = [row[0] for row in cursor.fetchall()]
-                total_attendances = len(attendance_days)
-
-                if total_attendances == 0:
-                    if verbose:
-                        print(f"[유저 {uid}] ▶ 출석일 없음 → 평가 불가\n")
-                    continue
-
-                for idx in range(total_attendances):
-                    current_day = attendance_days[idx]
-                    window_days = attendance_days[max(0, idx - 29):idx + 1]
-                    start_day = window_days[0]
-                    end_day = window_days[-1]
-
-                    # 전체 총 시간 계산
-                    cursor.execute("""
-                        SELECT SUM(duration_sec)
-                        FROM attendance
-                        WHERE user_id = %s AND DATE(enter_time) BETWEEN %s AND %s
-                    """, (uid, start_day, end_day))
-                    total_seconds = cursor.fetchone()[0] or 0
-                    avg_minutes = (total_seconds / 60) / len(window_days)
-
-                    # 각 날짜별 duration도 조회
-                    cursor.execute("""
-                        SELECT DATE(enter_time), SUM(duration_sec)
-                        FROM attendance
-                        WHERE user_id = %s AND DATE(enter_time) BETWEEN %s AND %s
-                        GROUP BY DATE(enter_time)
-                    """, (uid, start_day, end_day))
-                    per_day_durations = {row[0]: row[1] for row in cursor.fetchall()}
-
-                    if verbose:
-                        day_str_list = [
-                            f"{d.strftime('%m-%d')} ({(per_day_durations.get(d, 0))/60:.1f}분)"
-                            for d in window_days
-                        ]
-                        status = "✅" if len(window_days) == 30 and avg_minutes >= 55 else "❌"
-                        print(f"[유저 {uid}] ▶ 기준일: {current_day.strftime('%m-%d')} | 출석일 수: {len(window_days)} | 평균: {avg_minutes:.2f}분 {status}")
-                        print(f"       ↳ 날짜들: [{', '.join(day_str_list)}]")
-
-                    # 조건 만족 → 등록 및 종료
-                    if len(window_days) == 30 and avg_minutes >= 55:
-                        cursor.execute("""
-                            INSERT INTO user_achievements (user_id, achievement_id, achieved_at)
-                            VALUES (%s, %s, %s)
-                        """, (uid, achievement_id, current_day.strftime("%Y-%m-%d")))
-                        conn.commit()
-                        new_awards[str(uid)] = current_day.strftime("%Y-%m-%d")
-                        if verbose:
-                            print(f"[유저 {uid}] ▶ 도전과제 '파인튜닝' 달성 후 평가 종료\n")
-                        break  # 유저 평가 중단
-
-                if verbose:
-                    print()
-
-            fine_cache.update(new_awards)
-            save_achievement_cache(cache)
 
-    except Exception as e:
-        print(f"[ERROR] 처리 중 예외 발생: {e}")
+class _ProfiledConnection:
+    """pymysql 연결 래퍼: cursor()만 가로채고 나머지는 그대로 위임. section은 바꿔 가며 사용"""
+    def __init__(self, conn, profile, section):
+        self._conn = conn
+        self.profile = profile
+        self.section = section
 
-#엣지오브투머로우: 3일 연속 동일한 5곡
-def award_edge_of_tomorrow(conn):
-    """
-    '엣지오브투머로우' 도전과제:
-    3일 연속, 동일한 5곡을 동일한 순서로 플레이하면 달성.
-    단, 각 날짜 내 어디든 연속으로 등장하면 인정.
-    """
+    def cursor(self):
+        return _ProfiledCursor(self._conn.cursor(), self)
 
-    def extract_sequences(title_list, length=5):
-        return [tuple(title_list[i:i+length]) for i in range(len(title_list) - length + 1)]
+    def __getattr__(self, name):
+        return getattr(self._conn, name)
 
-    cache = load_achievement_cache()
-    edge_cache = ensure_achievement_key(cache, "엣지오브투머로우")
 
-    try:
-        sync_cache_to_db(cache, "엣지오브투머로우", conn)
+class _ProfiledCursor:
+    def __init__(self, cursor, owner):
+        self._cursor = cursor
+        self._owner = owner
 
-        with conn.cursor() as cursor:
-            # 1️⃣ 도전과제 ID 조회
-            cursor.execute("SELECT achievement_id FROM achievements WHERE name = '엣지오브투머로우'")
-            result = cursor.fetchone()
-            if not result:
-                print("[ERROR] '엣지오브투머로우' 도전과제가 존재하지 않습니다.")
-                return
-            achievement_id = result[0]
-
-            # 2️⃣ music_play 기록 있는 유저 중 캐시에 없는 유저만 추림
-            cursor.execute("SELECT DISTINCT user_id FROM music_play")
-            all_users = [row[0] for row in cursor.fetchall()]
-            target_users = [uid for uid in all_users if str(uid) not in edge_cache]
-
-            new_awards = {}
-
-            for uid in target_users:
-                cursor.execute("""
-                    SELECT DATE(played_at), title
-                    FROM music_play
-                    WHERE user_id = %s
-                    ORDER BY played_at
-                """, (uid,))
-                rows = cursor.fetchall()
-
-                if not rows:
-                    continue
-
-                daily_titles = defaultdict(list)
-                for date, title in rows:
-                    daily_titles[date].append(title)
-
-                sorted_days = sorted(daily_titles.keys())
-                if len(sorted_days) < 3:
-                    continue
-
-                for i in range(len(sorted_days) - 2):
-                    d1, d2, d3 = sorted_days[i:i+3]
-                    if d2 != d1 + timedelta(days=1) or d3 != d2 + timedelta(days=1):
-                        continue
-
-                    l1, l2, l3 = daily_titles[d1], daily_titles[d2], daily_titles[d3]
-                    if len(l1) < 5 or len(l2) < 5 or len(l3) < 5:
-                        continue
-
-                    s1 = set(extract_sequences(l1))
-                    s2 = set(extract_sequences(l2))
-                    s3 = set(extract_sequences(l3))
-
-                    common = s1 & s2 & s3
-                    if common:
-                        achieved_at = d3.strftime("%Y-%m-%d")
-                        cursor.execute("""
-                            INSERT INTO user_achievements (user_id, achievement_id, achieved_at)
-                            VALUES (%s, %s, %s)
-                        """, (uid, achievement_id, achieved_at))
-                        conn.commit()
-
-                        edge_cache[str(uid)] = achieved_at
-                        print(f"[유저 {uid}] ▶ '엣지오브투머로우' 달성! (공통 시퀀스: {common.pop()} | 날짜: {achieved_at})")
-                        break  # 한 번 달성 시 평가 종료
-
-            save_achievement_cache(cache)
-
-    except Exception as e:
-        print(f"[ERROR] 처리 중 예외 발생: {e}")
-
-#도원결의: 전달 플레이 3개 동일하게
-def award_dowon_pledge(conn):
-    """
-    '도원결의' 도전과제:
-    전날 누군가가 연속으로 재생한 3곡과 동일한 3곡을,
-    다음날 누군가가 동일 순서로 연속 재생하면 달성.
-    """
+    def __enter__(self):
+        return self
 
-    cache = load_achievement_cache()
-    dowon_cache = ensure_achievement_key(cache, "도원결의")
+    def __exit__(self, *exc):
+        self._cursor.close()
 
-    try:
-        sync_cache_to_db(cache, "도원결의", conn)
+    def _timed(self, fn, *args):
+        started = time.perf_counter()
+        try:
+            return fn(*args)
+        finally:
+            self._owner.profile.record(self._owner.section, queries=1,
+                                       seconds=time.perf_counter() - started)
 
-        with conn.cursor() as cursor:
-            # 1️⃣ 도전과제 ID 조회
-            cursor.execute("SELECT achievement_id FROM achievements WHERE name = '도원결의'")
-            result = cursor.fetchone()
-            if not result:
-                print("[ERROR] '도원결의' 도전과제가 존재하지 않습니다.")
-                return
-            achievement_id = result[0]
-
-            # 2️⃣ 이미 달성한 유저는 캐시 기준으로 필터링
-            achieved_users = set(dowon_cache.keys())
-
-            # 3️⃣ 날짜 리스트 조회
-            cursor.execute("SELECT DISTINCT DATE(played_at) AS day FROM music_play ORDER BY day")
-            all_days = [row[0] for row in cursor.fetchall()]
-
-            new_awards = {}
-
-            for i in range(1, len(all_days)):
-                prev_day = all_days[i - 1]
-                curr_day = all_days[i]
-
-                # 전날 연속 3곡 시퀀스 수집
-                cursor.execute("""
-                    SELECT user_id, played_at, title
-                    FROM music_play
-                    WHERE DATE(played_at) = %s
-                    ORDER BY user_id, played_at
-                """, (prev_day,))
-                rows = cursor.fetchall()
-
-                prev_sequences = set()
-                user_tracks = defaultdict(list)
-                for uid, _, title in rows:
-                    user_tracks[uid].append(title)
-                for track_list in user_tracks.values():
-                    for j in range(len(track_list) - 2):
-                        prev_sequences.add(tuple(track_list[j:j+3]))
-                if not prev_sequences:
-                    continue
-
-                # 당일 유저의 시퀀스 검사
-                cursor.execute("""
-                    SELECT user_id, played_at, title
-                    FROM music_play
-                    WHERE DATE(played_at) = %s
-                    ORDER BY user_id, played_at
-                """, (curr_day,))
-                rows = cursor.fetchall()
-
-                today_tracks = defaultdict(list)
-                for uid, _, title in rows:
-                    today_tracks[uid].append(title)
-
-                for uid, track_list in today_tracks.items():
-                    if str(uid) in dowon_cache or len(track_list) < 3:
-                        continue
-
-                    for j in range(len(track_list) - 2):
-                        seq = tuple(track_list[j:j+3])
-                        if seq in prev_sequences:
-                            achieved_at = curr_day.strftime("%Y-%m-%d")
-                            cursor.execute("""
-                                INSERT INTO user_achievements (user_id, achievement_id, achieved_at)
-                                VALUES (%s, %s, %s)
-                            """, (uid, achievement_id, achieved_at))
-                            conn.commit()
-                            dowon_cache[str(uid)] = achieved_at
-                            print(f"[유저 {uid}] ▶ '도원결의' 달성! ({achieved_at})")
-                            break
-
-            save_achievement_cache(cache)
+    def execute(self, query, args=None):
+        return self._timed(self._cursor.execute, query, args)
 
-    except Exception as e:
-        print(f"[ERROR] 처리 중 예외 발생: {e}")
+    def executemany(self, query, args):
+        return self._timed(self._cursor.executemany, query, args)
 
-#마이웨이: 3-9명 6번
-def award_myway_achievement(conn):
-    cache = load_achievement_cache()
-    myway_cache = ensure_achievement_key(cache, "마이웨이")
+    def fetchall(self):
+        rows = self._cursor.fetchall()
+        self._owner.profile.record(self._owner.section, rows=len(rows))
+        return rows
 
-    try:
-        sync_cache_to_db(cache, "마이웨이", conn)
+    def fetchone(self):
+        row = self._cursor.fetchone()
+        self._owner.profile.record(self._owner.section, rows=1 if row else 0)
+        return row
 
-        with conn.cursor() as cursor:
-            # 1️⃣ 도전과제 ID 조회
-            cursor.execute("SELECT achievement_id FROM achievements WHERE name = '마이웨이'")
-            result = cursor.fetchone()
-            if not result:
-                print("[ERROR] '마이웨이' 도전과제가 존재하지 않습니다.")
-                return
-            achievement_id = result[0]
-
-            # 2️⃣ 전체 유저 조회
-            cursor.execute("SELECT DISTINCT user_id FROM attendance")
-            all_users = [row[0] for row in cursor.fetchall()]
-
-            # 3️⃣ DB에서 이미 달성한 유저
-            cursor.execute("""
-                SELECT user_id FROM user_achievements
-                WHERE achievement_id = %s
-            """, (achievement_id,))
-            already_awarded = {row[0] for row in cursor.fetchall()}
-
-            # 4️⃣ 캐시 + DB 모두에 없는 유저만 필터링
-            target_users = [
-                uid for uid in all_users
-                if str(uid) not in myway_cache and uid not in already_awarded
-            ]
-
-            new_awards = {}
-
-            # 5️⃣ 유저별로 조사
-            for uid in target_users:
-                cursor.execute("""
-                    SELECT DATE(a.enter_time) AS day, COUNT(DISTINCT a.user_id) AS attendee_count
-                    FROM attendance a
-                    WHERE DATE(a.enter_time) IN (
-                        SELECT DISTINCT DATE(enter_time)
-                        FROM attendance
-                        WHERE user_id = %s
-                    )
-                    GROUP BY day
-                    HAVING attendee_count BETWEEN 3 AND 9
-                    ORDER BY day
-                """, (uid,))
-                rows = cursor.fetchall()
-
-                # 참석한 날 중 인원 수를 기준으로 다양한 날 개수 확인
-                distinct_attendee_counts = set()
-                valid_days_log = []  # (day, attendee_count) 저장
-                latest_date = None
-
-                for day, count in rows:
-                    if count not in distinct_attendee_counts:
-                        distinct_attendee_counts.add(count)
-                        valid_days_log.append((day.strftime("%Y-%m-%d"), count))
-                        latest_date = day
-
-                if len(distinct_attendee_counts) >= 6:
-                    achieved_at = latest_date.strftime("%Y-%m-%d")
-                    cursor.execute("""
-                        INSERT INTO user_achievements (user_id, achievement_id, achieved_at)
-                        VALUES (%s, %s, %s)
-                    """, (uid, achievement_id, achieved_at))
-                    conn.commit()
-                    new_awards[str(uid)] = achieved_at
-
-                    print(f"[INFO] 유저 {uid} - '마이웨이' 도전과제 달성! (최종날짜: {achieved_at})")
-                    print("        조건 만족 날짜 및 인원 수:")
-                    for day_str, cnt in valid_days_log:
-                        print(f"         - {day_str} ({cnt}명)")
-                else:
-                    print(f"[INFO] 유저 {uid} - 조건 불충족 ({len(distinct_attendee_counts)}종 인원 수)")
 
-            # 6️⃣ 캐시 저장
-            myway_cache.update(new_awards)
-            save_achievement_cache(cache)
+def load_db_params(config_path=CONFIG_PATH):
+    with open(config_path, "r", encoding="utf-8") as f:
+        db_conf = json.load(f)["db"]
+    return {
+        "host": db_conf["host"],
+        "port": db_conf["port"],
+        "user": db_conf["user"],
+        "password": db_conf["password"],
+        "db": db_conf["database"],
+        "charset": "utf8mb4"
+    }
 
-    except Exception as e:
-        print(f"[ERROR] 처리 중 오류 발생: {e}")
 
+def _load_input(db_params, name, since, profile=None):
+    """입력 하나를 전용 연결로 적재 (입력끼리 병렬 적재용)"""
+    conn = pymysql.connect(**db_params)
+    try:
+        return engine.load_input(profile.wrap(conn, f"입력:{name}") if profile else conn, name, since)
+    finally:
+        conn.close()
 
-# 조별과제: 6명 이상 출석 && 6명 이상 2곡 이상 플레이
-def award_team_project_achievement(start_date_str: str, conn):
-    cache = load_achievement_cache()
-    team_cache = ensure_achievement_key(cache, "조별과제")
 
-    sync_cache_to_db(cache, "조별과제", conn)
+def run_rules(db_params, rule_names=None, full_rescan=False, dry_run=False, profile=None):
+    """
+    선택한 규칙(없으면 전체)을 워터마크 이후 구간만 적재/평가해 지급합니다.
+    - 필요한 입력(attendance/music/users)만 입력별 연결로 병렬 적재하고,
+      입력이 모두 준비된 규칙부터 바로 평가 (출석 규칙은 음악 적재를 기다리지 않음)
+    - DB 기록은 메인 연결 하나에서 규칙 순서대로
+    - 규칙 상태는 achievement_state 테이블에서 한 번 읽고, 규칙별로 지급과 같은 트랜잭션에 기록
+    - full_rescan=True면 선택한 규칙의 저장된 워터마크/상태를 무시하고 전체 기간을 다시 평가
+    - dry_run=True면 아무것도 쓰지 않고 규칙별 diff(diff_rule)만 계산
+      (전체 비교는 full_rescan이거나 저장된 상태가 없는 규칙만, 나머지는 워터마크 이후만)
+    - profile(QueryProfile)을 넘기면 입력/규칙별 쿼리 수·행 수·시간을 누적
+    반환: [{"name", "seconds", "awards", "ok", "diff"}] 규칙별 결과 (diff는 dry-run일 때만)
+    """
+    rules = engine.select_rules(rule_names)
+    closed_through = datetime.today().date() - timedelta(days=1)  # 오늘 분은 다음 실행에서 다시 평가
 
+    report = []
+    raw_conn = pymysql.connect(**db_params)
+    conn = profile.wrap(raw_conn, "준비") if profile else raw_conn
     try:
-        with conn.cursor() as cursor:
-            cursor.execute("SELECT achievement_id FROM achievements WHERE name = '조별과제'")
-            result = cursor.fetchone()
-            if not result:
-                print("[ERROR] '조별과제' 도전과제가 존재하지 않습니다.")
-                return
-            achievement_id = result[0]
-
-            start_date = datetime.strptime(start_date_str, "%Y-%m-%d").date()
-            today = datetime.today().date()
-            current_date = start_date
-            new_awards = {}
-
-            while current_date <= today:
-                date_str = current_date.strftime("%Y-%m-%d")
-
-                # 1️⃣ 출석자 목록
-                cursor.execute("""
-                    SELECT DISTINCT user_id
-                    FROM attendance
-                    WHERE DATE(enter_time) = %s
-                """, (date_str,))
-                user_ids = [row[0] for row in cursor.fetchall()]
-
-                if len(user_ids) < 6:
-                    print(f"[INFO] {date_str}: 출석자 {len(user_ids)}명 → 조건 불충족")
-                    current_date += timedelta(days=1)
-                    continue
-
-                # 2️⃣ 2곡 이상 플레이한 유저 수 확인 (music_play 기준)
-                cursor.execute("""
-                    SELECT user_id
-                    FROM music_play
-                    WHERE DATE(played_at) = %s
-                    GROUP BY user_id
-                    HAVING COUNT(*) >= 2
-                """, (date_str,))
-                qualified_users = [row[0] for row in cursor.fetchall()]
-                qualified_count = len(qualified_users)
-
-                if qualified_count < 6:
-                    print(f"[INFO] {date_str}: 2곡 이상 유저 {qualified_count}명 → 조건 불충족")
-                    current_date += timedelta(days=1)
-                    continue
-
-                # 3️⃣ 이미 도전과제 받은 유저 필터링
-                cursor.execute("""
-                    SELECT user_id FROM user_achievements
-                    WHERE achievement_id = %s
-                """, (achievement_id,))
-                already_awarded = {row[0] for row in cursor.fetchall()}
-
-                to_award = [uid for uid in user_ids if uid not in already_awarded]
-
-                for uid in to_award:
-                    cursor.execute("""
-                        INSERT INTO user_achievements (user_id, achievement_id, achieved_at)
-                        VALUES (%s, %s, %s)
-                    """, (uid, achievement_id, date_str))
-                    new_awards[str(uid)] = date_str
+        state_data = load_achievement_state(conn, create=not dry_run)
+        sink = AwardSink(conn)
+        if not dry_run:
+            migrate_legacy_cache(sink)
+        elif os.path.exists(LEGACY_CACHE_PATH):
+            print("[WARN] dry-run: 예전 JSON 캐시 파일은 옮기지 않고 무시합니다.")
+        if full_rescan:
+            for rule in rules:
+                state_data.pop(rule.name, None)
+
+        # 저장된 상태가 없는 규칙만 전체 평가 → dry-run diff도 그 규칙만 전체 비교
+        full_rules = {rule.name for rule in rules if not state_data.get(rule.name, {}).get("watermark")}
+        watermarks = [state_data.get(rule.name, {}).get("watermark") for rule in rules]
+        if all(watermarks):
+            since = min(datetime.strptime(w, "%Y-%m-%d").date() for w in watermarks) + timedelta(days=1)
+        else:
+            since = None
+        needed = [name for name in engine.INPUTS if any(name in rule.inputs for rule in rules)]
+        print(f"[INFO] 평가 구간: {since or '전체'} ~ 오늘 | 규칙 {len(rules)}개 | 입력: {', '.join(needed)}")
+
+        with ThreadPoolExecutor(max_workers=len(needed) or 1) as pool:
+            futures = {name: pool.submit(_load_input, db_params, name, since, profile) for name in needed}
+            loaded = {}
+            facts_caches = {}   # 입력 조합별 facts 재사용
+            pending = list(rules)
+
+            while pending:
+                # 📌 입력이 모두 준비된 첫 규칙부터 (없으면 가장 앞 규칙의 입력을 기다림)
+                rule = next((r for r in pending if all(futures[n].done() for n in r.inputs)), pending[0])
+                pending.remove(rule)
+                for name in rule.inputs:
+                    if name not in loaded:
+                        loaded[name] = futures[name].result()
+                rows = tuple(loaded[name] if name in rule.inputs else [] for name in engine.INPUTS)
+                facts_cache = facts_caches.setdefault(rule.inputs, {})
+
+                print(f"확인: {rule.name}")
+
+                def evaluate(already, rule=rule, rows=rows, facts_cache=facts_cache):
+                    return engine.evaluate_incremental(
+                        rule.fn, rows, already, closed_through, state_data.get(rule.name),
+                        facts_cache=facts_cache, **rule.kwargs
+                    )
 
-                if to_award:
-                    conn.commit()
-                    print(f"[INFO] {date_str}: 조별과제 달성자 {len(to_award)}명 기록 완료!")
+                if profile:
+                    conn.section = rule.name
+                started = time.perf_counter()
+                if dry_run:
+                    diff = diff_rule(sink, rule.name, evaluate, full=rule.name in full_rules)
+                    awards = diff and diff["added"]
                 else:
-                    print(f"[INFO] {date_str}: 이미 모든 유저가 조별과제 달성함.")
-
-                current_date += timedelta(days=1)
-
-            team_cache.update(new_awards)
-            save_achievement_cache(cache)
-
-    except Exception as e:
-        print(f"[FATAL] 실행 중 예외 발생: {e}")
-
-
-# 2025추석
-def award_chuseok_2025_achievement(conn):
-    cache = load_achievement_cache()
-    chuseok_cache = ensure_achievement_key(cache, "2025추석")
+                    diff = None
+                    awards = award_from_rule(sink, rule.name, evaluate)
+                elapsed = time.perf_counter() - started
+                report.append({
+                    "name": rule.name,
+                    "seconds": elapsed,
+                    "awards": len(awards or {}),
+                    "ok": awards is not None,
+                    "diff": diff,
+                })
+
+        if not dry_run:
+            if profile:
+                conn.section = "user_stats"
+            print("갱신: user_stats 도전과제 수")
+            user_stats.ensure_user_stats(conn)
+            user_stats.refresh_achievement_counts(conn)
+    finally:
+        raw_conn.close()
+
+    order = {rule.name: i for i, rule in enumerate(rules)}
+    return sorted(report, key=lambda r: order[r["name"]])
+
+
+def print_report(report):
+    print("\n[REPORT] 규칙별 실행 결과")
+    for r in report:
+        status = "OK  " if r["ok"] else "FAIL"
+        print(f"  {status} {r['name']:<12} {r['seconds'] * 1000:8.1f} ms   신규 {r['awards']}명")
+    print(f"  합계 {sum(r['seconds'] for r in report) * 1000:.1f} ms, 신규 {sum(r['awards'] for r in report)}명")
+
+
+def print_diff(report):
+    """dry-run 결과: + 지급 예정 / - DB에만 있음 / ~ 달성일 다름"""
+    print("\n[DRY-RUN] 현재 user_achievements 대비 변경 예정")
+    for r in report:
+        diff = r.get("diff")
+        if not diff:
+            continue
+        for uid, day in sorted(diff["added"].items(), key=lambda kv: (kv[1], kv[0])):
+            print(f"  + {r['name']:<12} 유저 {uid:<6} {day}")
+        for uid, day in sorted(diff["removed"].items(), key=lambda kv: (kv[1] or "", kv[0])):
+            print(f"  - {r['name']:<12} 유저 {uid:<6} {day}")
+        for uid, (old, new) in sorted(diff["changed"].items()):
+            print(f"  ~ {r['name']:<12} 유저 {uid:<6} {old} → {new}")
+    counts = [sum(len(r["diff"][k]) for r in report if r.get("diff")) for k in ("added", "removed", "changed")]
+    print(f"  합계 +{counts[0]} -{counts[1]} ~{counts[2]}")
+
+
+def print_profile(profile, report):
+    print("\n[PROFILE] 구간별 쿼리 수 / 가져온 행 수 / 쿼리 시간 / 전체 시간")
+    elapsed = {r["name"]: r["seconds"] for r in report}
+    empty = {"queries": 0, "rows": 0, "seconds": 0.0}
+    sections = list(profile.stats) + [name for name in elapsed if name not in profile.stats]
+    for section in sections:
+        st = profile.stats.get(section, empty)
+        total = f"{elapsed[section] * 1000:8.1f} ms" if section in elapsed else " " * 11
+        print(f"  {section:<16} {st['queries']:5d} q {st['rows']:9d} rows {st['seconds'] * 1000:8.1f} ms {total}")
+    print(f"  합계 {sum(st['queries'] for st in profile.stats.values())} q, "
+          f"{sum(st['rows'] for st in profile.stats.values())} rows")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="도전과제 일괄 지급")
+    parser.add_argument("rules", nargs="*", metavar="도전과제",
+                        help="평가할 도전과제 이름 (생략 시 전체)")
+    parser.add_argument("--list", action="store_true", help="등록된 규칙과 필요한 입력을 출력하고 종료")
+    parser.add_argument("--full-rescan", action="store_true",
+                        help="저장된 워터마크/상태를 무시하고 전체 기간을 다시 평가 (규칙 변경 시)")
+    parser.add_argument("--dry-run", action="store_true",
+                        help="기록하지 않고 현재 user_achievements와의 차이만 출력 (--full-rescan과 함께면 -/~ 포함)")
+    parser.add_argument("--profile", action="store_true",
+                        help="입력/규칙별 쿼리 수, 행 수, 시간 출력 (--dry-run이면 항상 출력)")
+    parser.add_argument("--config", default=CONFIG_PATH, help="DB 설정 파일 경로")
+    args = parser.parse_args(argv)
+
+    if args.list:
+        for rule in engine.RULES:
+            print(f"{rule.name:<12} {', '.join(rule.inputs)}")
+        return 0
 
     try:
-        sync_cache_to_db(cache, "2025추석", conn)
-
-        with conn.cursor() as cursor:
-            # 1️⃣ 도전과제 ID 조회
-            cursor.execute("SELECT achievement_id FROM achievements WHERE name = '2025추석'")
-            result = cursor.fetchone()
-            if not result:
-                print("[ERROR] '2025추석' 도전과제가 존재하지 않습니다.")
-                return
-            achievement_id = result[0]
-
-            # 2️⃣ 전체 유저 조회
-            cursor.execute("SELECT DISTINCT user_id FROM attendance")
-            all_users = [row[0] for row in cursor.fetchall()]
-
-            # 3️⃣ 이미 달성한 유저 (DB)
-            cursor.execute("""
-                SELECT user_id FROM user_achievements
-                WHERE achievement_id = %s
-            """, (achievement_id,))
-            already_awarded = {row[0] for row in cursor.fetchall()}
-
-            # 4️⃣ 대상 유저 필터링
-            target_users = [
-                uid for uid in all_users
-                if str(uid) not in chuseok_cache and uid not in already_awarded
-            ]
-
-            # 5️⃣ 날짜 범위
-            start_date = datetime(2025, 10, 3).date()
-            end_date = datetime(2025, 10, 12).date()
-
-            new_awards = {}
-
-            for uid in target_users:
-                cursor.execute("""
-                    SELECT DISTINCT DATE(enter_time)
-                    FROM attendance
-                    WHERE user_id = %s AND DATE(enter_time) BETWEEN %s AND %s
-                    ORDER BY DATE(enter_time)
-                """, (uid, start_date, end_date))
-                rows = [row[0] for row in cursor.fetchall()]
-
-                if len(rows) >= 6:
-                    achieved_at = rows[5].strftime("%Y-%m-%d")  # 6번째 날
-                    cursor.execute("""
-                        INSERT INTO user_achievements (user_id, achievement_id, achieved_at)
-                        VALUES (%s, %s, %s)
-                    """, (uid, achievement_id, achieved_at))
-                    conn.commit()
-                    new_awards[str(uid)] = achieved_at
-                    print(f"[INFO] 유저 {uid} - 2025추석 도전과제 달성! ({achieved_at})")
-
-            chuseok_cache.update(new_awards)
-            save_achievement_cache(cache)
-
-    except Exception as e:
-        print(f"[ERROR] 처리 중 예외 발생: {e}")
-5
-
-TARGET_DATES = [
-    "2025-10-20"
-]
-
-def award_attendance_on_specific_dates(conn):
-    cache = load_achievement_cache()
-    achv_name = "감자서버"  # 도전과제 이름
-    achv_cache = ensure_achievement_key(cache, achv_name)
+        engine.select_rules(args.rules)
+    except ValueError as e:
+        parser.error(str(e))
 
+    profile = QueryProfile() if args.profile or args.dry_run else None
     try:
-        sync_cache_to_db(cache, achv_name, conn)
-
-        with conn.cursor() as cursor:
-            # 1️⃣ 도전과제 ID 조회
-            cursor.execute("SELECT achievement_id FROM achievements WHERE name = %s", (achv_name,))
-            result = cursor.fetchone()
-            if not result:
-                print(f"[ERROR] '{achv_name}' 도전과제가 존재하지 않습니다.")
-                return
-            achievement_id = result[0]
-
-            # 2️⃣ 출석한 유저 및 날짜 조회
-            cursor.execute(f"""
-                SELECT user_id, MIN(DATE(enter_time)) AS first_seen
-                FROM attendance
-                WHERE DATE(enter_time) IN ({','.join(['%s'] * len(TARGET_DATES))})
-                GROUP BY user_id
-            """, TARGET_DATES)
-            rows = cursor.fetchall()
-
-            if not rows:
-                print("[INFO] 조건에 맞는 유저가 없습니다.")
-                return
-
-            # 3️⃣ DB 기준 중복 제거
-            cursor.execute("""
-                SELECT user_id FROM user_achievements
-                WHERE achievement_id = %s
-            """, (achievement_id,))
-            already_awarded = {row[0] for row in cursor.fetchall()}
-
-            new_awards = {}
-
-            for uid, date in rows:
-                if str(uid) in achv_cache or uid in already_awarded:
-                    continue
-
-                cursor.execute("""
-                    INSERT INTO user_achievements (user_id, achievement_id, achieved_at)
-                    VALUES (%s, %s, %s)
-                """, (uid, achievement_id, date))
-                new_awards[str(uid)] = date.strftime("%Y-%m-%d")
-                print(f"[INFO] 유저 {uid} - '{achv_name}' 도전과제 달성! ({date})")
-
-            if new_awards:
-                conn.commit()
-                achv_cache.update(new_awards)
-                save_achievement_cache(cache)
-
+        report = run_rules(load_db_params(args.config), args.rules, full_rescan=args.full_rescan,
+                           dry_run=args.dry_run, profile=profile)
     except Exception as e:
+        import traceback
         print(f"[FATAL] 실행 중 예외 발생: {e}")
+        traceback.print_exc()
+        return 1
 
+    print_report(report)
+    if args.dry_run:
+        print_diff(report)
+    if profile:
+        print_profile(profile, report)
+    return 0 if all(r["ok"] for r in report) else 1
 
 
-#월말평가: 3달 랭킹 누적
-
-
-
-
-# 📌 DB 연결
-with open(CONFIG_PATH, "r", encoding="utf-8") as f:
-    config = json.load(f)
-    db_conf = config["db"]
-    db_params = {
-        "host": db_conf["host"],
-        "port": db_conf["port"],
-        "user": db_conf["user"],
-        "password": db_conf["password"],
-        "db": db_conf["database"],
-        "charset": "utf8mb4"
-    }
-
-conn = pymysql.connect(**db_params)
-
-try:
-    with conn.cursor() as cursor:
-        print("확인: 인싸")
-        award_inssa_achievement_from_date(START_DAY, conn)
-        print("확인: 칠가이")
-        award_chill_guy_achievement(conn)
-        print("확인: 과몰입")
-        award_over_immersed_achievement_from_date(START_DAY, conn)
-        print("확인: 완장")
-        award_captain_achievement_from_date(START_DAY, conn)
-        print("확인: 최애숭배")
-        award_favorite_song_achievement(conn)
-        print("확인: 39")
-        award_39_achievement(conn)
-        print("확인: 파인튜닝")
-        award_finetuning_achievement(conn)
-        print("확인: 엣지오브투머로우")
-        award_edge_of_tomorrow(conn)
-        print("확인: 도원결의")
-        award_dowon_pledge(conn)
-        print("확인: 마이웨이")
-        award_myway_achievement(conn)
-        print("확인: 조별과제")
-        award_team_project_achievement(START_DAY, conn)
-        print("확인: 2025추석")
-        award_chuseok_2025_achievement(conn)
-        print("확인: 감자서버")
-        award_attendance_on_specific_dates(conn)
-except Exception as e:
-    import traceback
-    print(f"[FATAL] 실행 중 예외 발생: {e}")
-    traceback.print_exc()
-finally:
-    try:
-        if conn and conn.open:
-            conn.close()
-    except Exception:
-        pass
\ No newline at end of file
+if __name__ == "__main__":
+    raise SystemExit(main())
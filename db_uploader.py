@@ -4,6 +4,7 @@ import time
 import pymysql
 from datetime import datetime
 from log_analyzer import PyPyDanceLogAnalyzer
+import user_stats
 
 
 def load_config(config_path):
@@ -115,6 +116,8 @@ def insert_results_to_db(db_conf, attendance_list, music_list, max_retries=5):
                                     last_attended = GREATEST(last_attended, VALUES(last_attended))
                             """, (user_id, a["end"]))
 
+                            user_stats.add_attendance(cursor, user_id, a["start"], int(a["duration"].total_seconds()))
+
                     for m in music_list:
                         cursor.execute(
                             "SELECT user_id FROM users WHERE nickname = %s",
@@ -127,6 +130,8 @@ def insert_results_to_db(db_conf, attendance_list, music_list, max_retries=5):
                                 INSERT INTO music_play (user_id, played_at, title, url)
                                 VALUES (%s, %s, %s, %s)
                             """, (user_id, m["timestamp"], m["title"], m["url"]))
+
+                            user_stats.add_music_play(cursor, user_id)
                 conn.commit()
                 return  # 성공적으로 종료
             finally:
@@ -151,9 +156,26 @@ def should_run_now(target_time_str):
     return now.time().hour == target_time.hour and now.time().minute == target_time.minute
 
 
+def prepare_user_stats(db_conf):
+    conn = pymysql.connect(
+        host=db_conf["host"],
+        port=db_conf.get("port", 3306),
+        user=db_conf["user"],
+        password=db_conf["password"],
+        db=db_conf["database"],
+        charset="utf8mb4"
+    )
+    try:
+        if user_stats.ensure_user_stats(conn):
+            print("[INFO] user_stats 테이블 백필 완료")
+    finally:
+        conn.close()
+
+
 def run_analysis(config):
     db_conf = config["db"]
     consented_users = get_consented_users(db_conf)
+    prepare_user_stats(db_conf)
     log_dir = os.path.dirname(config["log_file_path"]) or "."
 
     for filename in get_log_files(log_dir):
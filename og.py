@@ -1,9 +1,120 @@
 # user_card.py
 import os
+import time
+import json
+import hashlib
 from io import BytesIO
+import threading
+from threading import Lock
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
 import pymysql
 from flask import Blueprint, render_template, url_for, send_file, abort, request
-from PIL import Image, ImageDraw, ImageFont, ImageOps
+from ttl_cache import TTLLRUCache
+from thumbnails import ThumbnailStore
+from profile_index import get_profile_index
+# PIL은 렌더링할 때만 로드 (앱 기동 시 블루프린트 등록만으로는 import하지 않음)
+
+
+# 페이지/이미지 요청의 유저 통계 캐시 (크롤러 연속 요청 흡수용)
+USER_STATS_CACHE_SIZE = 512
+USER_STATS_CACHE_TTL_SEC = 60
+
+# /og/u/<nickname>.png 응답 Cache-Control max-age (카드는 refresh 때만 바뀜)
+OG_IMAGE_MAX_AGE = 3600
+
+# 전체 생성 워커 수: 바뀐 카드 수 // 이 값과 사용 가능한 CPU 수 중 작은 값 (2 미만이면 현재 프로세스에서 순차)
+# → 1코어에서는 항상 순차 (워커를 띄우면 렌더링이 코어를 나눠 써서 더 느림)
+OG_BUILD_CARDS_PER_WORKER = 4
+
+# 카드 레이아웃/디자인을 바꾸면 올릴 것 (콘텐츠 해시에 포함 → 전체 카드 재생성)
+OG_TEMPLATE_VERSION = 2
+
+# 카드 출력 포맷: 이름 -> 캐시 파일 확장자 / MIME / PIL 저장 옵션
+# 캐시 경로는 cache_dir/<포맷>/<닉네임><확장자> (thumbnails.py 변형 디렉터리와 같은 방식)
+# → 포맷마다 디렉터리가 달라서 닉네임이 어떤 글자로 끝나도 다른 포맷의 파일 이름과 겹치지 않음
+# - png  : 무손실 RGB (기존 출력과 동일. optimize는 사진 배너에서 3% 줄이는 데 5배 느려서 끔)
+# - png8 : 256색 팔레트 PNG (디더링, 무손실 대비 절반 이하 크기지만 사진 배너 화질이 떨어져 설정으로만 사용)
+# - webp : 손실 WebP (지원하는 클라이언트에만 Accept 협상으로 전송)
+# - jpeg : 프로그레시브 JPEG
+OG_FORMATS = {
+    "png":  {"ext": ".png",   "mimetype": "image/png",  "save": {"format": "PNG"}},
+    "png8": {"ext": ".png",   "mimetype": "image/png",  "save": {"format": "PNG", "optimize": True}, "palette": 256},
+    "webp": {"ext": ".webp",  "mimetype": "image/webp", "save": {"format": "WEBP", "quality": 85, "method": 6}},
+    "jpeg": {"ext": ".jpg",   "mimetype": "image/jpeg", "save": {"format": "JPEG", "quality": 88, "optimize": True, "progressive": True}},
+}
+# 캐시에 만들어 둘 포맷 기본값 (첫 번째가 Accept 협상이 안 될 때의 기본 응답 → 무손실 png 유지)
+# app.py는 web_config.json의 "og_card_formats"로 바꿀 수 있음 (예: ["png8", "webp"])
+OG_CARD_FORMATS = ("png", "webp")
+
+
+# 통계 그리드 라벨 (표시 순서)
+CARD_STAT_LABELS = ("First joined", "Participations", "Total time", "Achievements")
+
+
+# ---------- 폰트 / 측정 / 템플릿 캐시 (프로세스 전역) ----------
+_font_cache = {}        # (path, size) -> ImageFont (로드 실패 시 None)
+_font_cache_lock = Lock()
+_measure_draw = None    # 텍스트 폭 측정 전용 ImageDraw (1x1 캔버스 재사용)
+_card_templates = {}    # (폰트, 워터마크, 템플릿 버전) -> {"image": 정적 레이어, "label_sizes": {...}}
+
+
+def load_font(path: str, size: int):
+    """ImageFont.truetype를 (path, size)당 한 번만 로드. 실패하면 None"""
+    key = (path, size)
+    font = _font_cache.get(key)
+    if font is None and key not in _font_cache:
+        from PIL import ImageFont
+        try:
+            font = ImageFont.truetype(path, size)
+        except Exception:
+            font = None
+        with _font_cache_lock:
+            _font_cache[key] = font
+    return font
+
+
+def _reset_locks_after_fork():
+    """fork된 렌더링 워커: 부모의 다른 스레드가 잡고 있던 락이 잠긴 채 복사되지 않도록 새로 만듦"""
+    global _font_cache_lock
+    _font_cache_lock = Lock()
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_reset_locks_after_fork)
+
+
+def usable_cpu_count() -> int:
+    """이 프로세스가 쓸 수 있는 CPU 수 (컨테이너/affinity 제한 반영)"""
+    if hasattr(os, "sched_getaffinity"):
+        return len(os.sched_getaffinity(0)) or 1
+    return os.cpu_count() or 1
+
+
+def _write_atomic(path: str, data: bytes):
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+
+
+def encode_card(img, fmt: str) -> bytes:
+    """렌더링된 카드 이미지를 OG_FORMATS[fmt] 설정으로 인코딩"""
+    spec = OG_FORMATS[fmt]
+    if spec.get("palette"):
+        img = img.quantize(colors=spec["palette"])
+    buf = BytesIO()
+    img.save(buf, **spec["save"])
+    return buf.getvalue()
+
+
+def measure_text_width(text: str, font) -> int:
+    global _measure_draw
+    if _measure_draw is None:
+        from PIL import Image, ImageDraw
+        _measure_draw = ImageDraw.Draw(Image.new("RGB", (1, 1)))
+    return _measure_draw.textbbox((0, 0), text, font=font)[2]
 
 
 class UserCardService:
@@ -26,6 +137,8 @@ class UserCardService:
         route_prefix: str = "",
         template_user_page: str = "user_page.html",
         cache_dir: str = "./og_cache",
+        card_formats: tuple = OG_CARD_FORMATS,
+        thumb_dir: str | None = None,
     ):
         self.DB_CONFIG = db_config
         self.PROFILE_IMG_DIR = profile_img_dir
@@ -35,12 +148,35 @@ class UserCardService:
         self.BRAND_WATERMARK = brand_watermark
         self.ROUTE_PREFIX = route_prefix.rstrip("/")
         self.TEMPLATE_USER_PAGE = template_user_page
+        unknown = [f for f in card_formats if f not in OG_FORMATS]
+        if unknown or not card_formats:
+            raise ValueError(f"unknown card formats: {unknown or card_formats}")
+        self.CARD_FORMATS = tuple(card_formats)
+
+        # 프로세스 풀 워커에서 같은 설정으로 서비스를 다시 만들기 위한 인자
+        self._init_kwargs = dict(
+            db_config=db_config, profile_img_dir=profile_img_dir,
+            profile_default_filename=profile_default_filename,
+            font_path_bold=font_path_bold, font_path_reg=font_path_reg,
+            brand_watermark=brand_watermark, route_prefix=route_prefix,
+            template_user_page=template_user_page, cache_dir=cache_dir,
+            card_formats=self.CARD_FORMATS, thumb_dir=thumb_dir,
+        )
+        # 배너용 축소 프로필 캐시 (thumb_dir 없으면 원본을 그대로 디코딩)
+        self._thumbs = ThumbnailStore(profile_img_dir, thumb_dir) if thumb_dir else None
+        # 프로필 존재 여부/mtime (app.py와 같은 디렉터리 인덱스 공유)
+        self._profile_index = get_profile_index(profile_img_dir)
+
+        self._stats_cache = TTLLRUCache(USER_STATS_CACHE_SIZE, USER_STATS_CACHE_TTL_SEC)
+        self._build_locks = {}
+        self._build_locks_guard = Lock()
 
         self.bp = Blueprint("user_card", __name__)
         self._register_routes()
 
         self.CACHE_DIR = cache_dir
-        os.makedirs(self.CACHE_DIR, exist_ok=True)
+        for fmt in self.CARD_FORMATS:
+            os.makedirs(os.path.join(cache_dir, fmt), exist_ok=True)
 
     # ---------- utils ----------
     @staticmethod
@@ -56,35 +192,54 @@ class UserCardService:
         return f"{h:02d}:{m:02d}"
 
     def try_font(self, path: str, size: int):
-        try:
-            return ImageFont.truetype(path, size)
-        except Exception:
+        font = load_font(path, size)
+        if font is None:
+            from PIL import ImageFont
             return ImageFont.load_default()
+        return font
 
     def fit_font(self, text: str, font_path: str, base_size: int, max_width: int, min_size: int = 20):
-        """텍스트가 max_width를 넘지 않도록 폰트 크기를 자동 축소"""
-        size = base_size
+        """
+        텍스트가 max_width를 넘지 않도록 폰트 크기를 자동 축소.
+        후보 크기(base_size, base_size-2, ... >= min_size) 중 들어가는 가장 큰 크기를 이진 탐색
+        (글자 폭은 크기에 대해 단조 증가)
+        """
         # PIL 기본 폰트는 크기 제어가 어려우니 TrueType 기준
-        while size >= min_size and os.path.exists(font_path):
-            try:
-                f = ImageFont.truetype(font_path, size)
-            except Exception:
-                break
-            w = ImageDraw.Draw(Image.new("RGB", (10, 10))).textbbox((0, 0), text, font=f)[2]
-            if w <= max_width:
-                return f
-            size -= 2
+        if os.path.exists(font_path) and base_size >= min_size:
+            sizes = list(range(base_size, min_size - 1, -2))   # 큰 크기부터
+            lo, hi = 0, len(sizes)   # sizes[lo:]에서 처음 들어가는 위치
+            while lo < hi:
+                mid = (lo + hi) // 2
+                f = load_font(font_path, sizes[mid])
+                if f is None:
+                    break
+                if measure_text_width(text, f) <= max_width:
+                    hi = mid
+                else:
+                    lo = mid + 1
+            else:
+                if lo < len(sizes):
+                    return load_font(font_path, sizes[lo])
         # fallback
-        try:
-            return ImageFont.truetype(font_path, min_size)
-        except Exception:
-            return ImageFont.load_default()
+        return self.try_font(font_path, min_size)
+
+    def resolve_profile_entry(self, nickname: str) -> tuple:
+        """(프로필 파일명, mtime_ns) — 없으면 기본 이미지. 디렉터리 인덱스 dict 조회"""
+        return self._profile_index.resolve(self.safe_filename(nickname) + ".png",
+                                           self.PROFILE_DEFAULT_FILENAME)
 
-    def resolve_profile_image(self, nickname: str) -> str:
-        img_filename = self.safe_filename(nickname) + ".png"
+    def resolve_profile_image(self, nickname: str, variant: str | None = None) -> str:
+        """
+        프로필 원본 경로 (없으면 기본 이미지).
+        variant(thumbnails.THUMB_VARIANTS)를 주면 축소 변형 경로 (만들 수 없으면 원본)
+        """
+        img_filename, mtime_ns = self.resolve_profile_entry(nickname)
         img_path = os.path.join(self.PROFILE_IMG_DIR, img_filename)
-        if not os.path.exists(img_path):
-            img_path = os.path.join(self.PROFILE_IMG_DIR, self.PROFILE_DEFAULT_FILENAME)
+        if variant and self._thumbs is not None and mtime_ns is not None:
+            try:
+                return self._thumbs.path(img_filename, variant, source_mtime_ns=mtime_ns) or img_path
+            except Exception as e:
+                print(f"[WARN] 프로필 축소 실패 ({img_filename}, {variant}): {e}")
         return img_path
 
     # ---------- DB ----------
@@ -96,80 +251,78 @@ class UserCardService:
             "total_count": int, "total_duration_sec": int,
             "achv_count": int, "last_attended": datetime|None
         } or None
+        페이지/이미지 요청용: 짧은 TTL 캐시 → 없으면 fetch_all_user_stats([nickname])
         """
+        stats = self._stats_cache.get(nickname)
+        if stats is None:
+            found = self.fetch_all_user_stats([nickname])
+            if not found:
+                return None
+            stats = found[0]
+            self._stats_cache.put(nickname, stats)
+        return stats
+
+    def fetch_all_user_stats(self, nicknames: list | None = None) -> list:
+        """
+        fetch_user_stats와 같은 형태를 전체(또는 nicknames) 유저에 대해 한 번에 조회.
+        - users + 참여 요약 + user_stats 조인 1번
+        - 요약이 없는 유저의 참여 횟수는 attendance GROUP BY 1번으로 보완 (필요할 때만)
+        """
+        if nicknames is not None and not nicknames:
+            return []
+        where, params = "", ()
+        if nicknames is not None:
+            where = "WHERE u.nickname IN (" + ", ".join(["%s"] * len(nicknames)) + ")"
+            params = tuple(nicknames)
+
         conn = pymysql.connect(**self.DB_CONFIG)
         try:
             with conn.cursor() as cur:
-                # 1) 유저
-                cur.execute(
-                    """
-                    SELECT user_id, nickname, COALESCE(comment, '')
-                    FROM users
-                    WHERE nickname = %s
-                    """,
-                    (nickname,),
-                )
-                row = cur.fetchone()
-                if not row:
-                    return None
-                user_id, nickname_db, comment = row
-
-                # 2) 참여 횟수 요약
                 cur.execute(
-                    """
-                    SELECT total_count, last_attended
-                    FROM user_attendance_summary
-                    WHERE user_id = %s
-                    """,
-                    (user_id,),
-                )
-                summary = cur.fetchone()
-                if summary:
-                    total_count, last_attended = summary
-                else:
-                    cur.execute("SELECT COUNT(*) FROM attendance WHERE user_id = %s", (user_id,))
-                    total_count = (cur.fetchone() or [0])[0]
-                    last_attended = None
-
-                # 3) 총 참여 시간
-                cur.execute(
-                    """
-                    SELECT COALESCE(SUM(duration_sec), 0)
-                    FROM attendance
-                    WHERE user_id = %s
+                    f"""
+                    SELECT u.user_id, u.nickname, COALESCE(u.comment, ''),
+                           uas.user_id IS NOT NULL, uas.total_count, uas.last_attended,
+                           COALESCE(us.total_duration_sec, 0), COALESCE(us.achv_count, 0),
+                           us.first_attended
+                    FROM users u
+                    LEFT JOIN user_attendance_summary uas ON uas.user_id = u.user_id
+                    LEFT JOIN user_stats us ON us.user_id = u.user_id
+                    {where}
                     """,
-                    (user_id,),
+                    params,
                 )
-                total_duration_sec = (cur.fetchone() or [0])[0] or 0
+                rows = cur.fetchall()
 
-                # 4) 도전과제 수
-                cur.execute(
-                    """
-                    SELECT COUNT(*)
-                    FROM user_achievements
-                    WHERE user_id = %s
-                    """,
-                    (user_id,),
-                )
-                achv_count = (cur.fetchone() or [0])[0] or 0
-                
-                # 5) 최초 참가일
-                cur.execute("SELECT MIN(enter_time) FROM attendance WHERE user_id = %s", (user_id,))
-                first_attended = (cur.fetchone() or [None])[0]
-
-                return {
-                    "user_id": user_id,
-                    "nickname": nickname_db,
-                    "comment": comment,
-                    "total_count": int(total_count or 0),
-                    "total_duration_sec": int(total_duration_sec or 0),
-                    "achv_count": int(achv_count or 0),
-                    "last_attended": last_attended,
-                    "first_attended": first_attended,
-                }
+                fallback_counts = {}
+                missing = [row[0] for row in rows if not row[3]]
+                if missing:
+                    cur.execute(
+                        "SELECT user_id, COUNT(*) FROM attendance WHERE user_id IN ("
+                        + ", ".join(["%s"] * len(missing)) + ") GROUP BY user_id",
+                        tuple(missing),
+                    )
+                    fallback_counts = dict(cur.fetchall())
         finally:
             conn.close()
 
+        out = []
+        for (user_id, nickname, comment, has_summary, total_count, last_attended,
+             total_duration_sec, achv_count, first_attended) in rows:
+            if not has_summary:
+                total_count = fallback_counts.get(user_id, 0)
+                last_attended = None
+            out.append({
+                "user_id": user_id,
+                "nickname": nickname,
+                "comment": comment,
+                "total_count": int(total_count or 0),
+                "total_duration_sec": int(total_duration_sec or 0),
+                "achv_count": int(achv_count or 0),
+                "last_attended": last_attended,
+                "first_attended": first_attended,
+            })
+        return out
+
     def compute_popular_music(self):
         conn = pymysql.connect(**self.DB_CONFIG)
         try:
@@ -193,7 +346,7 @@ class UserCardService:
     # ---------- Render OG Image ----------
 
 
-    def render_user_card_image(self, stats: dict) -> Image.Image:
+    def render_user_card_image(self, stats: dict) -> "Image.Image":
         """
         - 왼쪽 전체(푸터 포함)를 프로필 이미지가 가득 채우는 레이아웃
         - 오른쪽에 이름/소개 + 통계 2x2 + 우측 하단 푸터
@@ -233,10 +386,7 @@ class UserCardService:
         # ===== 워터마크 우측 여백 =====
         WM_RIGHT_PAD = 16
 
-        # ===== 배경 & Draw =====
         from PIL import ImageOps, Image, ImageDraw
-        bg = Image.new("RGB", (W, H), (22, 24, 28))
-        draw = ImageDraw.Draw(bg)
 
         # ===== 폰트 =====
         font_title = self.try_font(self.FONT_PATH_BOLD, 68)
@@ -246,6 +396,37 @@ class UserCardService:
         font_num   = self.try_font(self.FONT_PATH_BOLD, base_num_sz)
         font_wm    = self.try_font(self.FONT_PATH_REG, 22)
 
+        # ===== 정적 레이어 템플릿 (폰트/워터마크 설정당 한 번) =====
+        # 배경, 푸터 바, 워터마크 + 통계 라벨 크기 측정
+        # (소개 아래 구분선은 긴 소개 글 위에 그려져야 하므로 템플릿에 넣지 않음)
+        template_key = (self.FONT_PATH_REG, self.FONT_PATH_BOLD, self.BRAND_WATERMARK, OG_TEMPLATE_VERSION)
+        template = _card_templates.get(template_key)
+        if template is None:
+            base = Image.new("RGB", (W, H), (22, 24, 28))
+            base_draw = ImageDraw.Draw(base)
+
+            # 왼쪽은 이미지 그대로, 오른쪽만 푸터 바 생성
+            base_draw.rectangle([LEFT_IMG_W, H - FOOTER_H, W, H], fill=(26, 28, 34))
+            wm = self.BRAND_WATERMARK
+            wm_box = base_draw.textbbox((0, 0), wm, font=font_wm)
+            wm_w, wm_h = wm_box[2] - wm_box[0], wm_box[3] - wm_box[1]
+            wm_x = W - WM_RIGHT_PAD - wm_w
+            wm_y = H - FOOTER_H + (FOOTER_H - wm_h) // 2
+            base_draw.text((wm_x, wm_y), wm, fill=(120, 125, 132), font=font_wm)
+
+            label_sizes = {}
+            for label in CARD_STAT_LABELS:
+                box = base_draw.textbbox((0, 0), label, font=font_label)
+                label_sizes[label] = (box[2] - box[0], box[3] - box[1])
+
+            template = {"image": base, "label_sizes": label_sizes}
+            with _font_cache_lock:
+                _card_templates[template_key] = template
+
+        # ===== 배경 & Draw =====
+        bg = template["image"].copy()
+        draw = ImageDraw.Draw(bg)
+
         # ===== 유틸 =====
         def text_size(text, font):
             bbox = draw.textbbox((0, 0), text, font=font)
@@ -349,7 +530,7 @@ class UserCardService:
 
         # ===== 왼쪽 전체 이미지(푸터 포함) =====
         img_x, img_y = 0, 0
-        avatar_path = self.resolve_profile_image(stats["nickname"])
+        avatar_path = self.resolve_profile_image(stats["nickname"], variant="card")
         try:
             src = Image.open(avatar_path).convert("RGB")
         except Exception:
@@ -402,12 +583,13 @@ class UserCardService:
         col_w = (grid_width - (GRID_COLS - 1) * COL_GAP) // GRID_COLS
 
         # 통계 순서
-        cards = [
-            ("First joined",   fmt_first(stats.get("first_attended"))),
-            ("Participations", f"{int(stats['total_count'])}"),
-            ("Total time",     fmt_duration(stats['total_duration_sec'])),
-            ("Achievements",   f"{int(stats['achv_count'])}"),
+        values = [
+            fmt_first(stats.get("first_attended")),
+            f"{int(stats['total_count'])}",
+            fmt_duration(stats['total_duration_sec']),
+            f"{int(stats['achv_count'])}",
         ]
+        cards = list(zip(CARD_STAT_LABELS, values))
 
         for idx, (label_en, value) in enumerate(cards):
             row = idx // GRID_COLS
@@ -427,7 +609,7 @@ class UserCardService:
             else:
                 font_num_use = font_num
 
-            lbl_w, lbl_h = text_size(label_en, font_label)
+            lbl_w, lbl_h = template["label_sizes"][label_en]
             val_w, val_h = text_size(value, font_num_use)
 
             # 값: 중앙
@@ -440,90 +622,351 @@ class UserCardService:
             lbl_y = val_y - lbl_h - LABEL_VALUE_GAP
             draw.text((lbl_x, lbl_y), label_en, font=font_label, fill=(170, 175, 182))
 
-        # ===== 푸터 (오른쪽 영역에만) =====
-        # 왼쪽은 이미지 그대로, 오른쪽만 푸터 바 생성
-        draw.rectangle([LEFT_IMG_W, H - FOOTER_H, W, H], fill=(26, 28, 34))
-        wm = self.BRAND_WATERMARK
-        wm_w, wm_h = text_size(wm, font_wm)
-        wm_x = W - WM_RIGHT_PAD - wm_w
-        wm_y = H - FOOTER_H + (FOOTER_H - wm_h) // 2
-        draw.text((wm_x, wm_y), wm, fill=(120, 125, 132), font=font_wm)
+        # ===== 푸터 (오른쪽 영역에만): 템플릿에 있음 =====
 
         return bg
 
 
     # ---------- Caching ---------
-    def _cached_path(self, nickname: str) -> str:
-        """닉네임 기준 캐시 파일 경로(.png)"""
-        fname = self.safe_filename(nickname) + ".png"
-        return os.path.join(self.CACHE_DIR, fname)
+    def _cached_path(self, nickname: str, fmt: str | None = None) -> str:
+        """닉네임 + 포맷 기준 캐시 파일 경로 cache_dir/<포맷>/<닉네임><확장자> (fmt=None이면 기본 포맷)"""
+        fmt = fmt or self.CARD_FORMATS[0]
+        return os.path.join(self.CACHE_DIR, fmt, self.safe_filename(nickname) + OG_FORMATS[fmt]["ext"])
 
-    def build_all_user_cards(self, overwrite: bool = True) -> dict:
+    def card_input_hash(self, stats: dict) -> str:
         """
-        모든 users.nickname에 대해 OG 이미지를 미리 생성해 캐시에 저장.
-        overwrite=False 이면 이미 있는 파일은 건너뜀.
-        반환: {'total': N, 'built': k, 'skipped': s, 'errors': [(nickname, errstr), ...]}
+        카드에 보이는 값만으로 만든 콘텐츠 해시.
+        닉네임, 소개, 참여 횟수, 누적 시간(분 단위, 카드 표시 단위), 도전과제 수, 첫 참여일,
+        프로필 이미지 경로/mtime, 템플릿 버전, 워터마크
+        """
+        avatar_filename, avatar_mtime_ns = self.resolve_profile_entry(stats["nickname"])
+        first = stats.get("first_attended")
+        parts = [
+            OG_TEMPLATE_VERSION,
+            self.BRAND_WATERMARK,
+            stats["nickname"],
+            (stats.get("comment") or "").strip(),
+            int(stats.get("total_count") or 0),
+            int(stats.get("total_duration_sec") or 0) // 60,
+            int(stats.get("achv_count") or 0),
+            first.strftime("%Y-%m-%d") if hasattr(first, "strftime") else (str(first) if first else None),
+            avatar_filename,
+            avatar_mtime_ns,
+        ]
+        return hashlib.sha1(json.dumps(parts, ensure_ascii=False).encode("utf-8")).hexdigest()
+
+    @staticmethod
+    def _read_card_hash(cache_path: str, st: os.stat_result | None = None) -> str | None:
+        """
+        .hash 사이드카의 콘텐츠 해시. 사이드카에 적힌 데이터 파일 (크기, mtime_ns)가 지금 파일(st)과 다르면 None
+        (데이터만 바뀌고 사이드카를 못 쓴 채 죽은 경우 옛 해시를 믿지 않음)
         """
-        result = {"total": 0, "built": 0, "skipped": 0, "errors": []}
-        conn = pymysql.connect(**self.DB_CONFIG)
         try:
-            with conn.cursor() as cur:
-                cur.execute("SELECT nickname FROM users")
-                rows = cur.fetchall()
-                result["total"] = len(rows)
-                print(rows)                
-
-                for (nickname,) in rows:
-                    try:
-                        cache_path = self._cached_path(nickname)
-                        if (not overwrite) and os.path.exists(cache_path):
-                            result["skipped"] += 1
-                            continue
-
-                        stats = self.fetch_user_stats(nickname)
-                        if not stats:
-                            result["errors"].append((nickname, "stats_not_found"))
-                            continue
-
-                        img = self.render_user_card_image(stats)
-                        img.save(cache_path, format="PNG")
-                        result["built"] += 1
-                    except Exception as e:
-                        result["errors"].append((nickname, str(e)))
-        finally:
-            conn.close()
-        return result
+            with open(cache_path + ".hash", "r", encoding="utf-8") as f:
+                parts = f.read().split()
+            st = st or os.stat(cache_path)
+        except OSError:
+            return None
+        if len(parts) != 3 or parts[1:] != [str(st.st_size), str(st.st_mtime_ns)]:
+            return None
+        return parts[0]
 
+    @staticmethod
+    def _write_card_hash(cache_path: str, card_hash: str):
+        """데이터 파일을 쓴 뒤에 호출: 해시와 함께 데이터 파일 (크기, mtime_ns)를 기록"""
+        st = os.stat(cache_path)
+        _write_atomic(cache_path + ".hash", f"{card_hash} {st.st_size} {st.st_mtime_ns}".encode("utf-8"))
+
+    def warmup_fonts(self):
+        """카드에 쓰는 폰트/크기와 정적 레이어 템플릿을 미리 로드 (렌더링 워커 시작 시 한 번)"""
+        for size in (68, 30, 26, 22):
+            self.try_font(self.FONT_PATH_REG, size)
+            self.try_font(self.FONT_PATH_BOLD, size)
+        for size in range(50, 23, -2):
+            load_font(self.FONT_PATH_BOLD, size)
+        # 템플릿은 첫 렌더링에서 만들어지므로 빈 카드를 한 장 그려 둠
+        self.render_user_card_image({"nickname": "", "total_count": 0, "total_duration_sec": 0, "achv_count": 0})
+
+    def write_user_card(self, stats: dict, card_hash: str | None = None, formats: tuple | None = None) -> dict:
+        """
+        카드를 한 번 렌더링해 포맷(기본: CARD_FORMATS 전부)마다 한 번씩 인코딩하고, 캐시에 원자적으로 기록
+        (임시 파일 + os.replace → 읽는 쪽이 반쯤 쓰인 파일을 보지 않음). 콘텐츠 해시는 데이터를 쓴 뒤 포맷별로 옆에 기록.
+        반환: {fmt: 인코딩된 바이트}
+        """
+        card_hash = card_hash or self.card_input_hash(stats)
+        img = self.render_user_card_image(stats)
+        encoded = {}
+        for fmt in formats or self.CARD_FORMATS:
+            cache_path = self._cached_path(stats["nickname"], fmt)
+            data = encode_card(img, fmt)
+            _write_atomic(cache_path, data)
+            self._write_card_hash(cache_path, card_hash)
+            encoded[fmt] = data
+        return encoded
+
+    def card_is_current(self, nickname: str, card_hash: str) -> bool:
+        """설정된 모든 포맷의 캐시 파일이 같은 콘텐츠 해시로 만들어져 있는지"""
+        return all(self._read_card_hash(self._cached_path(nickname, fmt)) == card_hash
+                   for fmt in self.CARD_FORMATS)
+
+    def cache_footprint(self, nicknames) -> dict:
+        """닉네임 목록의 캐시 파일 크기 합계 {fmt: bytes} (없는 파일은 0)"""
+        nicknames = list(nicknames)
+        footprint = {}
+        for fmt in self.CARD_FORMATS:
+            total = 0
+            for nickname in nicknames:
+                try:
+                    total += os.path.getsize(self._cached_path(nickname, fmt))
+                except OSError:
+                    pass
+            footprint[fmt] = total
+        return footprint
+
+    def prune_cache(self, nicknames, older_than: float | None = None) -> int:
+        """
+        캐시에서 현재 유저 x CARD_FORMATS에 해당하지 않는 카드 파일(+ .hash)을 삭제
+        (설정에서 뺀 포맷 디렉터리, 포맷별 디렉터리 이전의 cache_dir 바로 아래 파일, 없어진 유저).
+        older_than(time.time() 기준)을 주면 그보다 전에 수정된 파일만 삭제
+        → 전체 생성 도중 요청 경로에서 새로 만든 카드(목록에 없던 신규 유저)는 남김. 반환: 삭제한 파일 수
+        """
+        keep = set()
+        for nickname in nicknames:
+            for fmt in self.CARD_FORMATS:
+                path = self._cached_path(nickname, fmt)
+                keep.update((path, path + ".hash"))
+        suffixes = tuple(s for spec in OG_FORMATS.values() for s in (spec["ext"], spec["ext"] + ".hash"))
+        removed = 0
+        for directory in (self.CACHE_DIR, *(os.path.join(self.CACHE_DIR, fmt) for fmt in OG_FORMATS)):
+            try:
+                entries = list(os.scandir(directory))
+            except OSError:
+                continue
+            for entry in entries:
+                if entry.path in keep or not entry.name.endswith(suffixes):
+                    continue
+                try:
+                    if not entry.is_file() or (older_than is not None and entry.stat().st_mtime >= older_than):
+                        continue
+                    os.remove(entry.path)
+                    removed += 1
+                except OSError:
+                    pass
+        return removed
+
+    def build_all_user_cards(self, overwrite: bool = True, workers: int | None = None,
+                             force: bool = False) -> dict:
+        """
+        모든 users.nickname에 대해 OG 이미지를 미리 생성해 캐시에 저장.
+        - 통계는 fetch_all_user_stats로 한 번에 조회
+        - 카드 입력의 콘텐츠 해시가 저장된 해시와 같으면 다시 그리지 않음 (unchanged)
+        - 렌더링/인코딩을 프로세스 풀로 분산. 워커 수는 min(workers(None이면 CPU 수), 사용 가능한 CPU 수,
+          바뀐 카드 수 // OG_BUILD_CARDS_PER_WORKER), 2 미만이면 현재 프로세스에서 순차
+        overwrite=False 이면 이미 있는 파일은 해시와 관계없이 건너뜀, force=True 이면 해시와 관계없이 전부 재생성.
+        반환: {'total': N, 'built': k, 'skipped': s, 'unchanged': u, 'errors': [(nickname, errstr), ...],
+               'workers': w, 'seconds': t, 'cards_per_sec': r,
+               'written_bytes': {fmt: 이번에 쓴 바이트}, 'cache_bytes': {fmt: 캐시 전체 바이트},
+               'avg_card_bytes': {fmt: 카드당 평균 바이트}, 'pruned': 지운 옛 캐시 파일 수}
+        """
+        started = time.perf_counter()
+        started_at = time.time()
+        result = {"total": 0, "built": 0, "skipped": 0, "unchanged": 0, "errors": [],
+                  "written_bytes": dict.fromkeys(self.CARD_FORMATS, 0)}
+
+        all_stats = self.fetch_all_user_stats()
+        result["total"] = len(all_stats)
+
+        todo = []
+        for stats in all_stats:
+            exists = os.path.exists(self._cached_path(stats["nickname"]))
+            if (not overwrite) and exists:
+                result["skipped"] += 1
+                continue
+            card_hash = self.card_input_hash(stats)
+            if exists and not force and self.card_is_current(stats["nickname"], card_hash):
+                result["unchanged"] += 1
+                continue
+            todo.append((stats, card_hash))
+
+        cpus = usable_cpu_count()
+        workers = max(1, min(workers or cpus, cpus, len(todo) // OG_BUILD_CARDS_PER_WORKER))
+        if workers == 1:
+            outcomes = (_write_card_safely(self, stats, card_hash) for stats, card_hash in todo)
+            self._collect_build_outcomes(outcomes, result)
+        else:
+            self._collect_build_outcomes(self._build_in_workers(todo, workers), result)
+
+        elapsed = time.perf_counter() - started
+        result["workers"] = workers
+        result["seconds"] = round(elapsed, 3)
+        result["cards_per_sec"] = round(result["built"] / elapsed, 1) if elapsed > 0 else None
+        result["pruned"] = self.prune_cache((s["nickname"] for s in all_stats), older_than=started_at)
+        result["cache_bytes"] = self.cache_footprint(s["nickname"] for s in all_stats)
+        result["avg_card_bytes"] = {fmt: (total // result["total"] if result["total"] else 0)
+                                    for fmt, total in result["cache_bytes"].items()}
+        print(f"[INFO] OG 카드 {result['built']}장 생성, {result['unchanged']}장 변경 없음 "
+              f"({workers} workers, {result['cards_per_sec']} cards/s), 캐시 크기 {result['cache_bytes']}")
+        return result
 
-    def get_or_build_user_card(self, nickname: str, force_rebuild: bool = False) -> BytesIO:
+    def _build_in_workers(self, todo: list, workers: int) -> list:
         """
-        캐시에 미리 생성된 이미지를 읽어 반환.
-        - 없거나 force_rebuild=True 이면 바로 생성해서 캐시에 쓰고 반환.
-        반환: PNG 바이너리(메모리 버퍼)
+        todo를 ProcessPoolExecutor(workers개)에서 카드 한 장씩 렌더링. 워커는 시작 시 한 번 서비스를 만들고
+        폰트/템플릿을 로드(_init_card_worker). 워커가 죽으면(BrokenProcessPool) 끝나지 않은 카드는
+        새 풀에서 한 장씩 다시 시도 → 죽게 만든 카드만 에러로 남고 나머지는 생성됨.
+        반환: [(nickname, 에러 또는 None, {fmt: 바이트 수})]
         """
-        cache_path = self._cached_path(nickname)
+        outcomes = []
+        pending = list(todo)
+        one_by_one = False
+        while pending:
+            pool = self._card_pool(1 if one_by_one else workers)
+            try:
+                if one_by_one:
+                    while pending:
+                        stats, card_hash = pending.pop(0)
+                        try:
+                            outcomes.append(pool.submit(_build_card_in_worker, stats, card_hash).result())
+                        except BrokenProcessPool as e:
+                            outcomes.append((stats["nickname"], f"card worker crashed: {e}", {}))
+                            break   # 풀을 새로 만들어 이어서
+                        except Exception as e:
+                            outcomes.append((stats["nickname"], str(e), {}))
+                else:
+                    futures = [(item, pool.submit(_build_card_in_worker, *item)) for item in pending]
+                    pending = []
+                    for item, future in futures:
+                        try:
+                            outcomes.append(future.result())
+                        except BrokenProcessPool:
+                            pending.append(item)
+                        except Exception as e:
+                            outcomes.append((item[0]["nickname"], str(e), {}))
+                    if pending:
+                        print(f"[WARN] OG 카드 워커 종료, 남은 {len(pending)}장을 한 장씩 다시 시도합니다.")
+                    one_by_one = True
+            finally:
+                pool.shutdown(wait=True, cancel_futures=True)
+        return outcomes
+
+    def _card_pool(self, workers: int) -> ProcessPoolExecutor:
+        """
+        렌더링 프로세스 풀. fork를 쓸 수 있으면 fork (spawn/forkserver는 워커마다 __main__(app.py: 설정/Flask 앱/
+        DB 준비)을 다시 import하므로). fork된 워커는 부모가 이미 로드한 폰트/템플릿 캐시를 그대로 물려받음
+        """
+        context = multiprocessing.get_context("fork") if "fork" in multiprocessing.get_all_start_methods() else None
+        return ProcessPoolExecutor(max_workers=workers, mp_context=context,
+                                   initializer=_init_card_worker, initargs=(self._init_kwargs,))
 
-        # 캐시 사용
-        if (not force_rebuild) and os.path.exists(cache_path):
-            with open(cache_path, "rb") as f:
-                buf = BytesIO(f.read())
-                buf.seek(0)
-                return buf
+    @staticmethod
+    def _collect_build_outcomes(outcomes, result):
+        for nickname, error, sizes in outcomes:
+            if error is None:
+                result["built"] += 1
+                for fmt, size in sizes.items():
+                    result["written_bytes"][fmt] += size
+            else:
+                result["errors"].append((nickname, error))
 
-        # 캐시에 없으면 생성
-        stats = self.fetch_user_stats(nickname)
-        if not stats:
-            raise FileNotFoundError("user stats not found")
 
-        img = self.render_user_card_image(stats)
-        os.makedirs(self.CACHE_DIR, exist_ok=True)
-        img.save(cache_path, format="PNG")
+    def get_or_build_user_card(self, nickname: str, force_rebuild: bool = False,
+                               fmt: str | None = None) -> BytesIO:
+        """
+        캐시에 미리 생성된 이미지를 읽어 반환.
+        - 없거나 force_rebuild=True 이면 바로 생성해서 캐시에 쓰고 반환 (요청된 포맷만 인코딩).
+        - 같은 닉네임 동시 요청은 닉네임별 락으로 한 번만 렌더링 (나머지는 그 결과를 캐시에서 읽음)
+        반환: fmt(None이면 기본 포맷) 이미지 바이너리(메모리 버퍼)
+        """
+        fmt = fmt or self.CARD_FORMATS[0]
+        cache_path = self._cached_path(nickname, fmt)
 
-        buf = BytesIO()
-        img.save(buf, format="PNG")
-        buf.seek(0)
-        return buf
+        # 캐시 사용 (그 사이 지워졌으면 생성)
+        if not force_rebuild:
+            try:
+                with open(cache_path, "rb") as f:
+                    return BytesIO(f.read())
+            except FileNotFoundError:
+                pass
+        return BytesIO(self._build_card(nickname, force_rebuild, fmt)[0])
+
+    def _build_card(self, nickname: str, force_rebuild: bool, fmt: str) -> tuple:
+        """
+        닉네임별 락 안에서 카드를 만들어 캐시에 쓰고 (fmt 바이트, 콘텐츠 해시) 반환.
+        기다리는 동안 다른 요청이 만들었으면 그 결과 사용 (강제 재생성은 요청 이후에 만든 것만 인정)
+        """
+        cache_path = self._cached_path(nickname, fmt)
+        requested_at = time.time()
+        with self._build_lock(nickname):
+            try:
+                with open(cache_path, "rb") as f:
+                    st = os.fstat(f.fileno())
+                    card_hash = self._read_card_hash(cache_path, st)
+                    if card_hash and st.st_mtime >= (requested_at if force_rebuild else 0):
+                        return f.read(), card_hash
+            except OSError:
+                pass
 
+            stats = self.fetch_user_stats(nickname)
+            if not stats:
+                raise FileNotFoundError("user stats not found")
+            os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+            card_hash = self.card_input_hash(stats)
+            # 요청된 포맷만 인코딩 (나머지 포맷은 다음 전체 생성에서 채움)
+            return self.write_user_card(stats, card_hash, formats=(fmt,))[fmt], card_hash
+
+    def _build_lock(self, nickname: str) -> Lock:
+        """닉네임별 렌더링 락 (유저 수만큼만 생기므로 정리하지 않음)"""
+        with self._build_locks_guard:
+            lock = self._build_locks.get(nickname)
+            if lock is None:
+                lock = self._build_locks[nickname] = Lock()
+            return lock
+
+    def _send_cached_card(self, cache_path: str, fmt: str):
+        """
+        캐시 파일을 조건부 응답으로 전송. ETag는 카드 콘텐츠 해시-포맷(없으면 mtime-크기)
+        파일을 먼저 열고 그 fd로 stat/전송 → 그 사이 교체/삭제돼도 연 파일과 ETag가 맞음.
+        파일이 없으면 FileNotFoundError (호출하는 쪽에서 생성)
+        """
+        f = open(cache_path, "rb")
+        try:
+            st = os.fstat(f.fileno())
+            card_hash = self._read_card_hash(cache_path, st)
+            etag = f"{card_hash}-{fmt}" if card_hash else f"{st.st_mtime_ns:x}-{st.st_size:x}"
+            return self._send_card(f, fmt, etag, st.st_mtime)
+        except Exception:
+            f.close()
+            raise
+
+    def _send_card(self, source, fmt: str, etag: str, last_modified: float):
+        """카드(파일 경로 또는 메모리 버퍼)를 ETag/Last-Modified/Cache-Control 조건부 응답으로 전송"""
+        resp = send_file(
+            source,
+            mimetype=OG_FORMATS[fmt]["mimetype"],
+            conditional=True,
+            etag=etag,
+            last_modified=last_modified,
+            max_age=OG_IMAGE_MAX_AGE,
+        )
+        # 같은 URL이 Accept에 따라 다른 포맷을 돌려주므로 중간 캐시가 구분하도록
+        if len(self.CARD_FORMATS) > 1:
+            resp.vary.add("Accept")
+        return resp
+
+    def negotiate_format(self) -> str:
+        """
+        응답 포맷 선택: ?format=<png|png8|webp|jpeg> 우선, 없으면 Accept 헤더와 CARD_FORMATS의 MIME 협상.
+        Accept가 없거나(크롤러) 맞는 게 없으면 기본 포맷(CARD_FORMATS[0]).
+        """
+        fmt = request.args.get("format")
+        if fmt:
+            if fmt not in self.CARD_FORMATS:
+                abort(400)
+            return fmt
+        by_mimetype = {}
+        for f in self.CARD_FORMATS:
+            by_mimetype.setdefault(OG_FORMATS[f]["mimetype"], f)
+        best = request.accept_mimetypes.best_match(list(by_mimetype))
+        return by_mimetype.get(best, self.CARD_FORMATS[0])
 
     # ---------- Routes ----------
     def _register_routes(self):
@@ -550,23 +993,55 @@ class UserCardService:
         #     return send_file(buf, mimetype="image/png")
         @self.bp.route(og_rule)
         def user_og_image(nickname):
+            # 캐시 우선 반환: 파일이 있으면 DB를 거치지 않고 경로에서 바로 전송
+            # (ETag/Last-Modified/Cache-Control + If-None-Match/If-Modified-Since → 304)
+            # 쿼리로 강제 재생성 가능: ?rebuild=1, 포맷 지정: ?format=webp (없으면 Accept 협상)
+            force = request.args.get("rebuild") in ("1", "true", "yes")
+            fmt = self.negotiate_format()
+            if not force:
+                try:
+                    return self._send_cached_card(self._cached_path(nickname, fmt), fmt)
+                except FileNotFoundError:
+                    pass   # 없음 / 방금 지워짐(prune, 교체 중) → 생성
             stats = self.fetch_user_stats(nickname)
             if not stats:
                 abort(404)
-            # 캐시 우선 반환 (쿼리로 강제 재생성 가능: ?rebuild=1)
-            force = request.args.get("rebuild") in ("1", "true", "yes")
             try:
-                buf = self.get_or_build_user_card(stats["nickname"], force_rebuild=force)
+                data, card_hash = self._build_card(stats["nickname"], force, fmt)
             except FileNotFoundError:
                 abort(404)
-            return send_file(buf, mimetype="image/png")
-
+            # 방금 만든 바이트를 그대로 전송 (캐시 파일을 다시 읽지 않음)
+            return self._send_card(BytesIO(data), fmt, f"{card_hash}-{fmt}", time.time())
 
 
 def create_user_card_blueprint(**kwargs) -> Blueprint:
     svc = UserCardService(**kwargs)
     return svc.bp
 
-def build_all_user_cards(**kwargs) -> dict:
+def build_all_user_cards(workers: int | None = None, **kwargs) -> dict:
     svc = UserCardService(**kwargs)
-    return svc.build_all_user_cards()
\ No newline at end of file
+    return svc.build_all_user_cards(workers=workers)
+
+
+# ---------- 렌더링 워커 (프로세스 풀) ----------
+_worker_service = None   # 워커 프로세스의 UserCardService (_init_card_worker에서 한 번 생성)
+
+
+def _write_card_safely(svc: UserCardService, stats: dict, card_hash: str | None = None):
+    """반환: (nickname, 에러 문자열 또는 None, {fmt: 쓴 바이트 수})"""
+    try:
+        encoded = svc.write_user_card(stats, card_hash)
+        return stats["nickname"], None, {fmt: len(data) for fmt, data in encoded.items()}
+    except Exception as e:
+        return stats["nickname"], str(e), {}
+
+
+def _init_card_worker(service_kwargs: dict):
+    """워커 시작 시 한 번: 같은 설정으로 서비스를 만들고 폰트/템플릿 로드"""
+    global _worker_service
+    _worker_service = UserCardService(**service_kwargs)
+    _worker_service.warmup_fonts()
+
+
+def _build_card_in_worker(stats: dict, card_hash: str | None = None):
+    return _write_card_safely(_worker_service, stats, card_hash)
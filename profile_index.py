@@ -0,0 +1,102 @@
+"""
+profile_index: 프로필 이미지 디렉터리 인덱스 (파일명 -> mtime_ns)
+
+- 요청마다 유저별 os.path.exists 대신 dict 조회
+- 디렉터리를 한 번 scandir로 읽어 두고,
+  CHECK_SEC마다 디렉터리 mtime(파일 추가/삭제/이름 변경 시 바뀜)을 보고 바뀌었으면 다시 스캔,
+  같은 이름으로 덮어쓴 경우를 위해 RESCAN_SEC마다는 무조건 다시 스캔
+- app.py / og.py가 get_profile_index(디렉터리)로 같은 인스턴스를 공유
+"""
+import os
+import time
+from threading import Lock
+
+
+PROFILE_INDEX_CHECK_SEC = 2
+PROFILE_INDEX_RESCAN_SEC = 60
+
+
+class ProfileImageIndex:
+    def __init__(self, directory: str, check_sec: float = PROFILE_INDEX_CHECK_SEC,
+                 rescan_sec: float = PROFILE_INDEX_RESCAN_SEC):
+        self.DIRECTORY = directory
+        self.CHECK_SEC = check_sec
+        self.RESCAN_SEC = rescan_sec
+        self._entries = {}          # 파일명 -> mtime_ns (스캔마다 통째로 교체, 읽기는 락 없이)
+        self._dir_mtime_ns = None
+        self._checked_at = 0.0
+        self._scanned_at = 0.0
+        self._lock = Lock()
+        self.refresh(force=True)
+
+    def refresh(self, force: bool = False):
+        """주기가 됐으면 디렉터리 변경을 확인하고 필요하면 다시 스캔 (force=True면 바로 스캔)"""
+        now = time.monotonic()
+        if not force and now - self._checked_at < self.CHECK_SEC:
+            return
+        with self._lock:
+            if not force and now - self._checked_at < self.CHECK_SEC:
+                return
+            self._checked_at = now
+            try:
+                dir_mtime_ns = os.stat(self.DIRECTORY).st_mtime_ns
+            except OSError:
+                dir_mtime_ns = None
+            if (force or dir_mtime_ns != self._dir_mtime_ns
+                    or now - self._scanned_at >= self.RESCAN_SEC):
+                self._entries = self._scan()
+                self._dir_mtime_ns = dir_mtime_ns
+                self._scanned_at = now
+
+    def _scan(self) -> dict:
+        entries = {}
+        try:
+            with os.scandir(self.DIRECTORY) as it:
+                for entry in it:
+                    try:
+                        if entry.is_file():
+                            entries[entry.name] = entry.stat().st_mtime_ns
+                    except OSError:
+                        pass
+        except OSError as e:
+            print(f"[WARN] 프로필 디렉터리 스캔 실패 ({self.DIRECTORY}): {e}")
+        return entries
+
+    def mtime_ns(self, filename: str) -> int | None:
+        """파일이 있으면 mtime_ns, 없으면 None"""
+        self.refresh()
+        return self._entries.get(filename)
+
+    def resolve(self, filename: str, default_filename: str) -> tuple:
+        """(있는 파일명, mtime_ns). 없으면 기본 이미지 (기본 이미지도 없으면 mtime_ns=None)"""
+        self.refresh()
+        entries = self._entries
+        mtime_ns = entries.get(filename)
+        if mtime_ns is None:
+            return default_filename, entries.get(default_filename)
+        return filename, mtime_ns
+
+
+_indexes = {}
+_indexes_lock = Lock()
+
+
+def _reset_after_fork():
+    """fork된 자식(og.py 렌더링 워커): 부모 스레드가 잡고 있던 락을 물려받지 않도록 인덱스를 새로 만듦"""
+    global _indexes, _indexes_lock
+    _indexes = {}
+    _indexes_lock = Lock()
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_reset_after_fork)
+
+
+def get_profile_index(directory: str) -> ProfileImageIndex:
+    """디렉터리당 하나의 인덱스 (프로세스 전역 공유)"""
+    key = os.path.abspath(directory)
+    with _indexes_lock:
+        index = _indexes.get(key)
+        if index is None:
+            index = _indexes[key] = ProfileImageIndex(directory)
+        return index
@@ -0,0 +1,131 @@
+"""
+증분 평가(evaluate_incremental)와 전체 재평가가 같은 (규칙, 유저, 달성일)을 내는지:
+같은 합성 facts를 run_rules처럼 날마다(가끔 하루 두 번/며칠 건너뛰고) 워터마크 이후만 읽어 평가.
+진행도도 저장된 state에서 이어 계산한 값이 전체 기간 계산과 같은지
+"""
+import random
+from collections import defaultdict
+from datetime import date, datetime, timedelta
+
+import pytest
+
+import achievement_engine as ae
+
+START = date(2025, 5, 1)
+N_DAYS = 200
+N_USERS = 24
+
+
+def synthetic_rows(seed):
+    """load_rows 형태의 (attendance_rows, music_rows, users)"""
+    rnd = random.Random(seed)
+    titles = [f"song{i}" for i in range(rnd.randint(8, 40))]
+    users = [(uid, ae.CAPTAIN_NICKNAME if uid == 3 else f"user{uid}") for uid in range(N_USERS)]
+    keen = [rnd.random() for _ in range(N_USERS)]
+    att, music = [], []
+    for n in range(N_DAYS):
+        d = START + timedelta(days=n)
+        busy = rnd.random()
+        for uid in range(N_USERS):
+            if rnd.random() >= keen[uid] * busy * 1.5:
+                continue
+            att.append((uid, d, rnd.choice([300, 1800, 3300, 3600, 5000])))
+            base = datetime(d.year, d.month, d.day, 20)
+            seq = titles[:6] if rnd.random() < 0.3 else rnd.choices(titles, k=rnd.randint(0, 9))
+            music += [(uid, d, base + timedelta(minutes=4 * i, seconds=uid), t) for i, t in enumerate(seq)]
+    music.sort(key=lambda r: (r[2], r[0]))
+    return att, music, users
+
+
+class RowsByDay:
+    """DB 대신: since(포함) ~ through(포함) 날짜 행만 돌려줌 (load_rows(since)와 같은 모양)"""
+
+    def __init__(self, rows):
+        attendance_rows, music_rows, self.users = rows
+        self.att, self.music = defaultdict(list), defaultdict(list)
+        for r in attendance_rows:
+            self.att[r[1]].append(r)
+        for r in music_rows:
+            self.music[r[1]].append(r)
+
+    def load(self, since, through):
+        since = since or START
+        days = [since + timedelta(days=i) for i in range((through - since).days + 1)]
+        return ([r for d in days for r in self.att[d]], [r for d in days for r in self.music[d]], self.users)
+
+
+def full_rescan(rule, rows, today):
+    awards, _ = ae.evaluate_incremental(rule.fn, rows, set(), today - timedelta(days=1), **rule.kwargs)
+    return {(rule.name, uid, day) for uid, day in awards.items()}
+
+
+def day_by_day(rule, source, schedule):
+    """
+    schedule의 날마다 run_rules 한 번: closed_through = 오늘 - 1, 워터마크 다음날부터 오늘까지 적재,
+    이미 지급된 유저(DB)는 already, 새로 나온 유저만 지급
+    """
+    granted, entry = {}, None
+    for today in schedule:
+        watermark = date.fromisoformat(entry["watermark"]) if entry else None
+        rows = source.load(watermark and watermark + timedelta(days=1), today)
+        awards, entry = ae.evaluate_incremental(
+            rule.fn, rows, set(granted), today - timedelta(days=1), entry, **rule.kwargs)
+        for uid, day in awards.items():
+            granted.setdefault(uid, day)
+    return {(rule.name, uid, day) for uid, day in granted.items()}
+
+
+@pytest.mark.parametrize("seed", [0, 1, 2])
+def test_incremental_matches_full_rescan(seed):
+    rows = synthetic_rows(seed)
+    source = RowsByDay(rows)
+    rnd = random.Random(seed)
+    days = [START + timedelta(days=n) for n in range(N_DAYS)]
+    # 매일 / 가끔 하루 두 번 / 가끔 며칠 건너뜀. 마지막 실행일은 데이터 마지막 날(오늘)
+    schedule = [d for d in days[:-1] for _ in range(rnd.choice([0, 1, 1, 1, 2]))] + [days[-1]]
+    today = days[-1]
+
+    expected, got = set(), set()
+    for rule in ae.RULES:
+        expected |= full_rescan(rule, rows, today)
+        got |= day_by_day(rule, source, schedule)
+    assert got == expected
+    # 규칙 대부분이 실제로 뭔가를 지급하는 데이터인지
+    assert len({name for name, _, _ in expected}) >= 8
+
+
+def test_open_day_is_reevaluated_not_committed():
+    """오늘(열린 날) 분은 평가만 하고 state/워터마크는 closed_through(어제)까지만 전진"""
+    rule = ae.RULES_BY_NAME["ChillGuy"]
+    att = [(1, START + timedelta(days=n), 60) for n in range(7)]
+    rows = (att, [], [])
+    today = START + timedelta(days=6)
+
+    awards, entry = ae.evaluate_incremental(rule.fn, rows, set(), today - timedelta(days=1))
+    assert awards == {1: today}                          # 7번째 날(오늘)에 달성
+    assert entry["watermark"] == (today - timedelta(days=1)).isoformat()
+    assert entry["state"]["runs"]["1"] == [(today - timedelta(days=1)).isoformat(), 6]
+
+    # 다음 날 실행: 어제였던 today가 닫히며 state에 반영, 이미 지급된 유저는 다시 나오지 않음
+    again, entry = ae.evaluate_incremental(rule.fn, ([att[-1]], [], []), {1}, today, entry)
+    assert again == {} and entry["state"]["runs"]["1"] == [today.isoformat(), 7]
+
+
+@pytest.mark.parametrize("watermark_day", [10, 120, N_DAYS - 2])
+def test_progress_from_saved_state_matches_full_history(watermark_day):
+    """진행도: 저장된 state + 워터마크 이후 행만으로 계산해도 전체 기간으로 계산한 것과 같음"""
+    rows = synthetic_rows(3)
+    source = RowsByDay(rows)
+    rules = [rule for rule in ae.RULES if rule.progress]
+    last = START + timedelta(days=N_DAYS - 1)
+    watermark = START + timedelta(days=watermark_day)
+    entries = {
+        rule.name: ae.evaluate_incremental(rule.fn, source.load(None, watermark), set(), watermark, **rule.kwargs)[1]
+        for rule in rules
+    }
+
+    for today in (last, last + timedelta(days=3)):   # 3일 뒤에는 연속 출석이 끊긴 것으로
+        full = ae.compute_progress(rows, today, rules=rules)
+        assert ae.compute_progress(source.load(watermark + timedelta(days=1), last), today, entries, rules) == full
+        assert set(full) == {uid for uid, _ in rows[2]}
+    assert any(p["ChillGuy"]["current"] for p in ae.compute_progress(rows, last, rules=rules).values())
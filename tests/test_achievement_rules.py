@@ -0,0 +1,305 @@
+"""
+도전과제 규칙별 달성 조건/달성일: 작은 합성 facts로 규칙 하나씩 확인
+"""
+import random
+from datetime import date, datetime, timedelta
+
+import pytest
+
+import achievement_engine as ae
+
+D0 = date(2025, 6, 2)
+
+
+def day(n):
+    return D0 + timedelta(days=n)
+
+
+def attend(uids, n, sec=3600):
+    return [(uid, day(n), sec) for uid in uids]
+
+
+def play(uid, n, titles):
+    start = datetime.combine(day(n), datetime.min.time()).replace(hour=20)
+    return [(uid, day(n), start + timedelta(minutes=4 * i), title) for i, title in enumerate(titles)]
+
+
+def make_facts(att=(), music=(), users=()):
+    # load_input처럼 played_at 오름차순
+    return ae.AchievementFacts(list(att), sorted(music, key=lambda r: (r[2], r[0])), list(users))
+
+
+def run(fn, facts, already=(), state=None, **kw):
+    return fn(facts, set(already), state=state, **kw)
+
+
+def test_inssa_awards_everyone_on_first_day_with_ten():
+    att = attend(range(1, 10), 0) + attend(range(1, 11), 1) + attend(range(1, 12), 2) + attend(range(20, 31), -1)
+    awards = run(ae.rule_inssa, make_facts(att), already={3}, start_day=day(0))
+    assert awards == {**{uid: day(1) for uid in range(1, 11) if uid != 3}, 11: day(2)}
+
+
+def test_over_immersed_needs_exactly_two():
+    att = attend([1, 2, 3], 0) + attend([1, 2], 1) + attend([2, 3], 2)
+    assert run(ae.rule_over_immersed, make_facts(att), start_day=day(0)) == {1: day(1), 2: day(1), 3: day(2)}
+
+
+def test_captain_skips_days_with_captain():
+    users = [(1, ae.CAPTAIN_NICKNAME), (2, "b"), (3, "c")]
+    att = attend([1, 2], 0) + attend([2, 3], 1) + attend([1, 3], 2)
+    assert run(ae.rule_captain, make_facts(att, users=users), start_day=day(0)) == {2: day(1), 3: day(1)}
+
+
+def test_chill_guy_seventh_consecutive_day():
+    att = ([r for n in range(7) for r in attend([1], n)]
+           + [r for n in [*range(6), *range(7, 14)] for r in attend([2], n)]
+           + [r for n in range(6) for r in attend([3], n)])
+    assert run(ae.rule_chill_guy, make_facts(att)) == {1: day(6), 2: day(13)}
+
+
+def test_favorite_song_earliest_thirtieth_day_across_titles():
+    # "a"는 먼저(이틀에 한 번) 틀기 시작했지만 "b"(매일)가 먼저 30일을 채움
+    # 제목 순/처음 튼 순이 아니라 30번째 날이 가장 이른 곡 기준 → b의 30번째 날 day(30)
+    music = [r for n in range(0, 60, 2) for r in play(1, n, ["a"])]
+    music += [r for n in range(1, 40) for r in play(1, n, ["b", "b"])]   # 하루 여러 번은 1회
+    music += [r for n in range(29) for r in play(2, n, ["c"])]
+    facts = make_facts(music=music)
+    assert facts.title_days[1]["a"][-1] == day(58)
+    assert run(ae.rule_favorite_song, facts) == {1: day(30)}
+
+
+def test_favorite_song_carries_title_days_in_state():
+    music = [r for n in range(40) for r in play(1, n, ["a"])]
+    state = {}
+    assert run(ae.rule_favorite_song, make_facts(music=music[:20]), state=state) == {}
+    assert state["title_days"] == {"1": {"a": 20}}
+    assert run(ae.rule_favorite_song, make_facts(music=music[20:]), state=state) == {1: day(29)}
+    # 이미 30을 넘긴 뒤에는 다시 주지 않음
+    assert run(ae.rule_favorite_song, make_facts(music=play(1, 50, ["a"])), state=state) == {}
+
+
+def test_39_thirty_ninth_distinct_title():
+    music = [r for n in range(45) for r in play(1, n, [f"t{n}", "t0"])]
+    assert run(ae.rule_39, make_facts(music=music)) == {1: day(38)}
+
+
+def test_finetuning_thirty_attendance_days_average():
+    att = [r for n in range(0, 60, 2) for r in attend([1], n, sec=55 * 60)]   # 출석일 기준(날짜 연속 아님)
+    att += [r for n in range(29) for r in attend([2], n, sec=90 * 60)]        # 29일뿐
+    att += [r for n in range(40) for r in attend([3], n, sec=54 * 60)]
+    att += [r for n in range(31) for r in attend([4], n, sec=(50 if n == 0 else 55) * 60)]
+    assert run(ae.rule_finetuning, make_facts(att)) == {1: day(58), 4: day(30)}
+
+
+def test_edge_of_tomorrow_three_consecutive_days_same_five():
+    five = ["s1", "s2", "s3", "s4", "s5"]
+    music = play(1, 0, ["x"] + five) + play(1, 1, five + ["y"]) + play(1, 2, ["z", "w"] + five)
+    music += play(2, 0, five) + play(2, 1, five) + play(2, 3, five)            # 하루 빔
+    music += play(3, 0, five) + play(3, 1, five) + play(3, 2, five[::-1])      # 순서 다름
+    music += play(4, 0, five) + play(4, 1, five) + play(4, 2, five[:4] + ["q", "s5"])
+    assert run(ae.rule_edge_of_tomorrow, make_facts(music=music)) == {1: day(2)}
+
+
+def test_dowon_pledge_three_from_previous_play_day():
+    music = play(1, 0, ["a", "b", "c", "d"])
+    music += play(2, 2, ["x", "b", "c", "d"])     # 직전 재생일(day 0)의 b-c-d
+    music += play(3, 2, ["a", "b", "x", "c"])     # 연속 아님
+    music += play(4, 3, ["b", "c"]) + play(5, 3, ["b", "c", "d"])   # day 3의 직전 재생일은 day 2
+    assert run(ae.rule_dowon_pledge, make_facts(music=music)) == {2: day(2), 5: day(3)}
+
+
+def _crowd_days(sizes, uid=1):
+    """n번째 날 참석 인원이 sizes[n]명 (uid 포함)"""
+    return [r for n, size in enumerate(sizes) for r in attend([uid, *range(100, 100 + size - 1)], n)]
+
+
+def test_myway_sixth_new_headcount_day():
+    # 인원 수: 3, 4, 3(중복), 2(범위 밖), 5, 10(범위 밖), 6, 7, 8(6번째 새 인원 수), 9(7번째)
+    sizes = [3, 4, 3, 2, 5, 10, 6, 7, 8, 9]
+    assert run(ae.rule_myway, make_facts(_crowd_days(sizes)))[1] == day(8)
+
+
+def test_myway_across_state_keeps_sixth_day():
+    sizes = [3, 4, 5, 6, 7, 8, 9]
+    att = _crowd_days(sizes)
+    state = {}
+    first = make_facts([r for r in att if r[1] <= day(3)])
+    assert run(ae.rule_myway, first, state=state).get(1) is None
+    assert state["seen"]["1"] == [[3, 4, 5, 6], day(3).isoformat()]
+    rest = make_facts([r for r in att if r[1] > day(3)])
+    assert run(ae.rule_myway, rest, state=state)[1] == day(5)
+
+
+def test_team_project_six_attendees_six_players():
+    att = attend(range(1, 7), 0) + attend(range(1, 7), 1) + attend(range(1, 6), 2)
+    music = [r for uid in range(1, 7) for r in play(uid, 0, ["a"] if uid == 6 else ["a", "b"])]
+    music += [r for uid in range(1, 7) for r in play(uid, 1, ["a", "b"])]
+    music += [r for uid in range(1, 7) for r in play(uid, 2, ["a", "b"])]
+    awards = run(ae.rule_team_project, make_facts(att, music), start_day=day(0))
+    assert awards == {uid: day(1) for uid in range(1, 7)}
+
+
+@pytest.mark.parametrize("split", [None, date(2025, 10, 5)])
+def test_chuseok_sixth_day_in_range(split):
+    start, end = ae.CHUSEOK_2025
+    days = [start - timedelta(days=1)] + [start + timedelta(days=i) for i in (0, 1, 3, 4, 6, 8, 9)]
+    att = [(1, d, 60) for d in days] + [(2, start + timedelta(days=i), 60) for i in range(5)]
+    if split is None:
+        awards = run(ae.rule_chuseok_2025, make_facts(att))
+    else:
+        state = {}
+        run(ae.rule_chuseok_2025, make_facts([r for r in att if r[1] <= split]), state=state)
+        awards = run(ae.rule_chuseok_2025, make_facts([r for r in att if r[1] > split]), state=state)
+    assert awards == {1: start + timedelta(days=8)}   # 범위 안 6번째 출석일
+
+
+def test_potato_server_specific_dates():
+    target = ae.POTATO_SERVER_DATES[0]
+    att = [(1, target, 60), (2, target - timedelta(days=1), 60), (3, target, 60)]
+    assert run(ae.rule_potato_server, make_facts(att), already={3}) == {1: target}
+
+
+# ---------------------------------------------------------------------------
+# consecutive_day_streaks (N일 연속 공용)
+# ---------------------------------------------------------------------------
+
+def test_streaks_empty_input():
+    runs = {}
+    assert ae.consecutive_day_streaks({}, 3, runs) == {}
+    assert ae.consecutive_day_streaks({1: []}, 3, runs) == {}
+    assert runs == {}
+
+
+def test_streaks_single_day():
+    runs = {}
+    assert ae.consecutive_day_streaks({1: [day(0)]}, 1, runs) == {1: day(0)}
+    assert runs == {"1": [day(0).isoformat(), 1]}
+    assert ae.consecutive_day_streaks({1: [day(0)]}, 2) == {}
+
+
+def test_streaks_gaps_reset_and_first_hit_wins():
+    days = {
+        1: [day(n) for n in (0, 1, 3, 4, 5, 7, 8, 9, 10)],   # 3연속은 day 5, 4연속은 day 10
+        2: [day(n) for n in (0, 2, 4, 6)],
+        3: [day(n) for n in (11, 12)],                        # 유저 1의 마지막 날 다음날부터지만 다른 유저
+    }
+    runs = {}
+    assert ae.consecutive_day_streaks(days, 3, runs) == {1: day(5)}
+    assert runs == {"1": [day(10).isoformat(), 4], "2": [day(6).isoformat(), 1], "3": [day(12).isoformat(), 2]}
+    assert ae.consecutive_day_streaks(days, 4) == {1: day(10)}
+
+
+def test_streaks_duplicate_days_count_once():
+    days = {1: [day(0), day(0), day(1), day(1), day(1), day(2)], 2: [day(0), day(0)]}
+    runs = {}
+    assert ae.consecutive_day_streaks(days, 3, runs) == {1: day(2)}
+    assert runs == {"1": [day(2).isoformat(), 3], "2": [day(0).isoformat(), 1]}
+    assert ae.consecutive_day_streaks(days, 4) == {}
+
+
+def test_streaks_carry_only_from_previous_day():
+    runs = {"1": [day(4).isoformat(), 5], "2": [day(3).isoformat(), 6]}
+    assert ae.consecutive_day_streaks({1: [day(5), day(6)], 2: [day(5)]}, 7, runs) == {1: day(6)}
+    assert runs == {"1": [day(6).isoformat(), 7], "2": [day(5).isoformat(), 1]}
+
+
+# ---------------------------------------------------------------------------
+# SequenceIndex (곡 순서 규칙): 롤링 해시 매칭 vs 튜플 집합 단순 구현
+# ---------------------------------------------------------------------------
+
+def _windows(titles, k):
+    return {tuple(titles[i:i + k]) for i in range(len(titles) - k + 1)}
+
+
+def naive_edge_of_tomorrow(facts):
+    k, awards = ae.EDGE_OF_TOMORROW_K, {}
+    for uid, daily in facts.music_by_user_day.items():
+        days = sorted(daily)
+        for d1, d2, d3 in zip(days, days[1:], days[2:]):
+            if (d3 - d1).days == 2 and _windows(daily[d1], k) & _windows(daily[d2], k) & _windows(daily[d3], k):
+                awards[uid] = d3
+                break
+    return awards
+
+
+def naive_dowon_pledge(facts):
+    k, awards = ae.DOWON_PLEDGE_K, {}
+    for prev_day, curr_day in zip(facts.music_days, facts.music_days[1:]):
+        prev = set().union(*(_windows(t, k) for t in facts.music_by_day_user[prev_day].values()))
+        for uid, titles in sorted(facts.music_by_day_user[curr_day].items()):
+            if uid not in awards and _windows(titles, k) & prev:
+                awards[uid] = curr_day
+    return awards
+
+
+def random_music(seed, alphabet):
+    """유저마다 자주 트는 6곡 루틴(가끔 한 곡 바뀜) 앞뒤로 무작위 곡 → 두 규칙 모두 달성/미달성이 섞임"""
+    rnd = random.Random(seed)
+    titles = [f"t{i}" for i in range(alphabet)]
+    routines = {uid: rnd.choices(titles, k=6) for uid in range(1, 5)}
+
+    def today(uid):
+        if rnd.random() < 0.4:
+            return rnd.choices(titles, k=rnd.randint(0, 9))
+        seq = list(routines[uid])
+        if rnd.random() < 0.5:
+            seq[rnd.randrange(6)] = rnd.choice(titles + ["x"])
+        return rnd.choices(titles, k=rnd.randint(0, 2)) + seq + rnd.choices(titles, k=rnd.randint(0, 2))
+
+    return [r for n in range(16) for uid in range(1, 5) if rnd.random() < 0.8 for r in play(uid, n, today(uid))]
+
+
+def _split_eval(fn, music, split):
+    """split(포함)까지 평가 후 state를 넘겨 나머지 평가 (state의 곡 제목이 encode로 다시 인코딩되는 경로)"""
+    state = {}
+    awards = fn(make_facts(music=[r for r in music if r[1] <= split]), set(), state=state)
+    later = fn(make_facts(music=[r for r in music if r[1] > split]), set(awards), state=state)
+    return {**awards, **later}
+
+
+@pytest.fixture(params=[ae.SequenceIndex.MOD, 5], ids=["mod61", "mod5-collisions"])
+def sequence_mod(request, monkeypatch):
+    monkeypatch.setattr(ae.SequenceIndex, "MOD", request.param)
+    return request.param
+
+
+def test_window_hashes_cover_every_window(sequence_mod):
+    rnd = random.Random(7)
+    index = ae.SequenceIndex({})
+    for _ in range(50):
+        seq = index.encode(rnd.choices("abc", k=rnd.randint(0, 12)))
+        for k in (1, 3, 5):
+            hashes = index.window_hashes(seq, k)
+            assert sorted(s for starts in hashes.values() for s in starts) == list(range(max(0, len(seq) - k + 1)))
+            for starts in hashes.values():
+                # 같은 버킷 안에서 same_window가 참이면 실제로 같은 구간 (충돌은 여기서 걸러짐)
+                for a in starts:
+                    for b in starts:
+                        assert ae.SequenceIndex.same_window(seq, a, seq, b, k) == (seq[a:a + k] == seq[b:b + k])
+            if sequence_mod != 5:
+                assert len(hashes) == len(_windows(seq, k))
+
+
+@pytest.mark.parametrize("alphabet", [2, 3, 12])
+@pytest.mark.parametrize("seed", range(6))
+def test_sequence_rules_match_naive(sequence_mod, seed, alphabet):
+    music = random_music(seed, alphabet)
+    facts = make_facts(music=music)
+    edge, dowon = naive_edge_of_tomorrow(facts), naive_dowon_pledge(facts)
+    assert run(ae.rule_edge_of_tomorrow, facts) == edge
+    assert run(ae.rule_dowon_pledge, make_facts(music=music)) == dowon
+
+    # 중간에 끊어 state(곡 제목)로 이어받아도 같음: carried 날짜는 encode(carried[d])로 다시 해시
+    for split in (day(0), day(1), day(7), day(14)):
+        assert _split_eval(ae.rule_edge_of_tomorrow, music, split) == edge
+        assert _split_eval(ae.rule_dowon_pledge, music, split) == dowon
+
+
+def test_edge_of_tomorrow_carried_days_reencoded():
+    five = ["s1", "s2", "s3", "s4", "s5"]
+    state = {}
+    # 앞 두 날은 이전 실행에서 본 날 → state["tail"]로만 남음, 셋째 날만 새 facts
+    assert run(ae.rule_edge_of_tomorrow, make_facts(music=play(1, 0, five) + play(1, 1, ["x"] + five)),
+               state=state) == {}
+    assert [d for d, _ in state["tail"]["1"]] == [day(0).isoformat(), day(1).isoformat()]
+    assert run(ae.rule_edge_of_tomorrow, make_facts(music=play(1, 2, five + ["y"])), state=state) == {1: day(2)}
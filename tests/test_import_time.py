@@ -0,0 +1,53 @@
+"""
+app.py 임포트 시간 예산: 분석/렌더링 모듈(numpy, pandas, PIL)은 처음 쓸 때만 로드되어야 함
+(python -X importtime 결과의 app 누적 시간으로 확인)
+"""
+import json
+import os
+import subprocess
+import sys
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# app 누적 임포트 시간 예산 (Flask/pymysql 포함, 느린 CI 여유분 포함)
+APP_IMPORT_BUDGET_US = 1_500_000
+HEAVY_MODULES = ("numpy", "pandas", "PIL")
+
+
+def _import_app(tmp_path):
+    # app.py는 작업 디렉터리의 web_config.json을 읽음 → 임시 디렉터리에 최소 설정
+    profiles = tmp_path / "profiles"
+    profiles.mkdir()
+    (tmp_path / "web_config.json").write_text(json.dumps({
+        "db": {},
+        "profile_img_dir": str(profiles),
+        "profile_font_dir": str(tmp_path),
+        "og_cache_dir": str(tmp_path / "og_cache"),
+        "thumb_dir": str(tmp_path / "thumb_cache"),
+    }), encoding="utf-8")
+    code = (
+        f"import sys; sys.path.insert(0, {REPO_DIR!r}); import app; "
+        f"print('heavy=' + ','.join(m for m in {HEAVY_MODULES!r} if m in sys.modules))"
+    )
+    return subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        cwd=tmp_path, capture_output=True, text=True, timeout=120,
+    )
+
+
+def test_app_import_skips_heavy_modules_and_fits_budget(tmp_path):
+    proc = _import_app(tmp_path)
+    assert proc.returncode == 0, proc.stderr[-2000:]
+
+    # 기동 로그(예: DB 없이 user_stats 준비 실패)는 무시하고 마지막 줄만 확인
+    heavy = proc.stdout.strip().splitlines()[-1]
+    assert heavy == "heavy=", f"eagerly imported: {heavy}"
+
+    # 형식: "import time: self [us] | cumulative | imported package"
+    app_cumulative = None
+    for line in proc.stderr.splitlines():
+        parts = [p.strip() for p in line.split("|")]
+        if len(parts) == 3 and parts[2] == "app":
+            app_cumulative = int(parts[1])
+    assert app_cumulative is not None
+    assert app_cumulative < APP_IMPORT_BUDGET_US, f"app import took {app_cumulative} us"
@@ -0,0 +1,217 @@
+"""
+OG 카드 출력 포맷: 캐시 크기 리포트, 포맷별 캐시 용량 감소(레이아웃 동일), 옛 캐시 정리, Accept 협상,
+전체 생성 프로세스 풀(워커 수 결정, 워커 크래시는 카드별 에러)
+"""
+import datetime
+import multiprocessing
+import os
+import time
+
+import pytest
+
+PIL = pytest.importorskip("PIL")
+from PIL import Image, ImageChops, ImageFilter, ImageStat  # noqa: E402
+
+import og  # noqa: E402
+
+N_USERS = 6
+
+
+@pytest.fixture
+def profiles(tmp_path):
+    """사진 같은 아바타(노이즈 + 블러 + 그라데이션)를 가진 유저 통계"""
+    profile_dir = tmp_path / "profiles"
+    profile_dir.mkdir()
+    stats = []
+    for i in range(N_USERS):
+        nickname = f"user{i}"
+        noise = Image.effect_noise((600, 600), 50).filter(ImageFilter.GaussianBlur(2))
+        grad = Image.linear_gradient("L").resize((600, 600)).rotate(i * 30)
+        Image.merge("RGB", (noise, grad, grad.transpose(Image.Transpose.FLIP_LEFT_RIGHT))).save(
+            profile_dir / f"{nickname}.png")
+        stats.append({
+            "nickname": nickname, "comment": "hello world " * (i + 1),
+            "first_attended": datetime.date(2025, 5, 1), "total_count": i * 7,
+            "total_duration_sec": i * 98765, "achv_count": i,
+        })
+    return profile_dir, stats
+
+
+def make_service(tmp_path, profiles, card_formats, cache_name="og_cache"):
+    profile_dir, stats = profiles
+    svc = og.UserCardService(
+        db_config={}, profile_img_dir=str(profile_dir), profile_default_filename="default.png",
+        font_path_bold=str(tmp_path / "missing-bold.ttf"), font_path_reg=str(tmp_path / "missing-reg.ttf"),
+        cache_dir=str(tmp_path / cache_name), card_formats=card_formats,
+    )
+    svc.fetch_all_user_stats = lambda nicknames=None: stats
+    return svc
+
+
+def test_default_format_is_lossless_png():
+    assert og.OG_CARD_FORMATS[0] == "png"
+
+
+def test_build_reports_sizes(tmp_path, profiles):
+    svc = make_service(tmp_path, profiles, ("png", "webp"))
+    res = svc.build_all_user_cards(workers=1)
+    assert res["built"] == N_USERS and not res["errors"]
+    assert res["written_bytes"] == res["cache_bytes"]
+    for fmt in ("png", "webp"):
+        assert res["cache_bytes"][fmt] > 0
+        assert res["avg_card_bytes"][fmt] == res["cache_bytes"][fmt] // N_USERS
+
+    again = svc.build_all_user_cards(workers=1)
+    assert again["unchanged"] == N_USERS and again["built"] == 0
+    assert again["written_bytes"] == {"png": 0, "webp": 0}
+    assert again["cache_bytes"] == res["cache_bytes"]
+
+
+@pytest.mark.parametrize("fmt", ["png8", "webp"])
+def test_compact_format_shrinks_cache_without_changing_layout(tmp_path, profiles, fmt):
+    lossless = make_service(tmp_path, profiles, ("png",), "lossless")
+    compact = make_service(tmp_path, profiles, (fmt,), fmt)
+    base_bytes = lossless.build_all_user_cards(workers=1)["cache_bytes"]["png"]
+    compact_bytes = compact.build_all_user_cards(workers=1)["cache_bytes"][fmt]
+    assert compact_bytes < base_bytes * 0.6
+
+    for _, stats in zip(range(2), profiles[1]):
+        ref = Image.open(lossless._cached_path(stats["nickname"], "png")).convert("RGB")
+        img = Image.open(compact._cached_path(stats["nickname"], fmt)).convert("RGB")
+        assert img.size == ref.size == (1200, 630)
+        # 같은 레이아웃이면 픽셀 차이는 양자화/압축 노이즈 수준
+        mean_diff = sum(ImageStat.Stat(ImageChops.difference(ref, img)).mean) / 3
+        assert mean_diff < 8
+
+
+def test_build_prunes_formats_removed_from_config(tmp_path, profiles):
+    make_service(tmp_path, profiles, ("png", "webp")).build_all_user_cards(workers=1)
+    svc = make_service(tmp_path, profiles, ("png",))
+    res = svc.build_all_user_cards(workers=1)
+    assert res["pruned"] == N_USERS * 2   # .webp + .webp.hash
+    assert os.listdir(os.path.join(svc.CACHE_DIR, "webp")) == []
+    assert len([n for n in os.listdir(os.path.join(svc.CACHE_DIR, "png")) if n.endswith(".png")]) == N_USERS
+
+
+def test_prune_removes_flat_layout_and_keeps_cards_newer_than_build(tmp_path, profiles):
+    svc = make_service(tmp_path, profiles, ("png",))
+    legacy = [os.path.join(svc.CACHE_DIR, n) for n in ("user1.png", "user1.png.hash", "user1.8.png")]
+    for path in legacy:   # 포맷별 디렉터리 이전 위치
+        with open(path, "wb") as f:
+            f.write(b"old")
+        os.utime(path, (1, 1))
+    newcomer = os.path.join(svc.CACHE_DIR, "png", "newcomer.png")   # 생성 도중 요청 경로에서 만든 카드
+    with open(newcomer, "wb") as f:
+        f.write(b"new")
+    os.utime(newcomer, (time.time() + 60, time.time() + 60))
+
+    res = svc.build_all_user_cards(workers=1)
+    assert res["pruned"] == len(legacy)
+    assert not any(os.path.exists(path) for path in legacy)
+    assert os.path.exists(newcomer)
+    assert svc.prune_cache([s["nickname"] for s in profiles[1]]) == 1   # older_than 없으면 삭제
+
+
+def test_nickname_suffix_does_not_collide_across_formats(tmp_path, profiles):
+    profile_dir, stats = profiles
+    twin = {**stats[1], "nickname": "user1.8", "comment": "different card"}
+    svc = make_service(tmp_path, (profile_dir, [stats[1], twin]), ("png", "png8"))
+    res = svc.build_all_user_cards(workers=1)
+    assert res["built"] == 2
+    paths = {svc._cached_path(n, fmt) for n in ("user1", "user1.8") for fmt in ("png", "png8")}
+    assert len(paths) == 4 and all(os.path.exists(p) for p in paths)
+    for s in (stats[1], twin):
+        assert svc.card_is_current(s["nickname"], svc.card_input_hash(s))
+
+
+def test_route_negotiates_format(tmp_path, profiles):
+    flask = pytest.importorskip("flask")
+    svc = make_service(tmp_path, profiles, ("png", "webp"))
+    svc.fetch_user_stats = lambda nickname: next((s for s in profiles[1] if s["nickname"] == nickname), None)
+    app = flask.Flask(__name__)
+    app.register_blueprint(svc.bp)
+    client = app.test_client()
+
+    crawler = client.get("/og/u/user1.png")
+    assert crawler.status_code == 200 and crawler.mimetype == "image/png"
+    assert not os.path.exists(svc._cached_path("user1", "webp"))   # on-demand은 요청 포맷만 인코딩
+
+    browser = client.get("/og/u/user1.png", headers={"Accept": "image/webp,*/*"})
+    assert browser.mimetype == "image/webp" and "Accept" in browser.headers["Vary"]
+    assert client.get("/og/u/user1.png", headers={"If-None-Match": crawler.headers["ETag"]}).status_code == 304
+
+
+needs_fork = pytest.mark.skipif("fork" not in multiprocessing.get_all_start_methods(), reason="fork 필요")
+
+
+def test_single_cpu_builds_serially(tmp_path, profiles, monkeypatch):
+    monkeypatch.setattr(og, "usable_cpu_count", lambda: 1)
+    res = make_service(tmp_path, profiles, ("png",)).build_all_user_cards(workers=4)
+    assert res["workers"] == 1 and res["built"] == N_USERS
+
+
+@needs_fork
+def test_pool_build_matches_serial(tmp_path, profiles, monkeypatch):
+    serial = make_service(tmp_path, profiles, ("png",), "serial")
+    serial.build_all_user_cards(workers=1)
+
+    monkeypatch.setattr(og, "usable_cpu_count", lambda: 2)
+    monkeypatch.setattr(og, "OG_BUILD_CARDS_PER_WORKER", 1)
+    pooled = make_service(tmp_path, profiles, ("png",), "pooled")
+    res = pooled.build_all_user_cards()
+    assert res["workers"] == 2 and res["built"] == N_USERS and not res["errors"]
+    for stats in profiles[1]:
+        with open(serial._cached_path(stats["nickname"]), "rb") as a, open(pooled._cached_path(stats["nickname"]), "rb") as b:
+            assert a.read() == b.read()
+
+
+@needs_fork
+def test_worker_crash_fails_only_that_card(tmp_path, profiles, monkeypatch):
+    monkeypatch.setattr(og, "usable_cpu_count", lambda: 2)
+    monkeypatch.setattr(og, "OG_BUILD_CARDS_PER_WORKER", 1)
+    render = og.UserCardService.render_user_card_image
+
+    def crashing_render(self, stats):
+        if stats["nickname"] == "user2":
+            os._exit(1)   # 워커 프로세스가 통째로 죽는 경우 (예: 네이티브 크래시)
+        return render(self, stats)
+
+    monkeypatch.setattr(og.UserCardService, "render_user_card_image", crashing_render)
+    svc = make_service(tmp_path, profiles, ("png",))
+    res = svc.build_all_user_cards()
+    assert res["built"] == N_USERS - 1
+    assert [nickname for nickname, _ in res["errors"]] == ["user2"]
+    assert "crashed" in res["errors"][0][1]
+    assert not os.path.exists(svc._cached_path("user2"))
+
+
+def test_sidecar_hash_not_trusted_when_data_changed(tmp_path, profiles):
+    svc = make_service(tmp_path, profiles, ("png",))
+    svc.build_all_user_cards(workers=1)
+    stats = profiles[1][1]
+    card_hash = svc.card_input_hash(stats)
+    assert svc.card_is_current("user1", card_hash)
+
+    # 데이터만 새로 쓰고 사이드카를 쓰기 전에 죽은 경우
+    og._write_atomic(svc._cached_path("user1"), b"half-finished rebuild")
+    assert not svc.card_is_current("user1", card_hash)
+    res = svc.build_all_user_cards(workers=1)
+    assert res["built"] == 1 and res["unchanged"] == N_USERS - 1
+    assert svc.card_is_current("user1", card_hash)
+
+
+def test_route_builds_when_cached_file_disappears(tmp_path, profiles):
+    flask = pytest.importorskip("flask")
+    svc = make_service(tmp_path, profiles, ("png",))
+    svc.fetch_user_stats = lambda nickname: next((s for s in profiles[1] if s["nickname"] == nickname), None)
+    svc.build_all_user_cards(workers=1)
+    app = flask.Flask(__name__)
+    app.register_blueprint(svc.bp)
+    client = app.test_client()
+
+    etag = client.get("/og/u/user1.png").headers["ETag"]
+    os.remove(svc._cached_path("user1"))   # prune/교체 중 요청
+    resp = client.get("/og/u/user1.png")
+    assert resp.status_code == 200 and resp.mimetype == "image/png"
+    assert resp.headers["ETag"] == etag and os.path.exists(svc._cached_path("user1"))
+    assert client.get("/og/u/nobody.png").status_code == 404
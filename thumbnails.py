@@ -0,0 +1,128 @@
+"""
+thumbnails: 프로필 이미지 리사이즈 변형 캐시
+
+- 원본(profile_img_dir/<파일명>)을 변형별로 줄여 thumb_dir/<변형>/<파일명>에 저장
+- 변형 파일 mtime(ns)을 원본 mtime으로 맞춰 두고, 다르면(원본 교체) 다시 만듦
+- app.py: API 목록 응답의 프로필 URL(/thumbs/<변형>/<파일명>)
+- og.py: 카드 왼쪽 배너(512x630 크롭)
+"""
+import os
+import threading
+from threading import Lock
+
+
+# 변형 이름 -> 크기/방식/저장 옵션
+# - short : 짧은 변을 size로 축소 (비율 유지, 화면의 object-cover 크롭이 원본과 같게 나옴)
+# - fit   : size로 가운데 크롭 + 리사이즈 (ImageOps.fit, og.py 배너와 같은 처리)
+# 원본보다 크게 늘리지는 않음
+THUMB_VARIANTS = {
+    "64":   {"mode": "short", "size": 64,         "save": {"format": "WEBP", "quality": 85}, "ext": ".webp"},
+    "128":  {"mode": "short", "size": 128,        "save": {"format": "WEBP", "quality": 85}, "ext": ".webp"},
+    "256":  {"mode": "short", "size": 256,        "save": {"format": "WEBP", "quality": 85}, "ext": ".webp"},
+    # og.py 카드 배너 (LEFT_IMG_W x H와 맞출 것). 카드에서 다시 인코딩하므로 무손실
+    "card": {"mode": "fit",   "size": (512, 630), "save": {"format": "PNG"},                 "ext": ".png"},
+}
+
+# /thumbs/... 응답 Cache-Control max-age (app.py가 URL에 ?v=<원본 mtime>을 붙이므로 교체되면 URL이 바뀜)
+THUMB_MAX_AGE = 86400
+
+
+def _write_atomic(path: str, data: bytes, mtime_ns: int):
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(data)
+    os.utime(tmp_path, ns=(mtime_ns, mtime_ns))
+    os.replace(tmp_path, path)
+
+
+def resize_profile(src, variant: str):
+    """원본 PIL 이미지를 변형 규칙대로 줄인 이미지 반환"""
+    from PIL import ImageOps, Image
+    spec = THUMB_VARIANTS[variant]
+    if spec["mode"] == "fit":
+        return ImageOps.fit(src.convert("RGB"), spec["size"], centering=(0.5, 0.5))
+    w, h = src.size
+    scale = spec["size"] / min(w, h)
+    if scale >= 1:
+        return src
+    size = (max(1, round(w * scale)), max(1, round(h * scale)))
+    return src.resize(size, Image.LANCZOS, reducing_gap=3.0)
+
+
+class ThumbnailStore:
+    """
+    프로필 이미지 변형을 필요할 때 만들어 디스크에 캐시.
+    path(filename, variant) → 최신 변형 파일 경로 (원본이 없으면 None)
+    같은 변형 동시 요청은 (변형, 파일명)별 락으로 한 번만 생성
+    """
+
+    def __init__(self, source_dir: str, cache_dir: str):
+        self.SOURCE_DIR = source_dir
+        self.CACHE_DIR = cache_dir
+        self._locks = {}
+        self._locks_guard = Lock()
+        for variant in THUMB_VARIANTS:
+            os.makedirs(os.path.join(cache_dir, variant), exist_ok=True)
+
+    def source_path(self, filename: str) -> str | None:
+        """원본 경로 (디렉터리 밖을 가리키는 이름은 None)"""
+        if not filename or os.path.basename(filename) != filename or filename in (".", ".."):
+            return None
+        return os.path.join(self.SOURCE_DIR, filename)
+
+    def variant_path(self, filename: str, variant: str) -> str:
+        return os.path.join(self.CACHE_DIR, variant, filename + THUMB_VARIANTS[variant]["ext"])
+
+    def path(self, filename: str, variant: str, source_mtime_ns: int | None = None) -> str | None:
+        """
+        변형 파일 경로. 없거나 원본 mtime과 다르면 만들어서 반환.
+        source_mtime_ns를 알고 있으면 넘겨서 원본 stat을 생략
+        """
+        if variant not in THUMB_VARIANTS:
+            return None
+        src_path = self.source_path(filename)
+        if src_path is None:
+            return None
+        if source_mtime_ns is None:
+            try:
+                source_mtime_ns = os.stat(src_path).st_mtime_ns
+            except OSError:
+                return None
+
+        out_path = self.variant_path(filename, variant)
+        if self._is_fresh(out_path, source_mtime_ns):
+            return out_path
+        with self._lock(variant, filename):
+            # 기다리는 동안 다른 요청이 만들었으면 그대로 사용
+            if not self._is_fresh(out_path, source_mtime_ns):
+                self._build(src_path, out_path, variant, source_mtime_ns)
+        return out_path
+
+    @staticmethod
+    def _is_fresh(out_path: str, source_mtime_ns: int) -> bool:
+        try:
+            return os.stat(out_path).st_mtime_ns == source_mtime_ns
+        except OSError:
+            return False
+
+    def _build(self, src_path: str, out_path: str, variant: str, source_mtime_ns: int):
+        from io import BytesIO
+        from PIL import Image
+        with Image.open(src_path) as src:
+            img = src
+            if img.mode not in ("RGB", "RGBA"):
+                # 팔레트/그레이 원본은 리샘플링 전에 RGB(A)로
+                img = img.convert("RGBA" if "A" in img.getbands() or "transparency" in img.info else "RGB")
+            img = resize_profile(img, variant)
+            buf = BytesIO()
+            img.save(buf, **THUMB_VARIANTS[variant]["save"])
+        _write_atomic(out_path, buf.getvalue(), source_mtime_ns)
+
+    def _lock(self, variant: str, filename: str) -> Lock:
+        """(변형, 파일명)별 생성 락 (프로필 수만큼만 생기므로 정리하지 않음)"""
+        key = (variant, filename)
+        with self._locks_guard:
+            lock = self._locks.get(key)
+            if lock is None:
+                lock = self._locks[key] = Lock()
+            return lock
@@ -0,0 +1,162 @@
+"""
+OG 카드 렌더링 벤치마크 (재현용)
+
+합성 유저 N명(사진 같은 아바타 + 길이가 다른 소개)을 임시 디렉터리에 만들고
+- 카드별 렌더링/포맷별 인코딩 시간 (평균/p50/p95)
+- 카드별 파이썬 할당 (tracemalloc: 할당 블록 수, 피크 바이트. PIL 픽셀 버퍼는 C 할당이라 제외)
+- 포맷별 카드 크기
+- (--build) build_all_user_cards 전체 생성 처리량 (워커 수별)
+을 출력. DB 없이 돌아감.
+
+    python tools/bench_og.py --users 50 --formats png,webp --font-bold NotoSansKR-Bold.ttf --font-reg NotoSansKR-Regular.ttf
+    python tools/bench_og.py --users 200 --build --workers 1 2 4
+"""
+import os
+import sys
+import time
+import random
+import argparse
+import tempfile
+import tracemalloc
+from datetime import date, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import og  # noqa: E402
+
+
+def make_profiles(profile_dir: str, n_users: int, seed: int) -> list:
+    """유저 통계 목록을 만들고 프로필 이미지(600x600 노이즈 + 블러 + 그라데이션)를 저장"""
+    from PIL import Image, ImageFilter
+    rnd = random.Random(seed)
+    stats = []
+    for i in range(n_users):
+        nickname = f"bench_user{i}"
+        noise = Image.effect_noise((600, 600), 50).filter(ImageFilter.GaussianBlur(2))
+        grad = Image.linear_gradient("L").resize((600, 600)).rotate(rnd.randrange(360))
+        Image.merge("RGB", (noise, grad, grad.transpose(Image.Transpose.FLIP_LEFT_RIGHT))).save(
+            os.path.join(profile_dir, f"{nickname}.png"))
+        stats.append({
+            "nickname": nickname,
+            "comment": "오늘도 저댄 " * rnd.randint(0, 30),
+            "first_attended": date(2025, 5, 1) + timedelta(days=rnd.randint(0, 150)),
+            "total_count": rnd.randint(0, 300),
+            "total_duration_sec": rnd.randint(0, 10 ** 6),
+            "achv_count": rnd.randint(0, 13),
+        })
+    return stats
+
+
+def make_service(work_dir: str, stats: list, args) -> og.UserCardService:
+    svc = og.UserCardService(
+        db_config={},
+        profile_img_dir=os.path.join(work_dir, "profiles"),
+        profile_default_filename="default.png",
+        font_path_bold=args.font_bold,
+        font_path_reg=args.font_reg,
+        cache_dir=os.path.join(work_dir, "og_cache"),
+        card_formats=tuple(args.formats),
+        thumb_dir=os.path.join(work_dir, "thumb_cache") if args.thumbs else None,
+    )
+    svc.fetch_all_user_stats = lambda nicknames=None: stats   # DB 대신 합성 통계
+    return svc
+
+
+def percentile(values: list, p: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(p / 100 * (len(values) - 1))))]
+
+
+def summarize(name: str, seconds: list):
+    ms = [s * 1000 for s in seconds]
+    print(f"  {name:<14} 평균 {sum(ms) / len(ms):7.1f} ms   p50 {percentile(ms, 50):7.1f}   p95 {percentile(ms, 95):7.1f}")
+
+
+def bench_per_card(svc: og.UserCardService, stats: list, formats: list):
+    # 폰트/템플릿/배너 축소 캐시를 채운 뒤부터 측정 (갱신 작업에서 프로필이 그대로인 카드와 같은 조건)
+    svc.warmup_fonts()
+    for s in stats:
+        svc.resolve_profile_image(s["nickname"], variant="card")
+    svc.render_user_card_image(stats[0])
+
+    render, encode, sizes = [], {fmt: [] for fmt in formats}, {fmt: [] for fmt in formats}
+    for s in stats:
+        t0 = time.perf_counter()
+        img = svc.render_user_card_image(s)
+        render.append(time.perf_counter() - t0)
+        for fmt in formats:
+            t0 = time.perf_counter()
+            data = og.encode_card(img, fmt)
+            encode[fmt].append(time.perf_counter() - t0)
+            sizes[fmt].append(len(data))
+
+    # 할당은 시간과 따로 측정 (tracemalloc이 켜져 있으면 느려짐)
+    blocks, peaks = [], []
+    tracemalloc.start()
+    for s in stats:
+        before = tracemalloc.take_snapshot()
+        tracemalloc.reset_peak()
+        base, _ = tracemalloc.get_traced_memory()
+        img = svc.render_user_card_image(s)
+        for fmt in formats:
+            og.encode_card(img, fmt)
+        _, peak = tracemalloc.get_traced_memory()
+        after = tracemalloc.take_snapshot()
+        blocks.append(sum(d.count_diff for d in after.compare_to(before, "filename") if d.count_diff > 0))
+        peaks.append(peak - base)
+        del img
+    tracemalloc.stop()
+
+    print(f"\n[BENCH] 카드 {len(stats)}장, 포맷 {', '.join(formats)}")
+    summarize("render", render)
+    for fmt in formats:
+        summarize(f"encode {fmt}", encode[fmt])
+    total = [r + sum(encode[fmt][i] for fmt in formats) for i, r in enumerate(render)]
+    summarize("card total", total)
+    print(f"  → {len(total) / sum(total):.1f} cards/s (단일 스레드)")
+    print("\n[BENCH] 카드당 크기")
+    for fmt in formats:
+        print(f"  {fmt:<6} 평균 {sum(sizes[fmt]) // len(sizes[fmt]):>8} B")
+    print("\n[BENCH] 카드당 파이썬 할당 (tracemalloc)")
+    print(f"  남은 블록 평균 {sum(blocks) / len(blocks):.0f}개, 피크 평균 {sum(peaks) / len(peaks) / 1024:.1f} KiB, "
+          f"최대 {max(peaks) / 1024:.1f} KiB")
+
+
+def bench_build(work_dir: str, stats: list, args):
+    print(f"\n[BENCH] build_all_user_cards (force, CPU {os.cpu_count()}개)")
+    for workers in args.workers:
+        svc = make_service(work_dir, stats, args)
+        res = svc.build_all_user_cards(workers=workers, force=True)
+        print(f"  workers={workers:<3} 실제 {res['workers']}개  {res['seconds']:7.2f} s  "
+              f"{res['cards_per_sec']} cards/s  errors {len(res['errors'])}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="OG 카드 렌더링 벤치마크 (합성 유저)")
+    parser.add_argument("--users", type=int, default=50, help="합성 유저 수")
+    parser.add_argument("--formats", type=lambda s: s.split(","), default=list(og.OG_CARD_FORMATS),
+                        help=f"인코딩 포맷 (쉼표 구분, {', '.join(og.OG_FORMATS)})")
+    parser.add_argument("--font-bold", default="", help="굵은 폰트 경로 (없으면 PIL 기본 폰트)")
+    parser.add_argument("--font-reg", default="", help="보통 폰트 경로 (없으면 PIL 기본 폰트)")
+    parser.add_argument("--thumbs", action="store_true", help="배너를 thumbnails 캐시에서 읽기 (app.py와 같은 조건)")
+    parser.add_argument("--build", action="store_true", help="전체 생성 처리량도 측정")
+    parser.add_argument("--workers", type=int, nargs="+", default=[1], help="--build 워커 수 (여러 개 가능)")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+
+    unknown = [f for f in args.formats if f not in og.OG_FORMATS]
+    if unknown:
+        parser.error(f"알 수 없는 포맷: {', '.join(unknown)}")
+    if not (os.path.exists(args.font_bold) and os.path.exists(args.font_reg)):
+        print("[WARN] 폰트 파일이 없어 PIL 기본 폰트로 측정합니다 (실제 카드보다 텍스트 렌더링이 가벼움).")
+
+    with tempfile.TemporaryDirectory(prefix="bench_og_") as work_dir:
+        os.makedirs(os.path.join(work_dir, "profiles"))
+        stats = make_profiles(os.path.join(work_dir, "profiles"), args.users, args.seed)
+        bench_per_card(make_service(work_dir, stats, args), stats, args.formats)
+        if args.build:
+            bench_build(work_dir, stats, args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,38 @@
+"""
+ttl_cache: 크기 제한 + TTL LRU 캐시 (app.py 유저 디테일, og.py 카드 통계 공용)
+"""
+import time
+from collections import OrderedDict
+from threading import Lock
+
+
+class TTLLRUCache:
+    """크기 제한 + TTL LRU. 키에 refresh 버전을 넣어 갱신 시 자연스럽게 무효화."""
+    def __init__(self, maxsize: int, ttl_sec: float):
+        self.maxsize = maxsize
+        self.ttl_sec = ttl_sec
+        self._data = OrderedDict()  # key -> (expires_at, value)
+        self._lock = Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at < time.monotonic():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def put(self, key, value):
+        with self._lock:
+            self._data[key] = (time.monotonic() + self.ttl_sec, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
@@ -0,0 +1,98 @@
+"""
+user_stats: 유저별 누적 통계 머티리얼라이즈 테이블
+
+- db_uploader가 출석/곡 INSERT 시점에 증분 갱신
+- db_achiv가 도전과제 지급 후 achv_count 갱신
+- app.py / og.py는 user_id 인덱스 조회 한 번으로 읽음
+"""
+
+USER_STATS_DDL = """
+    CREATE TABLE IF NOT EXISTS user_stats (
+        user_id            INT PRIMARY KEY,
+        total_duration_sec BIGINT   NOT NULL DEFAULT 0,
+        song_count         INT      NOT NULL DEFAULT 0,
+        first_attended     DATETIME NULL,
+        last_enter_time    DATETIME NULL,
+        achv_count         INT      NOT NULL DEFAULT 0
+    )
+"""
+
+
+def ensure_user_stats(conn):
+    """
+    테이블이 없으면 만들고, 비어 있으면 기존 데이터로 한 번 채웁니다.
+    반환: 백필 여부(bool)
+    """
+    with conn.cursor() as cursor:
+        cursor.execute(USER_STATS_DDL)
+        cursor.execute("SELECT 1 FROM user_stats LIMIT 1")
+        if cursor.fetchone():
+            return False
+    rebuild_user_stats(conn)
+    return True
+
+
+def rebuild_user_stats(conn):
+    """
+    원본 테이블에서 user_stats 전체를 다시 계산 (초기 백필/정합성 복구용).
+    DELETE 후 INSERT 대신 upsert로 덮어씀 → 여러 번 돌려도 같고,
+    업로더의 add_attendance/add_music_play가 동시에 행을 만들어도 키 충돌이 나지 않음
+    """
+    with conn.cursor() as cursor:
+        cursor.execute("""
+            INSERT INTO user_stats (user_id, total_duration_sec, first_attended, last_enter_time)
+            SELECT user_id, COALESCE(SUM(duration_sec), 0), MIN(enter_time), MAX(enter_time)
+            FROM attendance
+            GROUP BY user_id
+            ON DUPLICATE KEY UPDATE
+                total_duration_sec = VALUES(total_duration_sec),
+                first_attended = VALUES(first_attended),
+                last_enter_time = VALUES(last_enter_time)
+        """)
+        cursor.execute("""
+            INSERT INTO user_stats (user_id, song_count)
+            SELECT user_id, COUNT(*)
+            FROM music_play
+            GROUP BY user_id
+            ON DUPLICATE KEY UPDATE song_count = VALUES(song_count)
+        """)
+    refresh_achievement_counts(conn)
+    conn.commit()
+
+
+def add_attendance(cursor, user_id, enter_time, duration_sec):
+    cursor.execute("""
+        INSERT INTO user_stats (user_id, total_duration_sec, first_attended, last_enter_time)
+        VALUES (%s, %s, %s, %s)
+        ON DUPLICATE KEY UPDATE
+            total_duration_sec = total_duration_sec + VALUES(total_duration_sec),
+            first_attended = LEAST(COALESCE(first_attended, VALUES(first_attended)), VALUES(first_attended)),
+            last_enter_time = GREATEST(COALESCE(last_enter_time, VALUES(last_enter_time)), VALUES(last_enter_time))
+    """, (user_id, duration_sec, enter_time, enter_time))
+
+
+def add_music_play(cursor, user_id):
+    cursor.execute("""
+        INSERT INTO user_stats (user_id, song_count)
+        VALUES (%s, 1)
+        ON DUPLICATE KEY UPDATE song_count = song_count + 1
+    """, (user_id,))
+
+
+def refresh_achievement_counts(conn):
+    """user_achievements 기준으로 achv_count를 맞춥니다 (도전과제 배치 종료 시 1회)"""
+    with conn.cursor() as cursor:
+        cursor.execute("""
+            INSERT INTO user_stats (user_id, achv_count)
+            SELECT user_id, COUNT(*)
+            FROM user_achievements
+            GROUP BY user_id
+            ON DUPLICATE KEY UPDATE achv_count = VALUES(achv_count)
+        """)
+        cursor.execute("""
+            UPDATE user_stats us
+            LEFT JOIN user_achievements ua ON ua.user_id = us.user_id
+            SET us.achv_count = 0
+            WHERE ua.user_id IS NULL AND us.achv_count <> 0
+        """)
+    conn.commit()